@@ -0,0 +1,249 @@
+"""
+键集（游标）分页。
+
+OFFSET 分页翻到第 N 页时数据库仍需扫描并丢弃前面的所有行，且每页都要执行一次
+COUNT(*)。键集分页记住当前页边界行的排序键，下一页直接用 WHERE 条件从该位置
+继续读取，第 N 页与第 1 页的代价相同。排序键必须是稳定、唯一的组合（如
+('-entry_time', '-id')），最后一个字段应为主键以保证唯一。
+
+总数为可选的近似值：MySQL 未加过滤条件时读取表统计信息，否则最多计数
+KEYSET_COUNT_LIMIT 行，超出时显示为"N+"。总数只在第一页计算，之后随游标一起
+传递，翻页时不再重复计数。
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from django.http import Http404, QueryDict
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+KEYSET_COUNT_LIMIT = 10000
+
+
+def _encode_cursor(values, direction, count=None):
+    data = {'v': values, 'd': direction}
+    if count is not None:
+        data['c'] = list(count)
+    payload = json.dumps(data, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """返回 (排序键值, 方向, 第一页算出的 (数量, 是否被截断) 或 None)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        count = payload.get('c')
+        if count is not None:
+            count = (int(count[0]), bool(count[1]))
+        return payload['v'], payload['d'], count
+    except (binascii.Error, ValueError, KeyError, TypeError, IndexError):
+        raise Http404("无效的分页参数")
+
+
+def _keyset_filter(ordering, values):
+    """
+    构造"位于边界行之后"的条件：
+    (a > a0) OR (a = a0 AND b > b0) OR ...，降序字段使用 <。
+    """
+    condition = Q()
+    equal_prefix = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal_prefix, **{f'{name}__{lookup}': value})
+        equal_prefix[name] = value
+    return condition
+
+
+def _reverse_ordering(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def approximate_count(queryset):
+    """
+    返回 (数量, 是否被截断)。未过滤的 MySQL 表读取统计信息中的估算行数，
+    其余情况最多计数 KEYSET_COUNT_LIMIT + 1 行。
+    """
+    if connection.vendor == 'mysql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return row[0], False
+    count = queryset.order_by()[:KEYSET_COUNT_LIMIT + 1].count()
+    return min(count, KEYSET_COUNT_LIMIT), count > KEYSET_COUNT_LIMIT
+
+
+class KeysetPage:
+    """键集分页的当前页，提供与模板 common/_pagination.html 配合使用的属性"""
+    is_keyset = True
+
+    def __init__(self, object_list, next_cursor, previous_cursor, count=None, count_capped=False,
+                 query_params=None, cursor_query_param='cursor'):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_capped = count_capped
+        self.query_params = query_params
+        self.cursor_query_param = cursor_query_param
+
+    def _query_with_cursor(self, cursor):
+        # 保留当前请求的全部查询参数（搜索、筛选等），只替换游标
+        params = self.query_params.copy() if self.query_params is not None else QueryDict(mutable=True)
+        params[self.cursor_query_param] = cursor
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query_with_cursor(self.next_cursor) if self.next_cursor else ''
+
+    @property
+    def previous_query(self):
+        return self._query_with_cursor(self.previous_cursor) if self.previous_cursor else ''
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """
+    为 ListView 提供键集分页，替代基于 ?page= 的 OFFSET 分页。
+    使用 ?cursor= 翻页；keyset_ordering 的最后一个字段应为主键。
+    """
+    keyset_ordering = ('-pk',)
+    keyset_count = True
+    cursor_query_param = 'cursor'
+
+    def _cursor_values(self, obj):
+        values = []
+        for field in self.keyset_ordering:
+            name = field.lstrip('-')
+            value = getattr(obj, 'pk' if name == 'pk' else name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _parse_cursor_values(self, model, values):
+        parsed = []
+        for field, value in zip(self.keyset_ordering, values):
+            name = field.lstrip('-')
+            model_field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            try:
+                parsed.append(model_field.to_python(value))
+            except ValidationError:
+                raise Http404("无效的分页参数")
+        return parsed
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = list(self.keyset_ordering)
+        cursor = self.request.GET.get(self.cursor_query_param)
+        direction = 'next'
+        count = None
+        page_queryset = queryset.order_by(*ordering)
+
+        if cursor:
+            values, direction, count = _decode_cursor(cursor)
+            if len(values) != len(ordering) or direction not in ('next', 'previous'):
+                raise Http404("无效的分页参数")
+            values = self._parse_cursor_values(queryset.model, values)
+            if direction == 'next':
+                page_queryset = page_queryset.filter(_keyset_filter(ordering, values))
+            else:
+                reversed_ordering = _reverse_ordering(ordering)
+                page_queryset = queryset.order_by(*reversed_ordering).filter(
+                    _keyset_filter(reversed_ordering, values)
+                )
+
+        # 多取一行，用来判断该方向上是否还有下一页
+        rows = list(page_queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == 'previous':
+            rows.reverse()
+
+        if direction == 'next':
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = True, has_more
+
+        # 总数只在第一页计算一次，后续页从游标中取回
+        if self.keyset_count and count is None and not cursor:
+            count = approximate_count(queryset)
+
+        next_cursor = _encode_cursor(self._cursor_values(rows[-1]), 'next', count) if rows and has_next else None
+        previous_cursor = (
+            _encode_cursor(self._cursor_values(rows[0]), 'previous', count) if rows and has_previous else None
+        )
+
+        count, count_capped = count if count is not None else (None, False)
+        page = KeysetPage(
+            rows, next_cursor, previous_cursor, count, count_capped,
+            query_params=self.request.GET, cursor_query_param=self.cursor_query_param,
+        )
+        return None, page, rows, page.has_other_pages()
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    API 的游标分页，在第一页的响应中附带近似总数，后续页的 count 为 null。
+    为兼容已有客户端，请求中带 ?page= 时仍使用页码分页。
+    """
+    ordering = ('-pk',)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.page_number_paginator = PageNumberPagination()
+            return self.page_number_paginator.paginate_queryset(queryset, request, view)
+        if request.query_params.get(self.cursor_query_param):
+            self.count, self.count_capped = None, False
+        else:
+            self.count, self.count_capped = approximate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'count_capped': self.count_capped,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count'] = {'type': 'integer'}
+        schema['properties']['count_capped'] = {'type': 'boolean'}
+        return schema
+
+
+class GradeCursorPagination(KeysetCursorPagination):
+    ordering = ('-entry_time', '-id')
+
+
+class StudentCursorPagination(KeysetCursorPagination):
+    ordering = ('student_id_num',)
@@ -0,0 +1,185 @@
+"""
+序列化器自动预加载。
+
+EagerLoadingMixin 根据序列化器的声明推导查询计划：
+- 嵌套序列化器、点号形式的 source（如 'teaching_assignment.course.course_name'）
+  经过的一对一/外键关系使用 select_related，多值关系使用 prefetch_related；
+- 主键关系字段（PrimaryKeyRelatedField）只读取外键列，不做关联；
+- 列表和详情接口额外使用 only()，只取出序列化时用到的列。
+
+SerializerMethodField 的访问路径无法自动推断，需在 Meta.eager_sources 中声明
+（写法与 source 相同），例如 eager_sources = ['name', 'user.username']。
+未声明时该层模型不做 only() 裁剪，保证不会因延迟加载产生额外查询。
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+ALL_FIELDS = None
+
+
+class _EagerLoadingPlan:
+    def __init__(self):
+        self.select = set()
+        self.prefetch = set()
+        # 每一层（以关联路径区分）需要读取的字段名，ALL_FIELDS 表示整层都要
+        self.fields = {}
+
+    def need(self, path, name):
+        current = self.fields.setdefault(path, set())
+        if current is not ALL_FIELDS:
+            current.add(name)
+
+    def need_all(self, path):
+        self.fields[path] = ALL_FIELDS
+
+    def only_fields(self, model):
+        """生成 only() 的字段列表"""
+        names = []
+        for path, fields in self.fields.items():
+            level_model = _model_at(model, path)
+            prefix = f'{path}__' if path else ''
+            if fields is ALL_FIELDS:
+                fields = {field.name for field in level_model._meta.concrete_fields}
+            else:
+                fields = fields | {level_model._meta.pk.name}
+            names.extend(prefix + name for name in sorted(fields))
+        return names
+
+
+def _join(path, name):
+    return f'{path}__{name}' if path else name
+
+
+def _model_at(model, path):
+    for name in filter(None, path.split('__')):
+        model = model._meta.get_field(name).related_model
+    return model
+
+
+def _walk_source(plan, model, path, source_attrs, field=None, in_prefetch=False):
+    """
+    沿 source 路径记录需要的关联和字段；
+    返回 (路径终点的模型, 终点路径, 是否经过多值关系)，路径终点不是关联时模型为 None。
+    """
+    for index, attr in enumerate(source_attrs):
+        is_last = index == len(source_attrs) - 1
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            # 属性或方法，无法推断其访问的字段
+            if not in_prefetch:
+                plan.need_all(path)
+            return None, path, in_prefetch
+
+        # 外键的 attname（如 user_id）只读取本表的外键列
+        is_column = not model_field.is_relation or (
+            attr != model_field.name and attr == getattr(model_field, 'attname', None)
+        )
+        if is_column:
+            if not in_prefetch:
+                plan.need(path, model_field.name)
+            return None, path, in_prefetch
+
+        if is_last and isinstance(field, serializers.PrimaryKeyRelatedField) and model_field.concrete:
+            # 主键关系只需外键列
+            if not in_prefetch:
+                plan.need(path, model_field.name)
+            return None, path, in_prefetch
+
+        related_path = _join(path, attr)
+        if model_field.many_to_many or model_field.one_to_many:
+            plan.prefetch.add(related_path)
+            in_prefetch = True
+        elif in_prefetch:
+            plan.prefetch.add(related_path)
+        else:
+            plan.select.add(related_path)
+            if model_field.concrete:
+                plan.need(path, model_field.name)
+            plan.need(related_path, model_field.related_model._meta.pk.name)
+        model = model_field.related_model
+        path = related_path
+
+    return model, path, in_prefetch
+
+
+def _collect(plan, serializer, model, path, in_prefetch=False):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if isinstance(field, serializers.SerializerMethodField):
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if field.source == '*':
+            if isinstance(nested, serializers.BaseSerializer):
+                _collect(plan, nested, model, path, in_prefetch)
+            continue
+
+        end_model, end_path, end_in_prefetch = _walk_source(
+            plan, model, path, field.source_attrs, field, in_prefetch
+        )
+        if end_model is None:
+            continue
+        if isinstance(nested, serializers.BaseSerializer):
+            _collect(plan, nested, end_model, end_path, end_in_prefetch)
+        elif not isinstance(field, serializers.PrimaryKeyRelatedField) and not end_in_prefetch:
+            # 其它关系字段（如 StringRelatedField）会读取关联对象的任意属性
+            plan.need_all(end_path)
+
+    meta = getattr(serializer, 'Meta', None)
+    method_fields = [
+        field for field in serializer.fields.values()
+        if isinstance(field, serializers.SerializerMethodField)
+    ]
+    eager_sources = getattr(meta, 'eager_sources', None)
+    if eager_sources is not None:
+        for source in eager_sources:
+            _walk_source(plan, model, path, source.split('.'), in_prefetch=in_prefetch)
+    elif method_fields and not in_prefetch:
+        plan.need_all(path)
+
+    if not in_prefetch:
+        plan.fields.setdefault(path, set())
+
+
+class EagerLoadingMixin:
+    """为 ModelSerializer 提供 setup_eager_loading(queryset)，按字段声明自动预加载关联数据"""
+
+    @classmethod
+    def get_eager_loading_plan(cls):
+        plan = cls.__dict__.get('_eager_loading_plan')
+        if plan is None:
+            plan = _EagerLoadingPlan()
+            _collect(plan, cls(), cls.Meta.model, '')
+            cls._eager_loading_plan = plan
+        return plan
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, restrict_fields=True):
+        plan = cls.get_eager_loading_plan()
+        if plan.select:
+            queryset = queryset.select_related(*sorted(plan.select))
+        if plan.prefetch:
+            queryset = queryset.prefetch_related(*sorted(plan.prefetch))
+        if restrict_fields:
+            queryset = queryset.only(*plan.only_fields(queryset.model))
+        return queryset
+
+
+class EagerLoadingViewSetMixin:
+    """
+    在 ViewSet 的 get_queryset 中应用序列化器的预加载计划。
+    只有列表和详情接口裁剪字段，写操作仍取出完整对象。
+    """
+    eager_loading_actions = ('list', 'retrieve')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(
+                queryset, restrict_fields=self.action in self.eager_loading_actions,
+            )
+        return queryset
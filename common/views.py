@@ -9,6 +9,7 @@ from decimal import Decimal
 
 from courses.models import Course, CourseEnrollment, TeachingAssignment
 from grades.models import Grade
+from grades.services import get_academic_summary
 from departments.models import Department, Major
 from users.models import Teacher, Student, CustomUser
 from .mixins import (
@@ -351,32 +352,19 @@ class StudentInfoView(StudentRequiredMixin, generic.TemplateView):
                 ).order_by('-enrollment_date')
                 context['enrollments'] = enrollments
                 
-                # 实时计算并更新学分
-                credit_info = calculate_and_update_student_credits(student_profile)
-                context['credit_info'] = credit_info
+                # 学分由成绩写入时的学分台账维护，这里直接读取
+                context['credit_info'] = {
+                    'major_credits': student_profile.credits_earned,
+                    'minor_credits': student_profile.minor_credits_earned,
+                    'total_credits': student_profile.credits_earned + student_profile.minor_credits_earned,
+                }
                 
-                # 获取成绩统计信息
-                from django.db.models import Avg, Count
-                grades = Grade.objects.filter(student=student_profile, score__isnull=False)
-                
-                if grades.exists():
-                    context['total_courses'] = grades.count()
-                    context['passed_courses'] = grades.filter(score__gte=60).count()
-                    context['average_score'] = grades.aggregate(avg=Avg('score'))['avg']
-                    context['grade_distribution'] = {
-                        'excellent': grades.filter(score__gte=90).count(),
-                        'good': grades.filter(score__gte=80, score__lt=90).count(),
-                        'average': grades.filter(score__gte=70, score__lt=80).count(),
-                        'pass': grades.filter(score__gte=60, score__lt=70).count(),
-                        'fail': grades.filter(score__lt=60).count(),
-                    }
-                else:
-                    context['total_courses'] = 0
-                    context['passed_courses'] = 0
-                    context['average_score'] = None
-                    context['grade_distribution'] = {
-                        'excellent': 0, 'good': 0, 'average': 0, 'pass': 0, 'fail': 0
-                    }
+                # 获取成绩统计信息（读取成绩汇总表）
+                summary = get_academic_summary(student_profile)
+                context['total_courses'] = summary.graded_courses
+                context['passed_courses'] = summary.passed_courses
+                context['average_score'] = summary.average_score
+                context['grade_distribution'] = summary.grade_distribution
                 
         except Exception as e:
             context['error'] = f"获取学生信息失败: {str(e)}"
@@ -0,0 +1,93 @@
+"""
+首页仪表盘数据缓存。
+
+缓存按"代数"（generation）组织：每个缓存键都带上当前代数，数据变更时只需把
+代数加一，旧的缓存条目自然失效（由后端按过期时间淘汰），无需逐个删除或扫描键。
+管理员看到的全局数据共用一个全局代数，教师的成绩分布按教师各自维护代数，
+某位教师的成绩变动不会让其他教师的缓存失效。
+失效在写入事务中立即执行一次、提交后再执行一次：提交前并发请求按旧数据重建、
+写入新一代的缓存条目，会被提交后的第二次失效淘汰。
+开启后台任务队列时，全局数据失效后由 worker 预热，管理员打开首页时无需现场计算。
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from utils.jobs import enqueue, jobs_async
+
+GLOBAL_SCOPE = 'global'
+
+# 失效后延迟几秒再预热，短时间内的多次失效合并为一次预热任务
+WARM_DELAY = 5
+
+
+def _cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def _generation_key(scope):
+    return f'dashboard:generation:{scope}'
+
+
+def teacher_scope(user_id):
+    return f'teacher:{user_id}'
+
+
+def _generation(scope):
+    """
+    读取代数；不存在时以当前时间（微秒）初始化。
+    代数被后端淘汰后重新初始化的值一定大于之前的值，不会命中旧缓存。
+    """
+    cache = _cache()
+    key = _generation_key(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns() // 1000, timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def cached_fragment(name, builder, scope=GLOBAL_SCOPE):
+    """按名称和作用域读取缓存的仪表盘数据，未命中时调用 builder 计算并写入"""
+    cache = _cache()
+    key = f'dashboard:{name}:{scope}:{_generation(scope)}'
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, _timeout())
+    return value
+
+
+def bump_generations(scopes):
+    """将指定作用域的代数加一，使其下的缓存条目全部失效"""
+    cache = _cache()
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # 代数尚未初始化，说明该作用域没有任何缓存条目
+            pass
+
+
+def invalidate_generations(scopes):
+    """立即使指定作用域失效，并在当前事务提交后再失效一次（不在事务中时两次都立即执行）"""
+    scopes = tuple(scopes)
+    bump_generations(scopes)
+    transaction.on_commit(lambda: bump_generations(scopes))
+
+
+def invalidate_dashboard(teacher_user_ids=()):
+    """使全局仪表盘数据以及指定教师的成绩分布失效"""
+    invalidate_generations(
+        (GLOBAL_SCOPE, *(teacher_scope(user_id) for user_id in set(teacher_user_ids)))
+    )
+
+    if jobs_async():
+        enqueue('core.views.warm_dashboard', dedup_key='dashboard:warm', delay=WARM_DELAY)
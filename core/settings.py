@@ -132,4 +132,40 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "unique-snowflake",
     }
-}
\ No newline at end of file
+}
+
+# 首页仪表盘缓存：单进程开发时使用本地内存；多进程部署时通过环境变量
+# DASHBOARD_CACHE_BACKEND 切换为文件缓存或 Redis，使各进程共享失效状态
+DASHBOARD_CACHE_BACKENDS = {
+    "locmem": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "dashboard",
+    },
+    "file": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "dashboard",
+    },
+    "redis": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/1"),
+    },
+}
+CACHES["dashboard"] = DASHBOARD_CACHE_BACKENDS[os.environ.get("DASHBOARD_CACHE_BACKEND", "locmem")]
+DASHBOARD_CACHE_ALIAS = "dashboard"
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# 批量创建账号时并行哈希密码的进程数（不超过 CPU 核数），1 表示串行。
+# 每个 Web worker 都会各自启动进程池，保持较小的值
+PASSWORD_HASH_WORKERS = 2
+# 开启后台任务队列时，超过该行数的学生导入在请求中只做校验，写入交给 worker 执行
+STUDENT_IMPORT_ASYNC_ROWS = 200
+
+# 后台任务队列（utils.jobs）。开启后任务写入数据库队列，由 `python manage.py run_worker` 执行；
+# 关闭时（默认）任务在当前进程中同步执行。选课请求队列始终交给 worker 处理。
+BACKGROUND_JOBS_ASYNC = os.environ.get("BACKGROUND_JOBS_ASYNC", "").lower() in ("1", "true", "yes", "on")
+# 任务失败后重试的退避基数（秒），第 n 次失败后等待 基数 × 2^(n-1)
+JOB_RETRY_BACKOFF = 30
+# 任务领取后超过该秒数仍未结束（如 worker 被杀掉）时重新放回队列
+JOB_LOCK_TIMEOUT = 600
+# 已完成和失败的任务保留的秒数，超过后由 worker 定期清理
+JOB_RETENTION = 7 * 24 * 3600
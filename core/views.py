@@ -4,9 +4,22 @@ from users.models import Student, Teacher
 from departments.models import Department
 from courses.models import Course, TeachingAssignment
 from grades.models import Grade
-from django.db.models import Count
+from grades.services import grade_statistics, weighted_gpa_subquery
+from core.dashboard_cache import cached_fragment, teacher_scope
+from django.db.models import Case, CharField, Count, Value, When
+from django.db.models.functions import Coalesce
+from decimal import Decimal
 import json
 
+def get_admin_counts():
+    """获取管理员首页的各类数量统计"""
+    return {
+        'student_count': Student.objects.count(),
+        'teacher_count': Teacher.objects.count(),
+        'course_count': Course.objects.count(),
+        'department_count': Department.objects.count(),
+    }
+
 def get_course_distribution():
     """获取热门选修课程数据 (前10名)"""
     assignments = TeachingAssignment.objects.values(
@@ -19,39 +32,58 @@ def get_course_distribution():
     data = [a['enrollment_count'] for a in assignments]
     return {'labels': labels, 'data': data}
 
+GPA_BRACKETS = [
+    ("3.7 ~ 4.0 (优秀)", Decimal("3.7")),
+    ("3.0 ~ 3.6 (良好)", Decimal("3.0")),
+    ("2.0 ~ 2.9 (中等)", Decimal("2.0")),
+    ("1.0 ~ 1.9 (及格)", Decimal("1.0")),
+]
+GPA_FAIL_BRACKET = "1.0 以下 (不及格)"
+
 def get_gpa_distribution():
     """获取全校学生累计GPA分布数据"""
-    gpa_brackets = {
-        "3.7 ~ 4.0 (优秀)": 0, "3.0 ~ 3.6 (良好)": 0,
-        "2.0 ~ 2.9 (中等)": 0, "1.0 ~ 1.9 (及格)": 0,
-        "1.0 以下 (不及格)": 0,
-    }
-    students = Student.objects.prefetch_related(
-        'grades_received', 'grades_received__teaching_assignment__course'
+    # 在数据库中按学分加权计算每名学生的累计GPA并分段计数，只需一条分组查询
+    bracket = Case(
+        *[When(gpa__gte=lower, then=Value(label)) for label, lower in GPA_BRACKETS],
+        default=Value(GPA_FAIL_BRACKET),
+        output_field=CharField(),
     )
-    for student in students:
-        gpa = student.calculate_cumulative_gpa()
-        if gpa >= 3.7: gpa_brackets["3.7 ~ 4.0 (优秀)"] += 1
-        elif gpa >= 3.0: gpa_brackets["3.0 ~ 3.6 (良好)"] += 1
-        elif gpa >= 2.0: gpa_brackets["2.0 ~ 2.9 (中等)"] += 1
-        elif gpa >= 1.0: gpa_brackets["1.0 ~ 1.9 (及格)"] += 1
-        else: gpa_brackets["1.0 以下 (不及格)"] += 1
-    return {'labels': list(gpa_brackets.keys()), 'data': list(gpa_brackets.values())}
+    rows = Student.objects.annotate(
+        gpa=Coalesce(weighted_gpa_subquery(), Value(Decimal("0.0")))
+    ).annotate(bracket=bracket).values('bracket').annotate(
+        student_count=Count('pk')
+    ).order_by()
+
+    counts = {row['bracket']: row['student_count'] for row in rows}
+    labels = [label for label, _ in GPA_BRACKETS] + [GPA_FAIL_BRACKET]
+    return {'labels': labels, 'data': [counts.get(label, 0) for label in labels]}
 
 def get_teacher_grade_distribution(teacher_user):
     """获取某位教师所教课程的成绩分布数据 (此函数供教师角色使用)"""
-    teacher_assignments = TeachingAssignment.objects.filter(teacher__user=teacher_user)
-    grades = Grade.objects.filter(teaching_assignment__in=teacher_assignments, score__isnull=False)
-    grade_ranges = {'A (90-100)': 0, 'B (80-89)': 0, 'C (70-79)': 0, 'D (60-69)': 0, 'F (<60)': 0}
-    for grade in grades:
-        if grade.score >= 90: grade_ranges['A (90-100)'] += 1
-        elif grade.score >= 80: grade_ranges['B (80-89)'] += 1
-        elif grade.score >= 70: grade_ranges['C (70-79)'] += 1
-        elif grade.score >= 60: grade_ranges['D (60-69)'] += 1
-        else: grade_ranges['F (<60)'] += 1
+    statistics = grade_statistics(
+        Grade.objects.filter(teaching_assignment__teacher__user=teacher_user)
+    )
+    grade_ranges = {
+        'A (90-100)': statistics['excellent_count'],
+        'B (80-89)': statistics['good_count'],
+        'C (70-79)': statistics['average_count'],
+        'D (60-69)': statistics['pass_count'],
+        'F (<60)': statistics['fail_count'],
+    }
     filtered_ranges = {k: v for k, v in grade_ranges.items() if v > 0}
     return {'labels': list(filtered_ranges.keys()), 'data': list(filtered_ranges.values())}
 
+ADMIN_DASHBOARD_FRAGMENTS = {
+    'admin_counts': get_admin_counts,
+    'course_distribution': get_course_distribution,
+    'gpa_distribution': get_gpa_distribution,
+}
+
+def warm_dashboard():
+    """后台任务：预先计算管理员首页的全局统计"""
+    for name, builder in ADMIN_DASHBOARD_FRAGMENTS.items():
+        cached_fragment(name, builder)
+
 @login_required
 def home(request):
     """主页视图，根据用户角色显示不同的内容"""
@@ -60,17 +92,18 @@ def home(request):
     
     if user.is_authenticated:
         if hasattr(user, 'is_admin') and user.is_admin:
+            context.update(cached_fragment('admin_counts', get_admin_counts))
             context.update({
-                'student_count': Student.objects.count(),
-                'teacher_count': Teacher.objects.count(),
-                'course_count': Course.objects.count(),
-                'department_count': Department.objects.count(),
-                'course_distribution_data': get_course_distribution(),
-                'gpa_distribution_data': get_gpa_distribution(),
+                'course_distribution_data': cached_fragment('course_distribution', get_course_distribution),
+                'gpa_distribution_data': cached_fragment('gpa_distribution', get_gpa_distribution),
             })
         elif hasattr(user, 'is_teacher') and user.is_teacher:
             context['teacher_courses'] = TeachingAssignment.objects.filter(teacher__user=user)
-            context['teacher_grade_distribution_data'] = get_teacher_grade_distribution(user)
+            context['teacher_grade_distribution_data'] = cached_fragment(
+                'teacher_grade_distribution',
+                lambda: get_teacher_grade_distribution(user),
+                scope=teacher_scope(user.pk),
+            )
         elif hasattr(user, 'is_student') and user.is_student:
             context['enrollments'] = Grade.objects.filter(student__user=user)
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Course, TeachingAssignment 
+from .models import Course, SelectionRequest, TeachingAssignment, TimeSlot
 
 # 注册 Course 模型到 Admin 后台
 @admin.register(Course) 
@@ -9,10 +9,27 @@ class CourseAdmin(admin.ModelAdmin):
     ordering = ('course_id',) 
     list_filter = ('department', 'degree_level') 
 
+
+class TimeSlotInline(admin.TabularInline):
+    model = TimeSlot
+    extra = 0
+
+
 # 注册 TeachingAssignment 模型到 Admin 后台
 @admin.register(TeachingAssignment) 
 class TeachingAssignmentAdmin(admin.ModelAdmin): 
-    list_display = ('teacher', 'course', 'semester') 
+    inlines = [TimeSlotInline]
+    list_display = ('teacher', 'course', 'semester', 'capacity', 'seats_taken')
     search_fields = ('teacher__name', 'course__course_name', 'semester') 
     list_filter = ('semester', 'teacher', 'course') 
-    raw_id_fields = ('teacher', 'course')
\ No newline at end of file
+    raw_id_fields = ('teacher', 'course')
+    readonly_fields = ('seats_taken',)
+
+
+@admin.register(SelectionRequest)
+class SelectionRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'student', 'teaching_assignment', 'action', 'status', 'created_at', 'processed_at')
+    list_filter = ('status', 'action')
+    search_fields = ('student__student_id_num', 'student__name')
+    raw_id_fields = ('student', 'teaching_assignment')
+    readonly_fields = ('created_at', 'claimed_at', 'processed_at')
@@ -1,5 +1,10 @@
+import re
+from datetime import datetime
+
 from django import forms
-from .models import Course, TeachingAssignment
+from django.db import transaction
+from .models import Course, TeachingAssignment, TimeSlot
+from .timetable import WEEKDAY_NAMES, SemesterTimetable, Slot, describe_slot, find_overlaps
 from users.models import Teacher
 from departments.models import Department
 from users.models import Student  
@@ -29,21 +34,61 @@ class CourseForm(forms.ModelForm):
             'credits': '课程的学分 (0.0-30.0)',
         }
 
+SCHEDULE_LINE = re.compile(r'^(\S+)\s+(\d{1,2}:\d{2})\s*-\s*(\d{1,2}:\d{2})(?:\s+(\S+))?$')
+WEEKDAY_LOOKUP = {
+    **{str(number): number for number in WEEKDAY_NAMES},
+    **{name: number for number, name in WEEKDAY_NAMES.items()},
+    **{name.replace('周', '星期'): number for number, name in WEEKDAY_NAMES.items()},
+}
+
+
+def parse_schedule(text):
+    """
+    解析上课时间，每行一个时间段：'周一 08:00-09:40 A101'（星期也可写作 1-7，教室可省略）。
+    返回 [(星期, 开始, 结束, 教室), ...]，格式错误时抛出 ValidationError。
+    """
+    slots = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        match = SCHEDULE_LINE.match(line)
+        weekday = WEEKDAY_LOOKUP.get(match.group(1)) if match else None
+        try:
+            start, end = (datetime.strptime(match.group(i), '%H:%M').time() for i in (2, 3))
+        except (AttributeError, ValueError):
+            start = end = None
+        if weekday is None or start is None:
+            raise forms.ValidationError(f"第 {number} 行格式不正确，应为 '周一 08:00-09:40 A101'")
+        if end <= start:
+            raise forms.ValidationError(f"第 {number} 行的结束时间必须晚于开始时间")
+        slots.append((weekday, start, end, match.group(4) or ''))
+    return slots
+
+
 class TeachingAssignmentForm(forms.ModelForm):
     """创建和编辑授课安排的表单"""
-    
+    schedule = forms.CharField(
+        label='上课时间',
+        required=False,
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': '周一 08:00-09:40 A101'}),
+        help_text="每行一个时间段，如 '周一 08:00-09:40 A101'；保存时检查教师和教室的时间冲突",
+    )
+
     class Meta:
         model = TeachingAssignment
-        fields = ['teacher', 'course', 'semester']  # 只使用实际存在的字段
+        fields = ['teacher', 'course', 'semester', 'capacity']  # 只使用实际存在的字段
         labels = {
             'teacher': '授课教师',
             'course': '课程',
             'semester': '学期',
+            'capacity': '容量',
         }
         widgets = {
             'teacher': forms.Select(attrs={'class': 'form-select'}),
             'course': forms.Select(attrs={'class': 'form-select'}),
             'semester': forms.TextInput(attrs={'class': 'form-control', 'placeholder': '如：2024 Fall'}),
+            'capacity': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': '留空表示不限'}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -57,6 +102,61 @@ class TeachingAssignmentForm(forms.ModelForm):
         
         self.fields['course'].label_from_instance = self.get_course_display
 
+        if self.instance.pk and not self.is_bound:
+            self.initial['schedule'] = '\n'.join(
+                f"{slot.get_weekday_display()} {slot.start_time:%H:%M}-{slot.end_time:%H:%M} {slot.room}".rstrip()
+                for slot in self.instance.time_slots.all()
+            )
+
+    def clean_schedule(self):
+        return parse_schedule(self.cleaned_data.get('schedule') or '')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        schedule = cleaned_data.get('schedule') or []
+        teacher, semester = cleaned_data.get('teacher'), cleaned_data.get('semester')
+        if not schedule or teacher is None or not semester:
+            return cleaned_data
+
+        # 新建时还没有主键，assignment_id 为 None 同样能与已有授课安排区分
+        slots = [Slot(weekday, start, end, self.instance.pk, room, '本课程') for weekday, start, end, room in schedule]
+        errors = []
+        for first, second in find_overlaps(
+            [slot._replace(assignment_id=index) for index, slot in enumerate(slots)]
+        ):
+            errors.append(f"{describe_slot(first)} 与 {describe_slot(second)} 重叠")
+
+        timetable = SemesterTimetable(semester)
+        for pair in timetable.teacher_conflicts(teacher.pk, slots):
+            other = self._other_slot(pair)
+            errors.append(f"教师在 {describe_slot(other)} 已有课程")
+        for pair in timetable.room_conflicts(slots):
+            other = self._other_slot(pair)
+            errors.append(f"教室 {other.room} 在 {describe_slot(other)} 已被占用")
+        if errors:
+            self.add_error('schedule', errors)
+        return cleaned_data
+
+    def _other_slot(self, pair):
+        """冲突对中属于其它授课安排的一端"""
+        first, second = pair
+        return second if first.assignment_id == self.instance.pk else first
+
+    def save(self, commit=True):
+        instance = super().save(commit=commit)
+        if commit:
+            self.save_schedule()
+        return instance
+
+    @transaction.atomic
+    def save_schedule(self):
+        """用表单中的上课时间替换该授课安排已有的时间段"""
+        self.instance.time_slots.all().delete()
+        TimeSlot.objects.bulk_create([
+            TimeSlot(teaching_assignment=self.instance, weekday=weekday, start_time=start, end_time=end, room=room)
+            for weekday, start, end, room in self.cleaned_data.get('schedule') or []
+        ])
+
     def get_teacher_display(self, obj):
         """安全地获取教师显示信息"""
         try:
@@ -11,9 +11,13 @@ from django.core.exceptions import PermissionDenied
 
 from .models import Course, TeachingAssignment, CourseEnrollment
 from .forms import CourseForm, TeachingAssignmentForm
+from .services import bulk_enroll
+from .timetable import describe_slot, enrollment_conflicts
+from departments.models import Department, Major
 from users.models import Student
 from users.forms import StudentForm
 from common.mixins import AdminRequiredMixin
+from common.pagination import KeysetPaginationMixin
 
 # --- 课程管理视图 (管理员视角) ---
 
@@ -114,12 +118,13 @@ class TeachingAssignmentDeleteView(AdminRequiredMixin, SuccessMessageMixin, gene
 
 # --- 选课记录管理视图 (管理员视角) ---
 
-class CourseEnrollmentListView(AdminRequiredMixin, generic.ListView):
+class CourseEnrollmentListView(AdminRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """选课记录列表 - 仅限管理员"""
     model = CourseEnrollment
     template_name = 'courses/course_enrollment_list.html'
     context_object_name = 'enrollments'
     paginate_by = 20
+    keyset_ordering = ('-enrollment_date', '-id')
 
     def get_queryset(self):
         return CourseEnrollment.objects.select_related(
@@ -155,47 +160,78 @@ class CourseEnrollmentDeleteView(AdminRequiredMixin, SuccessMessageMixin, generi
 
 
 class BulkEnrollmentView(AdminRequiredMixin, View):
-    """批量选课"""
+    """
+    批量选课：为多名学生选修一个或多个授课安排。
+
+    页面只渲染所选学期的授课安排，学生通过分页的 JSON 选择器
+    （courses-api:enrollment-student-picker）按院系、专业、年级筛选后勾选。
+    """
     template_name = 'courses/bulk_enrollment_form.html'
-    
+
     def get(self, request):
-        teaching_assignments = TeachingAssignment.objects.select_related('course', 'teacher').all()
-        students = Student.objects.select_related('user', 'department').all()
-        
+        semesters = list(
+            TeachingAssignment.objects.order_by('-semester')
+            .values_list('semester', flat=True).distinct()
+        )
+        semester = request.GET.get('semester') or (semesters[0] if semesters else None)
+        teaching_assignments = TeachingAssignment.objects.filter(
+            semester=semester
+        ).select_related('course', 'teacher').order_by('course__course_name', 'teacher__name')
+
         context = {
+            'semesters': semesters,
+            'semester': semester,
             'teaching_assignments': teaching_assignments,
-            'students': students,
+            'departments': Department.objects.order_by('dept_name'),
+            'majors': Major.objects.order_by('major_name'),
         }
         return render(request, self.template_name, context)
 
     def post(self, request):
-        assignment_id = request.POST.get('teaching_assignment')
+        assignment_ids = request.POST.getlist('teaching_assignments')
         student_ids = request.POST.getlist('students')
-        
-        if not assignment_id or not student_ids:
+
+        if not assignment_ids or not student_ids:
             messages.error(request, "请选择授课安排和学生")
             return redirect('courses:bulk-enrollment')
-        
-        try:
-            assignment = TeachingAssignment.objects.get(pk=assignment_id)
-            enrolled_count = 0
-            
-            for student_id in student_ids:
-                student = Student.objects.get(pk=student_id)
-                enrollment, created = CourseEnrollment.objects.get_or_create(
-                    student=student,
-                    teaching_assignment=assignment,
-                    defaults={'status': 'ENROLLED'}
-                )
-                if created:
-                    enrolled_count += 1
-            
-            messages.success(request, f"成功为 {enrolled_count} 名学生完成选课")
-            return redirect('courses:enrollment-list')
-            
-        except Exception as e:
-            messages.error(request, f"选课操作失败: {str(e)}")
+
+        # 先用本学期课表在内存中检查时间冲突：所选课程之间冲突时整批不处理，
+        # 与已选课程冲突的学生跳过
+        batch_conflicts, student_conflicts = enrollment_conflicts(
+            [int(value) for value in student_ids if value.isdigit()],
+            [int(value) for value in assignment_ids if value.isdigit()],
+        )
+        if batch_conflicts:
+            first, second = batch_conflicts[0]
+            messages.error(
+                request, f"所选授课安排之间存在时间冲突：{describe_slot(first)} 与 {describe_slot(second)}"
+            )
             return redirect('courses:bulk-enrollment')
+        if student_conflicts:
+            student_ids = [
+                value for value in student_ids
+                if not value.isdigit() or int(value) not in student_conflicts
+            ]
+            names = dict(Student.objects.filter(
+                pk__in=list(student_conflicts)[:5]
+            ).values_list('pk', 'name'))
+            messages.warning(request, f"{len(student_conflicts)} 名学生因上课时间冲突未选课")
+            for student_id, name in names.items():
+                first, second = student_conflicts[student_id][0]
+                messages.warning(request, f"{name}：{describe_slot(first)} 与 {describe_slot(second)} 冲突")
+
+        result = bulk_enroll(student_ids, assignment_ids)
+        if result['invalid_students'] or result['invalid_assignments']:
+            messages.warning(
+                request,
+                f"忽略了 {len(result['invalid_students'])} 个不存在的学生、"
+                f"{len(result['invalid_assignments'])} 个不存在的授课安排",
+            )
+        messages.success(
+            request,
+            f"新增 {result['created']} 条选课记录，{result['already_enrolled']} 条已存在",
+        )
+        return redirect('courses:enrollment-list')
 
 
 class StudentProfileEditView(AdminRequiredMixin, SuccessMessageMixin, generic.UpdateView):
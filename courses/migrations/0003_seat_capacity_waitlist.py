@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 02:15
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_taken_seats(apps, schema_editor):
+    """按已有的已选课记录填充 seats_taken"""
+    CourseEnrollment = apps.get_model('courses', 'CourseEnrollment')
+    TeachingAssignment = apps.get_model('courses', 'TeachingAssignment')
+
+    enrolled = CourseEnrollment.objects.filter(
+        teaching_assignment=models.OuterRef('pk'), status='ENROLLED',
+    ).order_by().values('teaching_assignment').annotate(total=models.Count('pk')).values('total')
+    TeachingAssignment.objects.update(
+        seats_taken=Coalesce(models.Subquery(enrolled), models.Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_initial'),
+        ('users', '0003_update_credits_field_labels'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teachingassignment',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='可选课的人数上限，留空表示不限', null=True, verbose_name='容量'),
+        ),
+        migrations.AddField(
+            model_name='teachingassignment',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='状态为已选课的人数，由选课服务用条件 UPDATE 维护', verbose_name='已选人数'),
+        ),
+        migrations.AlterField(
+            model_name='courseenrollment',
+            name='status',
+            field=models.CharField(choices=[('ENROLLED', '已选课'), ('DROPPED', '已退课'), ('COMPLETED', '已完成'), ('WAITLISTED', '候补中')], default='ENROLLED', max_length=20, verbose_name='选课状态'),
+        ),
+        migrations.AddIndex(
+            model_name='courseenrollment',
+            index=models.Index(fields=['teaching_assignment', 'status', 'enrollment_date'], name='enrollment_waitlist_idx'),
+        ),
+        migrations.RunPython(count_taken_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 02:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_seat_capacity_waitlist'),
+        ('users', '0003_update_credits_field_labels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SelectionRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('select', '选课'), ('drop', '退课')], default='select', max_length=10, verbose_name='操作')),
+                ('status', models.CharField(choices=[('pending', '排队中'), ('processing', '处理中'), ('enrolled', '选课成功'), ('waitlisted', '已进入候补'), ('dropped', '已退课'), ('rejected', '未受理'), ('failed', '处理失败')], default='pending', max_length=20, verbose_name='状态')),
+                ('message', models.CharField(blank=True, max_length=200, verbose_name='处理说明')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='提交时间')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='领取时间')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='处理时间')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selection_requests', to='users.student', verbose_name='学生')),
+                ('teaching_assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selection_requests', to='courses.teachingassignment', verbose_name='授课安排')),
+            ],
+            options={
+                'verbose_name': '选课请求',
+                'verbose_name_plural': '选课请求',
+                'indexes': [models.Index(fields=['status', 'id'], name='selection_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_time_slots'),
+        ('users', '0003_update_credits_field_labels'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courseenrollment',
+            index=models.Index(fields=['student', 'status'], name='enrollment_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseenrollment',
+            index=models.Index(fields=['-enrollment_date', '-id'], name='enrollment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teachingassignment',
+            index=models.Index(fields=['teacher', 'semester'], name='assignment_teacher_term_idx'),
+        ),
+    ]
@@ -67,6 +67,21 @@ class Course(models.Model):
         help_text="开设该课程的院系",
     )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.record_saved_state()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.record_saved_state()
+        return instance
+
+    def record_saved_state(self):
+        """记录已落库的学分和开课院系（post_save 信号中仍是保存前的值），两者影响学生的学分统计"""
+        loaded = self.__dict__
+        self._saved_credit_state = (loaded.get('credits'), loaded.get('department_id'))
+
     def __str__(self):
         return f"{self.course_id} - {self.course_name}"
 
@@ -102,6 +117,50 @@ class TeachingAssignment(models.Model):
         ],
         help_text="授课发生的学期，例如 2024 Fall",
     )
+    capacity = models.PositiveIntegerField(
+        verbose_name="容量",
+        null=True,
+        blank=True,
+        help_text="可选课的人数上限，留空表示不限",
+    )
+    seats_taken = models.PositiveIntegerField(
+        verbose_name="已选人数",
+        default=0,
+        editable=False,
+        help_text="状态为已选课的人数，由选课服务用条件 UPDATE 维护",
+    )
+
+    def save(self, *args, **kwargs):
+        # seats_taken 只由选课服务用条件 UPDATE 维护，表单等普通保存不能用内存中的旧值覆盖它
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'seats_taken'
+            ]
+        super().save(*args, **kwargs)
+        self.record_saved_state()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.record_saved_state()
+        return instance
+
+    def record_saved_state(self):
+        """
+        记录已落库的教师、课程和学期（post_save 信号中仍是保存前的值）：
+        更换教师时原教师的首页缓存也需要失效，更换课程或学期时学生的成绩汇总需要刷新。
+        """
+        loaded = self.__dict__
+        self._saved_teacher_id = loaded.get('teacher_id')
+        self._saved_summary_state = (loaded.get('course_id'), loaded.get('semester'))
+
+    @property
+    def seats_available(self):
+        """剩余名额；不限容量时返回 None"""
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.seats_taken, 0)
 
     def __str__(self):
         teacher_str = (
@@ -116,10 +175,63 @@ class TeachingAssignment(models.Model):
         verbose_name = "教师授课安排"
         verbose_name_plural = "教师授课安排"
         unique_together = ("teacher", "course", "semester")
+        indexes = [
+            # 教师按学期倒序查看自己的授课安排
+            models.Index(fields=["teacher", "semester"], name="assignment_teacher_term_idx"),
+        ]
+
+
+class TimeSlot(models.Model):
+    """授课安排的一次上课时间（每周固定），一个授课安排可以有多个时间段"""
+    WEEKDAY_CHOICES = [
+        (1, '周一'),
+        (2, '周二'),
+        (3, '周三'),
+        (4, '周四'),
+        (5, '周五'),
+        (6, '周六'),
+        (7, '周日'),
+    ]
+
+    teaching_assignment = models.ForeignKey(
+        TeachingAssignment,
+        on_delete=models.CASCADE,
+        verbose_name='授课安排',
+        related_name='time_slots',
+    )
+    weekday = models.PositiveSmallIntegerField('星期', choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField('开始时间')
+    end_time = models.TimeField('结束时间')
+    room = models.CharField('教室', max_length=50, blank=True)
+
+    class Meta:
+        verbose_name = '上课时间'
+        verbose_name_plural = verbose_name
+        ordering = ['weekday', 'start_time']
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_time__gt=models.F('start_time')),
+                name='time_slot_end_after_start',
+            ),
+        ]
+
+    def __str__(self):
+        room = f" {self.room}" if self.room else ''
+        return f"{self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}{room}"
 
 
 class CourseEnrollment(models.Model):
-    """学生选课记录"""
+    """
+    学生选课记录。
+
+    状态为 WAITLISTED 的记录是候补名单，按 enrollment_date（入队时间）、id 先后排队，
+    有名额空出时由 courses.services.promote_waitlist 依次转为已选课。
+    """
+    STATUS_ENROLLED = 'ENROLLED'
+    STATUS_DROPPED = 'DROPPED'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_WAITLISTED = 'WAITLISTED'
+
     student = models.ForeignKey(
         'users.Student',
         on_delete=models.CASCADE,
@@ -143,11 +255,12 @@ class CourseEnrollment(models.Model):
     status = models.CharField(
         max_length=20,
         choices=[
-            ('ENROLLED', '已选课'),
-            ('DROPPED', '已退课'),
-            ('COMPLETED', '已完成'),
+            (STATUS_ENROLLED, '已选课'),
+            (STATUS_DROPPED, '已退课'),
+            (STATUS_COMPLETED, '已完成'),
+            (STATUS_WAITLISTED, '候补中'),
         ],
-        default='ENROLLED',
+        default=STATUS_ENROLLED,
         verbose_name='选课状态'
     )
 
@@ -156,6 +269,96 @@ class CourseEnrollment(models.Model):
         verbose_name_plural = verbose_name
         unique_together = ['student', 'teaching_assignment']
         ordering = ['-enrollment_date']
+        indexes = [
+            # 候补名单按入队先后读取
+            models.Index(
+                fields=['teaching_assignment', 'status', 'enrollment_date'],
+                name='enrollment_waitlist_idx',
+            ),
+            # 学生的已选课程（冲突检查、选课申请处理）
+            models.Index(fields=['student', 'status'], name='enrollment_student_status_idx'),
+            # 选课记录列表按选课时间倒序的键集分页
+            models.Index(fields=['-enrollment_date', '-id'], name='enrollment_date_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.record_seat_state()
+        return instance
+
+    @property
+    def seat_state(self):
+        """影响名额的字段 (授课安排, 状态)；有字段被延迟加载时返回 None"""
+        loaded = self.__dict__
+        if not all(name in loaded for name in ('teaching_assignment_id', 'status')):
+            return None
+        return (self.teaching_assignment_id, self.status)
+
+    def record_seat_state(self):
+        """记录已落库的名额相关字段，供信号判断是否需要重算名额"""
+        self._saved_seat_state = self.seat_state
+
+    def __str__(self):
+        return f"{self.student.name} - {self.teaching_assignment.course.course_name}"
+
+class SelectionRequest(models.Model):
+    """
+    学生自助选课/退课请求队列。
+
+    Web 端只插入一条待处理请求并立即返回，由后台 worker 按提交先后
+    （id 顺序）依次调用选课服务处理，学生轮询请求状态查看结果。
+    """
+    ACTION_SELECT = 'select'
+    ACTION_DROP = 'drop'
+    ACTION_CHOICES = [
+        (ACTION_SELECT, '选课'),
+        (ACTION_DROP, '退课'),
+    ]
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_ENROLLED = 'enrolled'
+    STATUS_WAITLISTED = 'waitlisted'
+    STATUS_DROPPED = 'dropped'
+    STATUS_REJECTED = 'rejected'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '排队中'),
+        (STATUS_PROCESSING, '处理中'),
+        (STATUS_ENROLLED, '选课成功'),
+        (STATUS_WAITLISTED, '已进入候补'),
+        (STATUS_DROPPED, '已退课'),
+        (STATUS_REJECTED, '未受理'),
+        (STATUS_FAILED, '处理失败'),
+    ]
+
+    student = models.ForeignKey(
+        'users.Student',
+        on_delete=models.CASCADE,
+        verbose_name='学生',
+        related_name='selection_requests',
+    )
+    teaching_assignment = models.ForeignKey(
+        TeachingAssignment,
+        on_delete=models.CASCADE,
+        verbose_name='授课安排',
+        related_name='selection_requests',
+    )
+    action = models.CharField('操作', max_length=10, choices=ACTION_CHOICES, default=ACTION_SELECT)
+    status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    message = models.CharField('处理说明', max_length=200, blank=True)
+    created_at = models.DateTimeField('提交时间', auto_now_add=True)
+    claimed_at = models.DateTimeField('领取时间', null=True, blank=True)
+    processed_at = models.DateTimeField('处理时间', null=True, blank=True)
+
+    class Meta:
+        verbose_name = '选课请求'
+        verbose_name_plural = verbose_name
+        indexes = [
+            # worker 按 id 顺序读取待处理请求
+            models.Index(fields=['status', 'id'], name='selection_status_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.student.name} - {self.teaching_assignment.course.course_name}"
\ No newline at end of file
+        return f"{self.student_id} {self.get_action_display()} {self.teaching_assignment_id} ({self.get_status_display()})"
@@ -1,9 +1,10 @@
 
 from rest_framework import serializers
-from .models import Course, TeachingAssignment 
+from common.serializers import EagerLoadingMixin
+from .models import Course, SelectionRequest, TeachingAssignment
 
 
-from users.models import Teacher 
+from users.models import Student, Teacher
 
 from departments.models import Department 
 
@@ -16,10 +17,30 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = '__all__' 
 
 
-class TeachingAssignmentSerializer(serializers.ModelSerializer):
+class TeachingAssignmentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     teacher_name = serializers.CharField(source='teacher.name', read_only=True) # 假设 Teacher 有 name 字段
     course_name = serializers.CharField(source='course.course_name', read_only=True) # 假设 Course 有 course_name 字段
 
     class Meta:
         model = TeachingAssignment # 修正模型
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class EnrollmentStudentSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """批量选课页面的学生选择器，只返回列表展示所需的字段"""
+    department_name = serializers.CharField(source='department.dept_name', read_only=True)
+    major_name = serializers.CharField(source='major.major_name', read_only=True)
+
+    class Meta:
+        model = Student
+        fields = ['user', 'student_id_num', 'name', 'grade_year', 'department_name', 'major_name']
+
+
+class SelectionRequestSerializer(serializers.ModelSerializer):
+    """学生自助选课请求；提交后状态由后台 worker 更新"""
+    teaching_assignment = serializers.PrimaryKeyRelatedField(queryset=TeachingAssignment.objects.only('pk'))
+
+    class Meta:
+        model = SelectionRequest
+        fields = ['id', 'teaching_assignment', 'action', 'status', 'message', 'created_at', 'processed_at']
+        read_only_fields = ['status', 'message', 'created_at', 'processed_at']
@@ -0,0 +1,398 @@
+import functools
+import logging
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from users.models import Student
+from utils.jobs import enqueue
+
+from .models import CourseEnrollment, SelectionRequest, TeachingAssignment
+
+logger = logging.getLogger(__name__)
+
+ENROLL_BATCH_SIZE = 1000
+
+# 每名学生同时排队中的请求上限，避免单个账号刷满队列
+MAX_PENDING_SELECTIONS = 20
+
+SELECTION_BATCH_SIZE = 100
+
+
+def _parse_ids(values):
+    """把表单提交的 id 转为整数集合，返回 (合法 id 集合, 无法解析的原始值列表)"""
+    ids, invalid = set(), []
+    for value in values:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            invalid.append(value)
+    return ids, invalid
+
+
+# register_student 的结果
+REGISTER_ENROLLED = 'enrolled'
+REGISTER_WAITLISTED = 'waitlisted'
+REGISTER_ALREADY = 'already_enrolled'
+REGISTER_FULL = 'full'
+
+
+# 死锁、锁等待超时后重试的次数和初始退避时间（秒）
+LOCK_RETRIES = 5
+LOCK_RETRY_BACKOFF = 0.02
+LOCK_RETRY_MAX_BACKOFF = 0.5
+
+# MySQL 的死锁 (1213) 与锁等待超时 (1205)
+_MYSQL_LOCK_ERRORS = (1205, 1213)
+
+
+class _SeatsFull(Exception):
+    """占座失败"""
+
+
+class _StaleEnrollment(Exception):
+    """选课记录在读取后被其它请求修改，用于回滚已占用的名额"""
+
+
+def _is_lock_conflict(exc):
+    if exc.args and exc.args[0] in _MYSQL_LOCK_ERRORS:
+        return True
+    message = str(exc).lower()
+    return 'deadlock' in message or 'locked' in message
+
+
+def retry_on_lock_conflict(func):
+    """
+    遇到死锁或锁等待超时时回滚并重试，最多 LOCK_RETRIES 次，之后把异常抛给调用方。
+    外层已有事务时不重试：死锁会回滚整个外层事务，只能由外层处理。
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (attempt == LOCK_RETRIES - 1 or connection.in_atomic_block
+                        or not _is_lock_conflict(exc)):
+                    raise
+                logger.warning("%s 遇到锁冲突，第 %s 次重试: %s", func.__name__, attempt + 1, exc)
+                delay = min(LOCK_RETRY_BACKOFF * 2 ** attempt, LOCK_RETRY_MAX_BACKOFF)
+                time.sleep(delay * (1 + random.random()))
+    return wrapper
+
+
+def take_seat(assignment_id):
+    """
+    占用一个名额：UPDATE ... SET seats_taken = seats_taken + 1 WHERE seats_taken < capacity。
+    条件和自增在同一条语句中完成，并发请求不会超卖；不限容量时总是成功。
+    """
+    return TeachingAssignment.objects.filter(
+        Q(capacity__isnull=True) | Q(seats_taken__lt=F('capacity')), pk=assignment_id,
+    ).update(seats_taken=F('seats_taken') + 1) == 1
+
+
+def release_seat(assignment_id):
+    """释放一个名额"""
+    TeachingAssignment.objects.filter(pk=assignment_id, seats_taken__gt=0).update(
+        seats_taken=F('seats_taken') - 1
+    )
+
+
+def recount_seats(assignment_ids):
+    """按已选课记录重新统计授课安排的已选人数（管理员直接修改选课记录后使用）"""
+    enrolled = CourseEnrollment.objects.filter(
+        teaching_assignment=OuterRef('pk'), status=CourseEnrollment.STATUS_ENROLLED,
+    ).order_by().values('teaching_assignment').annotate(total=Count('pk')).values('total')
+    TeachingAssignment.objects.filter(pk__in=list(assignment_ids)).update(
+        seats_taken=Coalesce(Subquery(enrolled), Value(0))
+    )
+
+
+def _new_enrollment(student_id, assignment_id, status):
+    enrollment = CourseEnrollment(
+        student_id=student_id, teaching_assignment_id=assignment_id, status=status,
+    )
+    # 名额由选课服务维护，信号不再重算
+    enrollment._seats_managed = True
+    enrollment.save(force_insert=True)
+    return enrollment
+
+
+def _change_status(student_id, assignment_id, from_status, to_status, **fields):
+    """带原状态条件地修改选课状态，返回是否修改成功"""
+    return CourseEnrollment.objects.filter(
+        student_id=student_id, teaching_assignment_id=assignment_id, status=from_status,
+    ).update(status=to_status, **fields) == 1
+
+
+@retry_on_lock_conflict
+def register_student(student_id, assignment_id, waitlist=True):
+    """
+    学生选课。有名额时选课成功，名额已满时加入候补名单（waitlist=False 时直接返回已满）。
+
+    先用条件 UPDATE 占座，再写选课记录，写入失败时事务回滚连同名额一起撤销。
+    授课安排行的排他锁总是先于选课记录的写入获得：InnoDB 插入子表时会对父行加共享锁，
+    若先插入再 UPDATE 父行，并发事务会在共享锁升级为排他锁时互相死锁。
+    名额行的锁只持有到事务提交。返回 REGISTER_* 之一。
+    """
+    current = CourseEnrollment.objects.filter(
+        student_id=student_id, teaching_assignment_id=assignment_id,
+    ).values_list('status', flat=True).first()
+    if current in (CourseEnrollment.STATUS_ENROLLED, CourseEnrollment.STATUS_COMPLETED):
+        return REGISTER_ALREADY
+    if current == CourseEnrollment.STATUS_WAITLISTED:
+        # 重试或重复提交时也补一次递补，避免上次递补被锁冲突打断后名额闲置
+        if student_id in _promote_waitlist(assignment_id):
+            return REGISTER_ENROLLED
+        return REGISTER_WAITLISTED
+
+    try:
+        with transaction.atomic():
+            if not take_seat(assignment_id):
+                raise _SeatsFull
+            if current is None:
+                _new_enrollment(student_id, assignment_id, CourseEnrollment.STATUS_ENROLLED)
+            elif not _change_status(
+                student_id, assignment_id,
+                CourseEnrollment.STATUS_DROPPED, CourseEnrollment.STATUS_ENROLLED,
+            ):
+                # 记录在此期间被其它请求修改
+                raise _StaleEnrollment
+        return REGISTER_ENROLLED
+    except (IntegrityError, _StaleEnrollment):
+        # 同一学生的并发请求已经写入了选课记录，占用的名额随事务回滚
+        return REGISTER_ALREADY
+    except _SeatsFull:
+        if not waitlist:
+            return REGISTER_FULL
+
+    try:
+        with transaction.atomic():
+            if current is None:
+                _new_enrollment(student_id, assignment_id, CourseEnrollment.STATUS_WAITLISTED)
+            elif not _change_status(
+                student_id, assignment_id,
+                CourseEnrollment.STATUS_DROPPED, CourseEnrollment.STATUS_WAITLISTED,
+                enrollment_date=timezone.now(),
+            ):
+                return REGISTER_ALREADY
+    except IntegrityError:
+        return REGISTER_ALREADY
+    # 候补入队的同时可能有人退课，补一次递补
+    if student_id in _promote_waitlist(assignment_id):
+        return REGISTER_ENROLLED
+    return REGISTER_WAITLISTED
+
+
+@retry_on_lock_conflict
+def drop_enrollment(student_id, assignment_id):
+    """
+    退课（或退出候补）。已选课的学生退课后释放名额，并按先后顺序递补候补名单。
+    与选课相同，先锁授课安排行再改选课记录。返回是否有记录被修改。
+    """
+    current = CourseEnrollment.objects.filter(
+        student_id=student_id, teaching_assignment_id=assignment_id,
+    ).values_list('status', flat=True).first()
+    if current == CourseEnrollment.STATUS_ENROLLED:
+        try:
+            with transaction.atomic():
+                release_seat(assignment_id)
+                if not _change_status(
+                    student_id, assignment_id,
+                    CourseEnrollment.STATUS_ENROLLED, CourseEnrollment.STATUS_DROPPED,
+                ):
+                    raise _StaleEnrollment
+        except _StaleEnrollment:
+            pass
+        else:
+            _promote_waitlist(assignment_id)
+            return True
+    return _change_status(
+        student_id, assignment_id,
+        CourseEnrollment.STATUS_WAITLISTED, CourseEnrollment.STATUS_DROPPED,
+    )
+
+
+@retry_on_lock_conflict
+def promote_waitlist(assignment_id):
+    """
+    按入队先后把候补学生转为已选课，直到名额用完或候补名单为空，返回递补的学生 id 列表。
+    """
+    return _promote_waitlist(assignment_id)
+
+
+def _promote_waitlist(assignment_id):
+    """
+    每名学生一个短事务：先条件占座，再带状态条件地改为已选课；
+    占座失败则停止，候补学生被其它请求抢先处理时回滚名额并跳到下一名。
+    """
+    promoted = []
+    while True:
+        candidate = CourseEnrollment.objects.filter(
+            teaching_assignment_id=assignment_id, status=CourseEnrollment.STATUS_WAITLISTED,
+        ).order_by('enrollment_date', 'pk').values_list('student_id', flat=True).first()
+        if candidate is None:
+            return promoted
+        try:
+            with transaction.atomic():
+                if not take_seat(assignment_id):
+                    raise _SeatsFull
+                if not _change_status(
+                    candidate, assignment_id,
+                    CourseEnrollment.STATUS_WAITLISTED, CourseEnrollment.STATUS_ENROLLED,
+                ):
+                    raise _StaleEnrollment
+        except _SeatsFull:
+            return promoted
+        except _StaleEnrollment:
+            continue
+        promoted.append(candidate)
+
+
+def bulk_enroll(student_ids, assignment_ids, status='ENROLLED', batch_size=ENROLL_BATCH_SIZE):
+    """
+    为多名学生批量选修多个授课安排（学生 × 授课安排）。
+
+    每张表只用一次 __in 查询校验 id，已有选课记录的组合跳过；
+    新记录在一个事务内分批 bulk_create(ignore_conflicts=True) 写入，
+    并发写入的重复组合由唯一约束忽略。管理员批量选课不受容量限制，
+    写入后重新统计涉及授课安排的已选人数。返回：
+    {'created': 新建数, 'already_enrolled': 已有记录数,
+     'invalid_students': [...], 'invalid_assignments': [...]}
+    """
+    student_ids, invalid_students = _parse_ids(student_ids)
+    assignment_ids, invalid_assignments = _parse_ids(assignment_ids)
+
+    valid_students = set(Student.objects.filter(pk__in=student_ids).values_list('pk', flat=True))
+    valid_assignments = set(
+        TeachingAssignment.objects.filter(pk__in=assignment_ids).values_list('pk', flat=True)
+    )
+    invalid_students += sorted(student_ids - valid_students)
+    invalid_assignments += sorted(assignment_ids - valid_assignments)
+
+    result = {
+        'created': 0,
+        'already_enrolled': 0,
+        'invalid_students': invalid_students,
+        'invalid_assignments': invalid_assignments,
+    }
+    if not valid_students or not valid_assignments:
+        return result
+
+    pairs = CourseEnrollment.objects.filter(
+        student_id__in=valid_students, teaching_assignment_id__in=valid_assignments,
+    ).order_by()
+    with transaction.atomic():
+        existing = set(pairs.values_list('student_id', 'teaching_assignment_id'))
+        new_enrollments = [
+            CourseEnrollment(student_id=student_id, teaching_assignment_id=assignment_id, status=status)
+            for assignment_id in sorted(valid_assignments)
+            for student_id in sorted(valid_students)
+            if (student_id, assignment_id) not in existing
+        ]
+        for start in range(0, len(new_enrollments), batch_size):
+            CourseEnrollment.objects.bulk_create(
+                new_enrollments[start:start + batch_size], ignore_conflicts=True,
+            )
+        # ignore_conflicts 不返回实际插入的行数，写入后再计数一次
+        total = pairs.count() if new_enrollments else len(existing)
+        if new_enrollments:
+            recount_seats(valid_assignments)
+
+    result['created'] = total - len(existing)
+    result['already_enrolled'] = len(valid_students) * len(valid_assignments) - result['created']
+    return result
+
+
+def submit_selection_request(student_id, assignment_id, action=SelectionRequest.ACTION_SELECT):
+    """
+    学生提交选课/退课请求：只插入一条待处理记录并通知 worker，不在请求线程中占座。
+    同一学生对同一授课安排已有排队中的相同请求时直接返回该请求。
+
+    处理任务始终进入后台队列（即使未开启 BACKGROUND_JOBS_ASYNC），只由 run_worker 执行，
+    Web 请求的耗时不随排队人数增长。
+    """
+    existing = SelectionRequest.objects.filter(
+        student_id=student_id, teaching_assignment_id=assignment_id,
+        action=action, status=SelectionRequest.STATUS_PENDING,
+    ).first()
+    if existing is not None:
+        return existing
+
+    selection = SelectionRequest.objects.create(
+        student_id=student_id, teaching_assignment_id=assignment_id, action=action,
+    )
+    # 等待中的处理任务只保留一个
+    transaction.on_commit(lambda: enqueue(
+        'courses.services.process_selection_requests', dedup_key='courses:selection-requests',
+        always_async=True,
+    ))
+    return selection
+
+
+def _requeue_stale_selections():
+    """领取后长时间未处理完（如 worker 被杀掉）的请求放回队列"""
+    timeout = getattr(settings, 'JOB_LOCK_TIMEOUT', 600)
+    SelectionRequest.objects.filter(
+        status=SelectionRequest.STATUS_PROCESSING,
+        claimed_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=SelectionRequest.STATUS_PENDING, claimed_at=None)
+
+
+def _handle_selection(selection):
+    """调用选课服务处理一条请求，返回 (状态, 说明)"""
+    student_id, assignment_id = selection.student_id, selection.teaching_assignment_id
+    if selection.action == SelectionRequest.ACTION_DROP:
+        if drop_enrollment(student_id, assignment_id):
+            return SelectionRequest.STATUS_DROPPED, ''
+        return SelectionRequest.STATUS_REJECTED, '没有可退的选课记录'
+
+    result = register_student(student_id, assignment_id)
+    if result == REGISTER_ENROLLED:
+        return SelectionRequest.STATUS_ENROLLED, ''
+    if result == REGISTER_WAITLISTED:
+        return SelectionRequest.STATUS_WAITLISTED, '名额已满，已加入候补名单'
+    if result == REGISTER_ALREADY:
+        return SelectionRequest.STATUS_REJECTED, '已选该课程'
+    return SelectionRequest.STATUS_REJECTED, '名额已满'
+
+
+def process_selection_requests(batch_size=SELECTION_BATCH_SIZE, limit=None):
+    """
+    按提交先后处理排队中的选课请求，直到队列为空或达到 limit，返回处理的请求数。
+
+    每条请求先用带状态条件的 UPDATE 领取，多个 worker 并发时同一请求只会被处理一次。
+    """
+    _requeue_stale_selections()
+    processed = 0
+    while limit is None or processed < limit:
+        candidate_ids = list(SelectionRequest.objects.filter(
+            status=SelectionRequest.STATUS_PENDING,
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not candidate_ids:
+            break
+        for selection_id in candidate_ids:
+            if limit is not None and processed >= limit:
+                break
+            claimed = SelectionRequest.objects.filter(
+                pk=selection_id, status=SelectionRequest.STATUS_PENDING,
+            ).update(status=SelectionRequest.STATUS_PROCESSING, claimed_at=timezone.now())
+            if not claimed:
+                continue
+            selection = SelectionRequest.objects.get(pk=selection_id)
+            try:
+                status, message = _handle_selection(selection)
+            except Exception:
+                logger.exception("处理选课请求 #%s 失败", selection_id)
+                status, message = SelectionRequest.STATUS_FAILED, '处理失败，请稍后重试'
+            SelectionRequest.objects.filter(pk=selection_id).update(
+                status=status, message=message, processed_at=timezone.now(),
+            )
+            processed += 1
+    return processed
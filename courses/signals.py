@@ -0,0 +1,56 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CourseEnrollment, TeachingAssignment
+from .services import promote_waitlist, recount_seats
+
+
+def _seat_assignments(previous_state, current_state):
+    """状态变化涉及名额时，返回需要重算名额的授课安排"""
+    enrolled = CourseEnrollment.STATUS_ENROLLED
+    previous = previous_state if previous_state and previous_state[1] == enrolled else None
+    current = current_state if current_state and current_state[1] == enrolled else None
+    if previous == current:
+        return set()
+    return {state[0] for state in (previous, current) if state is not None}
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def sync_seats_on_enrollment_save(sender, instance, created, raw=False, **kwargs):
+    """
+    管理员表单等直接保存选课记录时，按实际记录重算已选人数；
+    有学生退出已选课状态时递补候补名单。选课服务自己维护名额，不经过这里。
+    """
+    if raw or getattr(instance, '_seats_managed', False):
+        instance.record_seat_state()
+        return
+
+    previous_state = None if created else getattr(instance, '_saved_seat_state', None)
+    current_state = instance.seat_state
+    if not created and previous_state is None:
+        # 无法确定修改前的状态，按当前授课安排重算
+        assignments = {instance.teaching_assignment_id}
+    else:
+        assignments = _seat_assignments(previous_state, current_state)
+
+    if assignments:
+        recount_seats(assignments)
+        for assignment_id in assignments:
+            promote_waitlist(assignment_id)
+    instance.record_seat_state()
+
+
+@receiver(post_delete, sender=CourseEnrollment)
+def release_seat_on_enrollment_delete(sender, instance, **kwargs):
+    """删除已选课记录后重算名额并递补候补名单"""
+    if instance.status == CourseEnrollment.STATUS_ENROLLED:
+        recount_seats([instance.teaching_assignment_id])
+        promote_waitlist(instance.teaching_assignment_id)
+
+
+@receiver(post_save, sender=TeachingAssignment)
+def promote_waitlist_on_capacity_change(sender, instance, created, raw=False, **kwargs):
+    """调整容量后，用新增的名额递补候补名单"""
+    if raw or created:
+        return
+    promote_waitlist(instance.pk)
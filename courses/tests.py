@@ -1,5 +1,5 @@
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -95,4 +95,430 @@ class CourseAPITest(TestCase):
         self.client.force_authenticate(user=self.admin_user)
         response = self.client.delete(reverse('teachingassignment-detail', kwargs={'pk': self.teaching1.pk}))
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(TeachingAssignment.objects.count(), 0)
\ No newline at end of file
+        self.assertEqual(TeachingAssignment.objects.count(), 0)
+
+class BulkEnrollmentTest(TestCase):
+    """测试批量选课服务与学生选择器"""
+    def setUp(self):
+        self.department = Department.objects.create(dept_code="EE", dept_name="电子工程系")
+        self.major = Major.objects.create(major_name="通信工程", department=self.department)
+        self.other_major = Major.objects.create(major_name="微电子", department=self.department)
+        self.admin_user = User.objects.create_user(username='enroll_admin', password='password123', role=CustomUser.Role.ADMIN)
+        teacher_user = User.objects.create_user(username='enroll_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T80001', name='选课教师', department=self.department)
+        self.assignments = [
+            TeachingAssignment.objects.create(
+                teacher=teacher,
+                course=Course.objects.create(course_id=f'EE10{i}', course_name=f'电路{i}', credits=Decimal('2.0'), department=self.department),
+                semester='2024 Fall',
+            )
+            for i in range(2)
+        ]
+        self.students = []
+        for i in range(5):
+            user = User.objects.create_user(username=f'enroll_student{i}', password='password123', role=CustomUser.Role.STUDENT)
+            self.students.append(Student.objects.create(
+                user=user, student_id_num=f'S8000{i}', name=f'选课学生{i}', gender='女',
+                major=self.major if i < 3 else self.other_major, department=self.department,
+                degree_level='本科', grade_year=2023 if i % 2 else 2024,
+            ))
+
+    def test_bulk_enroll_counts_created_and_existing(self):
+        from .models import CourseEnrollment
+        from .services import bulk_enroll
+
+        CourseEnrollment.objects.create(student=self.students[0], teaching_assignment=self.assignments[0])
+        student_ids = [str(student.pk) for student in self.students] + ['999999', 'abc']
+        assignment_ids = [assignment.pk for assignment in self.assignments]
+
+        # 两次校验查询 + 读取已有记录 + 一次插入 + 计数 + 重算名额，另有事务的两条保存点语句
+        with self.assertNumQueries(8):
+            result = bulk_enroll(student_ids, assignment_ids, batch_size=100)
+        self.assertEqual(result['created'], 9)
+        self.assertEqual(result['already_enrolled'], 1)
+        self.assertEqual(result['invalid_students'], ['abc', 999999])
+        self.assertEqual(result['invalid_assignments'], [])
+        self.assertEqual(CourseEnrollment.objects.count(), 10)
+
+        again = bulk_enroll(student_ids, assignment_ids)
+        self.assertEqual((again['created'], again['already_enrolled']), (0, 10))
+
+    def test_bulk_enrollment_view_and_student_picker(self):
+        from .models import CourseEnrollment
+
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse('courses:bulk-enrollment'))
+        self.assertEqual(response.context['semester'], '2024 Fall')
+        self.assertNotIn('students', response.context)
+
+        response = self.client.post(reverse('courses:bulk-enrollment'), {
+            'teaching_assignments': [self.assignments[1].pk],
+            'students': [self.students[1].pk, self.students[2].pk],
+        })
+        self.assertRedirects(response, reverse('courses:enrollment-list'), fetch_redirect_response=False)
+        self.assertEqual(CourseEnrollment.objects.filter(teaching_assignment=self.assignments[1]).count(), 2)
+
+        url = reverse('courses-api:enrollment-student-picker')
+        data = self.client.get(url, {'major': self.major.pk, 'grade_year': 2024}).json()
+        self.assertEqual([row['student_id_num'] for row in data['results']], ['S80000', 'S80002'])
+        self.assertEqual(data['results'][0]['major_name'], '通信工程')
+        self.assertEqual(self.client.get(url, {'grade_year': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.client.force_login(self.students[0].user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+def _create_students(department, major, count, prefix):
+    students = []
+    for i in range(count):
+        user = User.objects.create_user(username=f'{prefix}{i}', password='password123', role=CustomUser.Role.STUDENT)
+        students.append(Student.objects.create(
+            user=user, student_id_num=f'{prefix.upper()}{i:04d}', name=f'学生{i}', gender='男',
+            major=major, department=department, degree_level='本科',
+        ))
+    return students
+
+
+class SeatAllocationTest(TestCase):
+    """测试容量限制、候补名单与递补"""
+    def setUp(self):
+        department = Department.objects.create(dept_code="PH", dept_name="物理系")
+        major = Major.objects.create(major_name="应用物理", department=department)
+        teacher_user = User.objects.create_user(username='seat_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T81001', name='名额教师', department=department)
+        course = Course.objects.create(course_id='PH101', course_name='力学', credits=Decimal('3.0'), department=department)
+        self.assignment = TeachingAssignment.objects.create(teacher=teacher, course=course, semester='2024 Fall', capacity=2)
+        self.students = _create_students(department, major, 4, 'seat')
+
+    def assertSeats(self, expected):
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.seats_taken, expected)
+
+    def enrolled(self):
+        from .models import CourseEnrollment
+
+        return set(CourseEnrollment.objects.filter(
+            teaching_assignment=self.assignment, status=CourseEnrollment.STATUS_ENROLLED,
+        ).values_list('student_id', flat=True))
+
+    def test_waitlist_promotes_in_order_on_drop(self):
+        from . import services
+
+        results = [services.register_student(student.pk, self.assignment.pk) for student in self.students]
+        self.assertEqual(results, ['enrolled', 'enrolled', 'waitlisted', 'waitlisted'])
+        self.assertEqual(services.register_student(self.students[0].pk, self.assignment.pk), 'already_enrolled')
+        self.assertSeats(2)
+
+        self.assertTrue(services.drop_enrollment(self.students[0].pk, self.assignment.pk))
+        self.assertEqual(self.enrolled(), {self.students[1].pk, self.students[2].pk})
+        self.assertSeats(2)
+
+        # 退课的学生重新选课时排到候补名单末尾
+        self.assertEqual(services.register_student(self.students[0].pk, self.assignment.pk), 'waitlisted')
+        self.assertEqual(services.register_student(self.students[0].pk, self.assignment.pk, waitlist=False), 'waitlisted')
+
+        # 扩容后按先后顺序递补
+        self.assignment.capacity = 3
+        self.assignment.save()
+        self.assertEqual(self.enrolled(), {self.students[1].pk, self.students[2].pk, self.students[3].pk})
+        self.assertSeats(3)
+
+    def test_admin_status_change_recounts_and_promotes(self):
+        from . import services
+        from .models import CourseEnrollment
+
+        for student in self.students[:3]:
+            services.register_student(student.pk, self.assignment.pk)
+
+        # 管理员通过表单把学生改为已退课
+        enrollment = CourseEnrollment.objects.get(student=self.students[0], teaching_assignment=self.assignment)
+        enrollment.status = CourseEnrollment.STATUS_DROPPED
+        enrollment.save()
+        self.assertEqual(self.enrolled(), {self.students[1].pk, self.students[2].pk})
+        self.assertSeats(2)
+
+        CourseEnrollment.objects.get(student=self.students[1], teaching_assignment=self.assignment).delete()
+        self.assertSeats(1)
+        self.assertEqual(services.register_student(self.students[3].pk, self.assignment.pk, waitlist=False), 'enrolled')
+        self.assertEqual(services.register_student(self.students[0].pk, self.assignment.pk, waitlist=False), 'full')
+        self.assertSeats(2)
+
+
+class SeatAllocationConcurrencyTest(TransactionTestCase):
+    """并发压力测试：500 个选课请求同时争抢同一授课安排的名额，不超卖、不死锁"""
+    capacity = 50
+    requests = 500
+    # 同时占用的数据库连接数，相当于 Web 进程池的大小（MySQL 默认 max_connections 为 151）
+    connections = 100
+
+    def create_assignment(self, students=0):
+        department = Department.objects.create(dept_code="CH", dept_name="化学系")
+        major = Major.objects.create(major_name="应用化学", department=department)
+        teacher_user = User.objects.create_user(username='rush_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T82001', name='抢课教师', department=department)
+        course = Course.objects.create(course_id='CH101', course_name='无机化学', credits=Decimal('3.0'), department=department)
+        assignment = TeachingAssignment.objects.create(
+            teacher=teacher, course=course, semester='2024 Fall', capacity=self.capacity,
+        )
+        return assignment, _create_students(department, major, students, 'rush')
+
+    def test_no_oversell_under_concurrent_registration(self):
+        import threading
+        from collections import Counter
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+
+        from django.db import connection
+
+        from . import services
+        from .models import CourseEnrollment
+
+        assignment, students = self.create_assignment(self.requests)
+        # 全部请求提交后同时放行
+        start = threading.Event()
+
+        def register(student_id):
+            try:
+                start.wait()
+                return services.register_student(student_id, assignment.pk)
+            except Exception as exc:
+                # 重试用尽的锁冲突（包括死锁）计为失败
+                return f'error: {exc}'
+            finally:
+                connection.close()
+
+        # SQLite 共享内存库遇到表锁立即报错而不排队等待（InnoDB 会等待行锁），写入本来就串行，
+        # 连接再多只会加剧锁冲突：减少连接数，并给服务自身的锁冲突重试更多次数。
+        # 重试仍有上限，用尽即计为失败
+        workers, retries = self.connections, services.LOCK_RETRIES
+        if connection.vendor == 'sqlite':
+            workers, retries = 50, 100
+        with mock.patch.object(services, 'LOCK_RETRIES', retries), \
+                mock.patch.object(services.logger, 'disabled', True):
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(register, student.pk) for student in students]
+                start.set()
+                results = Counter(future.result() for future in futures)
+
+        assignment.refresh_from_db()
+        enrolled = CourseEnrollment.objects.filter(
+            teaching_assignment=assignment, status=CourseEnrollment.STATUS_ENROLLED,
+        ).count()
+        self.assertEqual(
+            dict(results), {'enrolled': self.capacity, 'waitlisted': self.requests - self.capacity},
+        )
+        self.assertEqual(enrolled, self.capacity)
+        self.assertEqual(assignment.seats_taken, self.capacity)
+
+    def test_seat_is_locked_before_enrollment_write(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from . import services
+
+        assignment, students = self.create_assignment(1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(services.register_student(students[0].pk, assignment.pk), 'enrolled')
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('UPDATE', 'INSERT'))
+        ]
+        # 先对授课安排加排他锁，再插入引用它的选课记录（插入会对父行加共享锁）
+        self.assertIn('courses_teachingassignment', writes[0])
+        self.assertIn('courses_courseenrollment', writes[1])
+
+    def test_lock_conflict_retries_are_bounded(self):
+        from unittest import mock
+
+        from django.db import OperationalError
+
+        from . import services
+        from .models import CourseEnrollment
+
+        assignment, students = self.create_assignment(1)
+        deadlock = OperationalError(1213, 'Deadlock found when trying to get lock')
+        with mock.patch.object(services, 'LOCK_RETRY_BACKOFF', 0), \
+                mock.patch.object(services, 'take_seat', side_effect=[deadlock, True]):
+            self.assertEqual(services.register_student(students[0].pk, assignment.pk), 'enrolled')
+        self.assertTrue(CourseEnrollment.objects.filter(student=students[0]).exists())
+
+        CourseEnrollment.objects.all().delete()
+        with mock.patch.object(services, 'LOCK_RETRY_BACKOFF', 0), \
+                mock.patch.object(services, 'take_seat', side_effect=deadlock) as take_seat:
+            with self.assertRaises(OperationalError):
+                services.register_student(students[0].pk, assignment.pk)
+        self.assertEqual(take_seat.call_count, services.LOCK_RETRIES)
+        self.assertFalse(CourseEnrollment.objects.exists())
+
+
+class CourseSelectionAPITest(TestCase):
+    """测试学生自助选课请求队列"""
+    def setUp(self):
+        department = Department.objects.create(dept_code="BIO", dept_name="生物系")
+        major = Major.objects.create(major_name="生物技术", department=department)
+        teacher_user = User.objects.create_user(username='queue_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        self.teacher_user = teacher_user
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T83001', name='队列教师', department=department)
+        course = Course.objects.create(course_id='BIO101', course_name='细胞生物学', credits=Decimal('3.0'), department=department)
+        self.assignment = TeachingAssignment.objects.create(teacher=teacher, course=course, semester='2024 Fall', capacity=1)
+        self.students = _create_students(department, major, 3, 'queue')
+        self.client = APIClient()
+        self.url = reverse('courses-api:course-selection-list')
+
+    def submit(self, student, action='select'):
+        self.client.force_authenticate(user=student.user)
+        return self.client.post(self.url, {'teaching_assignment': self.assignment.pk, 'action': action}, format='json')
+
+    def test_requests_processed_in_order_by_worker(self):
+        from utils.jobs import run_pending_jobs
+        from utils.models import Job
+
+        # 未开启 BACKGROUND_JOBS_ASYNC 时同样只入队，请求线程中不处理
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.submit(self.students[0])
+            second = self.submit(self.students[1])
+            # 重复提交返回同一个排队中的请求
+            repeated = self.submit(self.students[1])
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.data['status'], 'pending')
+        self.assertEqual(repeated.data['id'], second.data['id'])
+        self.assertEqual(Job.objects.filter(status=Job.STATUS_PENDING).count(), 1)
+        self.assertFalse(self.students[0].course_enrollments.exists())
+
+        run_pending_jobs()
+
+        self.client.force_authenticate(user=self.students[0].user)
+        self.assertEqual(self.client.get(f"{self.url}{first.data['id']}/").data['status'], 'enrolled')
+        self.client.force_authenticate(user=self.students[1].user)
+        self.assertEqual(self.client.get(f"{self.url}{second.data['id']}/").data['status'], 'waitlisted')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            drop = self.submit(self.students[0], action='drop')
+        run_pending_jobs()
+
+        self.client.force_authenticate(user=self.students[0].user)
+        self.assertEqual(self.client.get(f"{self.url}{drop.data['id']}/").data['status'], 'dropped')
+        self.assignment.refresh_from_db()
+        self.assertEqual(self.assignment.seats_taken, 1)
+        self.assertTrue(self.students[1].course_enrollments.filter(status='ENROLLED').exists())
+
+    def test_status_endpoint_is_private_and_students_only(self):
+        from utils.jobs import run_pending_jobs
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.submit(self.students[0])
+        run_pending_jobs()
+        detail_url = f"{self.url}{response.data['id']}/"
+
+        self.assertEqual(self.client.get(detail_url).data['status'], 'enrolled')
+        self.assertEqual(self.submit(self.students[2]).status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.client.get(detail_url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=self.teacher_user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TimetableConflictTest(TestCase):
+    """测试上课时间冲突检测"""
+    def setUp(self):
+        from datetime import time
+
+        from .models import TimeSlot
+
+        self.time = time
+        self.department = Department.objects.create(dept_code="GEO", dept_name="地理系")
+        major = Major.objects.create(major_name="地理信息", department=self.department)
+        self.admin_user = User.objects.create_user(username='slot_admin', password='password123', role=CustomUser.Role.ADMIN)
+        teacher_user = User.objects.create_user(username='slot_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        self.teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T84001', name='课表教师', department=self.department)
+        self.courses = [
+            Course.objects.create(course_id=f'GEO10{i}', course_name=f'地理{i}', credits=Decimal('2.0'), department=self.department)
+            for i in range(4)
+        ]
+        # 地理0 周一 8-10，地理1 周一 9-11（与 0 冲突），地理2 周一 10-12（与 0 首尾相接不冲突）
+        self.assignments = []
+        for course, (start, end) in zip(self.courses[:3], [(8, 10), (9, 11), (10, 12)]):
+            assignment = TeachingAssignment.objects.create(teacher=self.teacher, course=course, semester='2024 Fall')
+            TimeSlot.objects.create(teaching_assignment=assignment, weekday=1, start_time=time(start), end_time=time(end), room=f'R{start}')
+            self.assignments.append(assignment)
+        self.students = _create_students(self.department, major, 3, 'slot')
+
+    def test_sweep_finds_only_overlapping_pairs(self):
+        from .timetable import Slot, find_overlaps
+
+        time = self.time
+        slots = [
+            Slot(1, time(8), time(10), 'a', '', 'a'),
+            Slot(1, time(9), time(11), 'b', '', 'b'),
+            Slot(1, time(10), time(12), 'c', '', 'c'),
+            Slot(2, time(9), time(10), 'd', '', 'd'),
+            Slot(1, time(7), time(13), 'e', '', 'e'),
+        ]
+        pairs = {frozenset((first.label, second.label)) for first, second in find_overlaps(slots)}
+        self.assertEqual(pairs, {
+            frozenset('ab'), frozenset('bc'), frozenset('ea'), frozenset('eb'), frozenset('ec'),
+        })
+
+    def test_bulk_enrollment_skips_conflicting_students(self):
+        from .models import CourseEnrollment
+        from .timetable import enrollment_conflicts
+
+        CourseEnrollment.objects.create(student=self.students[0], teaching_assignment=self.assignments[0])
+        CourseEnrollment.objects.create(student=self.students[1], teaching_assignment=self.assignments[0])
+        CourseEnrollment.objects.create(student=self.students[2], teaching_assignment=self.assignments[2])
+
+        # 授课安排一次 + 时间段一次 + 已有选课一次
+        with self.assertNumQueries(3):
+            batch, students = enrollment_conflicts(
+                [student.pk for student in self.students], [self.assignments[1].pk],
+            )
+        self.assertEqual(batch, [])
+        self.assertEqual(set(students), {student.pk for student in self.students})
+
+        batch, students = enrollment_conflicts([self.students[0].pk], [self.assignments[1].pk, self.assignments[0].pk])
+        self.assertEqual(len(batch), 1)
+
+        self.client.force_login(self.admin_user)
+        self.client.post(reverse('courses:bulk-enrollment'), {
+            'teaching_assignments': [self.assignments[2].pk],
+            'students': [student.pk for student in self.students],
+        })
+        enrolled = set(CourseEnrollment.objects.filter(
+            teaching_assignment=self.assignments[2]
+        ).values_list('student_id', flat=True))
+        self.assertEqual(enrolled, {self.students[0].pk, self.students[1].pk, self.students[2].pk})
+
+        response = self.client.post(reverse('courses:bulk-enrollment'), {
+            'teaching_assignments': [self.assignments[0].pk, self.assignments[1].pk],
+            'students': [self.students[2].pk],
+        })
+        self.assertRedirects(response, reverse('courses:bulk-enrollment'), fetch_redirect_response=False)
+        self.assertFalse(CourseEnrollment.objects.filter(teaching_assignment=self.assignments[1]).exists())
+
+    def test_teaching_assignment_form_checks_teacher_and_room(self):
+        from .forms import TeachingAssignmentForm
+
+        data = {'teacher': self.teacher.pk, 'course': self.courses[3].pk, 'semester': '2024 Fall'}
+        form = TeachingAssignmentForm(data={**data, 'schedule': '周一 11:00-12:30'})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['schedule'], ['教师在 地理2 周一 10:00-12:00 已有课程'])
+
+        form = TeachingAssignmentForm(data={**data, 'schedule': '2 08:00-09:40 R8\n周二 09:00-10:00'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('重叠', form.errors['schedule'][0])
+
+        form = TeachingAssignmentForm(data={**data, 'schedule': '周一 8:00-9:00'})
+        self.assertFalse(form.is_valid())
+
+        other_user = User.objects.create_user(username='slot_teacher2', password='password123', role=CustomUser.Role.TEACHER)
+        other = Teacher.objects.create(user=other_user, teacher_id_num='T84002', name='另一位教师', department=self.department)
+        form = TeachingAssignmentForm(data={**data, 'teacher': other.pk, 'schedule': '周一 09:00-10:00 R8'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('教室 R8', form.errors['schedule'][0])
+
+        form = TeachingAssignmentForm(data={**data, 'schedule': '星期三 08:00-09:40 R8\n周五 10:00-11:40'})
+        self.assertTrue(form.is_valid(), form.errors)
+        assignment = form.save()
+        self.assertEqual(assignment.time_slots.count(), 2)
+        edit = TeachingAssignmentForm(instance=assignment)
+        self.assertEqual(edit.initial['schedule'], '周三 08:00-09:40 R8\n周五 10:00-11:40')
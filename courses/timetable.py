@@ -0,0 +1,142 @@
+"""
+课表时间冲突检测。
+
+同一学期的全部上课时间段用一次查询读入内存（SemesterTimetable），之后的检查都在内存中完成：
+把待检查的时间段按 (星期, 开始时间) 排序后扫描，用按结束时间排列的最小堆维护
+"仍在进行中"的时间段——结束时间不晚于当前开始时间的先出堆，堆中剩下的都与当前时间段重叠。
+n 个时间段、k 对冲突时耗时 O(n log n + k)，不需要两两比较，也不需要逐对查询数据库。
+"""
+import heapq
+from collections import defaultdict, namedtuple
+
+from .models import CourseEnrollment, TeachingAssignment, TimeSlot
+
+Slot = namedtuple('Slot', 'weekday start end assignment_id room label')
+
+WEEKDAY_NAMES = dict(TimeSlot.WEEKDAY_CHOICES)
+
+
+def describe_slot(slot):
+    return f"{slot.label} {WEEKDAY_NAMES.get(slot.weekday, slot.weekday)} {slot.start:%H:%M}-{slot.end:%H:%M}"
+
+
+def find_overlaps(slots):
+    """返回相互重叠的时间段对 [(先开始的, 后开始的), ...]；同一授课安排内的时间段不算冲突"""
+    ordered = sorted(slots, key=lambda slot: (slot.weekday, slot.start, slot.end))
+    overlaps = []
+    active = []
+    weekday = None
+    for index, slot in enumerate(ordered):
+        if slot.weekday != weekday:
+            active, weekday = [], slot.weekday
+        while active and active[0][0] <= slot.start:
+            heapq.heappop(active)
+        overlaps.extend(
+            (ordered[other], slot) for _, other in active
+            if ordered[other].assignment_id != slot.assignment_id
+        )
+        heapq.heappush(active, (slot.end, index))
+    return overlaps
+
+
+def _crossing(overlaps, new_ids):
+    """只保留一端属于新时间段、另一端属于已有时间段的冲突"""
+    return [
+        pair for pair in overlaps
+        if (pair[0].assignment_id in new_ids) != (pair[1].assignment_id in new_ids)
+    ]
+
+
+class SemesterTimetable:
+    """一个学期全部授课安排的上课时间（一次查询读入）"""
+
+    def __init__(self, semester):
+        self.semester = semester
+        self.slots_by_assignment = defaultdict(list)
+        self.assignments_by_teacher = defaultdict(set)
+        self.slots_by_room = defaultdict(list)
+
+        # 冲突检查自行排序，不需要模型默认排序
+        rows = TimeSlot.objects.filter(teaching_assignment__semester=semester).order_by().values_list(
+            'teaching_assignment_id', 'teaching_assignment__teacher_id',
+            'teaching_assignment__course__course_name',
+            'weekday', 'start_time', 'end_time', 'room',
+        )
+        for assignment_id, teacher_id, course_name, weekday, start, end, room in rows:
+            slot = Slot(weekday, start, end, assignment_id, room, course_name)
+            self.slots_by_assignment[assignment_id].append(slot)
+            self.assignments_by_teacher[teacher_id].add(assignment_id)
+            if room:
+                self.slots_by_room[room].append(slot)
+
+    def slots_of(self, assignment_ids):
+        return [slot for assignment_id in assignment_ids for slot in self.slots_by_assignment.get(assignment_id, ())]
+
+    def conflicts(self, assignment_ids):
+        """一组授课安排之间的时间冲突（如同一学生要上的全部课程）"""
+        return find_overlaps(self.slots_of(assignment_ids))
+
+    def conflicts_with(self, slots, assignment_ids):
+        """新时间段 slots 与已有授课安排 assignment_ids 之间的冲突"""
+        new_ids = {slot.assignment_id for slot in slots}
+        existing = self.slots_of(set(assignment_ids) - new_ids)
+        return _crossing(find_overlaps(existing + list(slots)), new_ids)
+
+    def teacher_conflicts(self, teacher_id, slots):
+        """新时间段与该教师本学期其它授课安排的冲突"""
+        return self.conflicts_with(slots, self.assignments_by_teacher.get(teacher_id, ()))
+
+    def room_conflicts(self, slots):
+        """新时间段与同一教室其它授课安排的冲突"""
+        new_ids = {slot.assignment_id for slot in slots}
+        conflicts = []
+        by_room = defaultdict(list)
+        for slot in slots:
+            if slot.room:
+                by_room[slot.room].append(slot)
+        for room, room_slots in by_room.items():
+            existing = [slot for slot in self.slots_by_room.get(room, ()) if slot.assignment_id not in new_ids]
+            conflicts += _crossing(find_overlaps(existing + room_slots), new_ids)
+        return conflicts
+
+
+def enrollment_conflicts(student_ids, assignment_ids):
+    """
+    检查一批学生选修一批授课安排时的时间冲突。
+
+    返回 (批内冲突, {student_id: 冲突列表})：批内冲突是所选授课安排彼此之间的冲突，
+    学生冲突是新课程与该学生同学期已选（含候补）课程的冲突。
+    每个学期只查询一次时间段和一次已有选课，已有课程相同的学生共用检查结果。
+    """
+    assignment_ids = set(assignment_ids)
+    semesters = defaultdict(set)
+    for assignment_id, semester in TeachingAssignment.objects.filter(
+        pk__in=assignment_ids
+    ).values_list('pk', 'semester'):
+        semesters[semester].add(assignment_id)
+
+    batch_conflicts = []
+    student_conflicts = defaultdict(list)
+    for semester, new_ids in semesters.items():
+        timetable = SemesterTimetable(semester)
+        new_slots = timetable.slots_of(new_ids)
+        batch_conflicts += find_overlaps(new_slots)
+        if not new_slots:
+            continue
+
+        existing = defaultdict(set)
+        for student_id, assignment_id in CourseEnrollment.objects.filter(
+            student_id__in=student_ids,
+            teaching_assignment__semester=semester,
+            status__in=[CourseEnrollment.STATUS_ENROLLED, CourseEnrollment.STATUS_WAITLISTED],
+        ).exclude(teaching_assignment_id__in=new_ids).order_by().values_list('student_id', 'teaching_assignment_id'):
+            existing[student_id].add(assignment_id)
+
+        checked = {}
+        for student_id, enrolled_ids in existing.items():
+            key = frozenset(enrolled_ids)
+            if key not in checked:
+                checked[key] = timetable.conflicts_with(new_slots, key)
+            if checked[key]:
+                student_conflicts[student_id] += checked[key]
+    return batch_conflicts, dict(student_conflicts)
@@ -4,7 +4,7 @@ from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
 
-from .views import CourseViewSet, TeachingAssignmentViewSet
+from .views import CourseSelectionViewSet, CourseViewSet, EnrollmentStudentPickerView, TeachingAssignmentViewSet
 
 
 app_name = 'courses-api'
@@ -13,7 +13,9 @@ router = DefaultRouter()
 
 router.register(r'courses', CourseViewSet, basename='course')
 router.register(r'teaching-assignments', TeachingAssignmentViewSet, basename='teaching-assignment')
+router.register(r'selections', CourseSelectionViewSet, basename='course-selection')
 
 urlpatterns = [
+    path('enrollment-students/', EnrollmentStudentPickerView.as_view(), name='enrollment-student-picker'),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
@@ -1,8 +1,20 @@
 
 
-from rest_framework import viewsets, permissions
-from .models import Course, TeachingAssignment
-from .serializers import CourseSerializer, TeachingAssignmentSerializer
+from django.db.models import Q
+from rest_framework import generics, mixins, status, viewsets, permissions
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Course, SelectionRequest, TeachingAssignment
+from .serializers import (
+    CourseSerializer, EnrollmentStudentSerializer, SelectionRequestSerializer, TeachingAssignmentSerializer,
+)
+from .services import MAX_PENDING_SELECTIONS, submit_selection_request
+from common.pagination import StudentCursorPagination
+from common.serializers import EagerLoadingViewSetMixin
+from users.models import Student
+from users.permissions import IsAdminRole, IsStudentRole
 
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.all().order_by('course_id')
@@ -15,7 +27,7 @@ class CourseViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-class TeachingAssignmentViewSet(viewsets.ModelViewSet):
+class TeachingAssignmentViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = TeachingAssignment.objects.all().order_by('semester', 'course__course_name')
     serializer_class = TeachingAssignmentSerializer
     
@@ -24,4 +36,73 @@ class TeachingAssignmentViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAdminUser]
         else:
             permission_classes = [permissions.IsAuthenticated]
-        return [permission() for permission in permission_classes]
\ No newline at end of file
+        return [permission() for permission in permission_classes]
+
+
+class EnrollmentStudentPickerView(generics.ListAPIView):
+    """
+    批量选课的学生选择器（分页 JSON），替代一次渲染全校学生。
+
+    查询参数：department、major、grade_year 按院系、专业、年级过滤，
+    search 按学号前缀或姓名筛选；使用 ?cursor= 翻页。
+    页面通过浏览器会话调用，因此除 JWT 外也接受会话认证。
+    """
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    serializer_class = EnrollmentStudentSerializer
+    pagination_class = StudentCursorPagination
+    permission_classes = [permissions.IsAuthenticated, IsAdminRole]
+    # 查询参数 -> 过滤字段
+    filter_params = {'department': 'department_id', 'major': 'major_id', 'grade_year': 'grade_year'}
+
+    def get_queryset(self):
+        queryset = Student.objects.all()
+        params = self.request.query_params
+        for name, field in self.filter_params.items():
+            value = params.get(name)
+            if value in (None, ''):
+                continue
+            try:
+                queryset = queryset.filter(**{field: int(value)})
+            except ValueError:
+                raise ValidationError({name: '必须是整数。'})
+        search = params.get('search', '').strip()
+        if search:
+            queryset = queryset.filter(Q(student_id_num__startswith=search) | Q(name__contains=search))
+        return self.serializer_class.setup_eager_loading(queryset)
+
+
+class CourseSelectionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                             mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    学生自助选课。
+
+    POST 提交选课/退课请求（{"teaching_assignment": id, "action": "select" | "drop"}），
+    只写入请求队列并返回 202，由后台 worker 按提交顺序处理；
+    GET selections/<id>/ 轮询单个请求的状态，GET selections/ 列出自己的请求。
+    """
+    serializer_class = SelectionRequestSerializer
+    permission_classes = [permissions.IsAuthenticated, IsStudentRole]
+
+    def get_queryset(self):
+        return SelectionRequest.objects.filter(
+            student_id=self.request.user.pk
+        ).order_by('-pk')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        student_id = request.user.pk
+        pending = SelectionRequest.objects.filter(
+            student_id=student_id, status=SelectionRequest.STATUS_PENDING,
+        ).count()
+        if pending >= MAX_PENDING_SELECTIONS:
+            return Response(
+                {"detail": f"排队中的请求不能超过 {MAX_PENDING_SELECTIONS} 个，请等待处理完成。"},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+        selection = submit_selection_request(
+            student_id,
+            serializer.validated_data['teaching_assignment'].pk,
+            serializer.validated_data.get('action', SelectionRequest.ACTION_SELECT),
+        )
+        return Response(self.get_serializer(selection).data, status=status.HTTP_202_ACCEPTED)
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from common.serializers import EagerLoadingMixin
 from .models import Department, Major
 
 class DepartmentSerializer(serializers.ModelSerializer):
@@ -7,7 +8,7 @@ class DepartmentSerializer(serializers.ModelSerializer):
         fields = ['id', 'dept_code', 'dept_name', 'office_location', 'phone_number']
         read_only_fields = ['id']
 
-class MajorSerializer(serializers.ModelSerializer):
+class MajorSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     department_name = serializers.CharField(source='department.dept_name', read_only=True, allow_null=True)
 
     class Meta:
@@ -5,7 +5,7 @@ from django.urls import reverse # 用于在 admin 中生成其他 admin 页面
 from django.utils.html import format_html # 用于在 admin 中格式化 HTML 输出
 
 # 从正确的应用导入模型
-from .models import Grade # Grade 模型在当前应用的 models.py 中
+from .models import Grade, GpaScale, GpaScaleBand # Grade 模型在当前应用的 models.py 中
 # from courses.models import TeachingAssignment # 只有在自定义表单且不使用 raw_id_fields 时才可能需要直接导入
 # from users.models import Student # 只有在自定义表单且不使用 raw_id_fields 时才可能需要直接导入
 
@@ -128,4 +128,17 @@ class GradeAdmin(admin.ModelAdmin):
     # )
 
     # --- 确保此文件中没有其他 admin.site.register(Grade, ...) 的调用 ---
-    # 上方的 @admin.register(Grade) 装饰器已经完成了注册。
\ No newline at end of file
+    # 上方的 @admin.register(Grade) 装饰器已经完成了注册。
+
+
+class GpaScaleBandInline(admin.TabularInline):
+    model = GpaScaleBand
+    extra = 0
+
+
+@admin.register(GpaScale)
+class GpaScaleAdmin(admin.ModelAdmin):
+    # 修改方案后运行 `python manage.py rescale_gpa` 重算已有成绩的绩点
+    list_display = ('name', 'version', 'department', 'degree_level', 'is_active', 'created_at')
+    list_filter = ('is_active', 'department', 'degree_level')
+    inlines = [GpaScaleBandInline]
@@ -4,16 +4,21 @@ from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 
 # 导入模型和序列化器
-from .models import Grade
+from .models import Grade, StudentAcademicSummary
 from courses.models import TeachingAssignment
 from users.models import Student, CustomUser
-from .serializers import GradeSerializer
+from .serializers import GradeBatchItemSerializer, GradeSerializer
+from .services import bulk_upsert_grades
+from .ranking import SCOPES, campus_rankings, cohort_rankings
 from users.permissions import IsAdminRole, IsTeacherRole, IsStudentRole
+from common.pagination import GradeCursorPagination
+from common.serializers import EagerLoadingViewSetMixin
 
 
-class GradeViewSet(viewsets.ModelViewSet):
+class GradeViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Grade.objects.all().order_by('student__user__username', 'teaching_assignment__semester')
     serializer_class = GradeSerializer
+    pagination_class = GradeCursorPagination
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -89,4 +94,118 @@ class StudentGradeForTeachingAssignmentView(generics.RetrieveUpdateDestroyAPIVie
         serializer.save(last_modified_by=self.request.user)
 
     def perform_destroy(self, instance):
-        instance.delete()
\ No newline at end of file
+        instance.delete()
+
+# --- 针对特定授课安排的批量成绩录入 API 视图 ---
+class TeachingAssignmentGradeBatchView(APIView):
+    """
+    批量录入或更新一个授课安排的成绩。
+
+    请求体: {"grades": [{"student_id": 1, "score": "85.5"}, ...]}，score 为 null 或空字符串表示清除分数，
+    缺少 score 的项视为错误（不会清除已有分数）。每一项按 GradeBatchItemSerializer 校验，合法的项在一个事务内批量写入，
+    受影响学生的学分只重算一次。响应中按请求顺序返回每一项的结果。
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminRole | IsTeacherRole]
+    max_batch_size = 5000
+
+    def post(self, request, teaching_assignment_id):
+        assignment = get_object_or_404(TeachingAssignment, pk=teaching_assignment_id)
+        user = request.user
+        if user.role == CustomUser.Role.TEACHER and assignment.teacher_id != user.pk:
+            return Response({"detail": "您只能录入自己授课的成绩。"}, status=status.HTTP_403_FORBIDDEN)
+
+        items = request.data.get("grades") if isinstance(request.data, dict) else None
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "请求体需包含非空的 grades 列表。"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_batch_size:
+            return Response(
+                {"detail": f"单次最多提交 {self.max_batch_size} 条成绩。"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = [None] * len(items)
+        raw_scores = []
+        positions = []
+        for index, item in enumerate(items):
+            serializer = GradeBatchItemSerializer(data=item if isinstance(item, dict) else {})
+            if serializer.is_valid():
+                raw_scores.append((serializer.validated_data["student_id"], serializer.validated_data["score"]))
+                positions.append(index)
+            else:
+                results[index] = {
+                    "student_id": item.get("student_id") if isinstance(item, dict) else None,
+                    "status": "error",
+                    "error": serializer.errors,
+                    "score": None,
+                }
+
+        for index, result in zip(positions, bulk_upsert_grades(assignment, raw_scores, user)):
+            grade = result["grade"]
+            results[index] = {
+                "student_id": result["student_id"],
+                "status": result["status"],
+                "error": result["error"],
+                "score": grade.score if grade is not None else None,
+            }
+
+        summary = {key: 0 for key in ("created", "updated", "unchanged", "error")}
+        for result in results:
+            summary[result["status"]] += 1
+
+        return Response({
+            "teaching_assignment": assignment.pk,
+            "summary": summary,
+            "results": results,
+        })
+
+
+# --- 学生排名 API 视图（管理员） ---
+class StudentRankingView(APIView):
+    """
+    按学分加权绩点的学生排名，供奖学金评定等导出使用。
+
+    查询参数：
+    - grade_year：年级，不传时返回全校所有年级；
+    - semester：学期，不传时按累计汇总排名；
+    - scope：按哪种名次排序，major / department / cohort（默认）；
+    - major、department：只返回指定专业、院系的学生。
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        params = request.query_params
+        scope = params.get("scope", "cohort")
+        if scope not in SCOPES:
+            return Response(
+                {"detail": f"scope 只能是 {' / '.join(SCOPES)}。"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        semester = params.get("semester", StudentAcademicSummary.OVERALL)
+
+        filters = {}
+        for name in ("grade_year", "major", "department"):
+            value = params.get(name)
+            if value in (None, ""):
+                continue
+            try:
+                filters[name] = int(value)
+            except ValueError:
+                return Response({"detail": f"{name} 必须是整数。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if "grade_year" in filters:
+            rows = cohort_rankings(filters["grade_year"], semester)
+        else:
+            rows = campus_rankings(semester)
+        if "major" in filters:
+            rows = [row for row in rows if row["major_id"] == filters["major"]]
+        if "department" in filters:
+            rows = [row for row in rows if row["department_id"] == filters["department"]]
+        rows = sorted(rows, key=lambda row: (
+            row["grade_year"] is not None, row["grade_year"] or 0, row["ranks"][scope]["rank"], row["student_id"],
+        ))
+
+        return Response({
+            "semester": semester,
+            "scope": scope,
+            "count": len(rows),
+            "results": rows,
+        })
@@ -0,0 +1,141 @@
+"""
+成绩写入后学分与成绩汇总的合并刷新。
+
+成绩的 post_save / post_delete 不再逐条刷新成绩汇总，而是把受影响的学生记为"待刷新"：
+- 处于事务中时，通过 transaction.on_commit 在提交后对每名学生只刷新一次；
+  事务回滚时不做任何刷新；
+- 不在事务中（自动提交）时立即刷新，行为与逐条处理一致；
+- 批量任务可以用 defer_credit_updates() 包裹写入：其间成绩信号跳过学分台账，
+  只记录学生，退出时用一次分组聚合完整重算学分并刷新汇总。
+
+    with transaction.atomic(), defer_credit_updates():
+        for ...:
+            grade.save()
+
+待刷新的学生按线程记录（Django 的数据库连接同样按线程区分）。
+刷新本身通过 utils.jobs.enqueue 提交，开启 BACKGROUND_JOBS_ASYNC 后由 worker 异步执行。
+"""
+import threading
+import weakref
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from utils.jobs import enqueue
+
+_local = threading.local()
+
+
+class _PendingRefresh:
+    """一次刷新要处理的学生：credit_ids 需要完整重算学分，summary_ids 需要刷新成绩汇总"""
+
+    def __init__(self):
+        self.credit_ids = set()
+        self.summary_ids = set()
+        self.flushed = False
+        # 已登记的提交回调（弱引用），见 _FlushOnCommit
+        self.queued = None
+
+    def add(self, student_ids, recalculate_credits):
+        student_ids = {student_id for student_id in student_ids if student_id is not None}
+        self.summary_ids |= student_ids
+        if recalculate_credits:
+            self.credit_ids |= student_ids
+
+    def flush(self):
+        self.flushed = True
+        credit_ids, summary_ids = self.credit_ids, self.summary_ids
+        self.credit_ids, self.summary_ids = set(), set()
+        if credit_ids or summary_ids:
+            # 开启后台任务时交给 worker 执行，否则在当前进程中立即执行
+            enqueue(
+                'grades.services.refresh_student_records',
+                credit_ids=sorted(credit_ids),
+                summary_ids=sorted(summary_ids),
+            )
+
+
+def _deferred_scopes():
+    if not hasattr(_local, 'scopes'):
+        _local.scopes = []
+    return _local.scopes
+
+
+def credit_updates_deferred():
+    """当前线程是否处于 defer_credit_updates() 中"""
+    return bool(_deferred_scopes())
+
+
+class _FlushOnCommit:
+    """
+    登记给 transaction.on_commit 的回调。待刷新记录只保留它的弱引用：
+    提交时回调执行并标记 flushed；所在事务或保存点回滚时 Django 丢弃回调，对象随之释放。
+    因此弱引用仍然有效且未执行，就说明回调还在等待提交，无需读取连接内部的回调队列。
+    """
+
+    def __init__(self, pending):
+        self.pending = pending
+
+    def __call__(self):
+        self.pending.flush()
+
+
+def _is_queued(pending):
+    """刷新回调是否已登记且尚未执行（所在事务或保存点回滚后不再视为已登记）"""
+    return not pending.flushed and pending.queued is not None and pending.queued() is not None
+
+
+def _schedule(pending):
+    """在事务中等到提交后刷新，否则立即刷新"""
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        if not _is_queued(pending):
+            callback = _FlushOnCommit(pending)
+            pending.queued = weakref.ref(callback)
+            transaction.on_commit(callback)
+    else:
+        pending.flush()
+
+
+def mark_students_dirty(student_ids, recalculate_credits=False):
+    """
+    记录成绩发生变化的学生。
+
+    recalculate_credits 为 True 表示学分未经台账增量更新，刷新时需要完整重算。
+    """
+    scopes = _deferred_scopes()
+    if scopes:
+        scopes[-1].add(student_ids, recalculate_credits)
+        return
+
+    connection = transaction.get_connection()
+    pending = getattr(_local, 'pending', None)
+    if pending is None or pending.flushed or (
+        connection.in_atomic_block and not _is_queued(pending)
+    ):
+        # 上一个事务已提交或已回滚，回滚时其中记录的学生无需刷新
+        pending = _local.pending = _PendingRefresh()
+    pending.add(student_ids, recalculate_credits)
+    _schedule(pending)
+
+
+@contextmanager
+def defer_credit_updates():
+    """
+    批量写入成绩时使用：其间的成绩变更不逐条更新学分台账，
+    退出时为涉及的每名学生完整重算一次学分并刷新成绩汇总（处于事务中时在提交后执行）。
+    块内抛出异常时不做刷新。可以嵌套，内层的学生并入外层一起处理。
+    """
+    scopes = _deferred_scopes()
+    pending = _PendingRefresh()
+    scopes.append(pending)
+    try:
+        yield pending
+    finally:
+        scopes.pop()
+
+    if scopes:
+        scopes[-1].credit_ids |= pending.credit_ids
+        scopes[-1].summary_ids |= pending.summary_ids
+    elif pending.summary_ids:
+        _schedule(pending)
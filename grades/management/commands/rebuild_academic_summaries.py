@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from users.models import Student
+from grades.services import refresh_academic_summaries
+
+class Command(BaseCommand):
+    help = '根据成绩原始记录重建学生成绩汇总表'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--student-id',
+            type=str,
+            help='指定学号，只重建特定学生的汇总（可选）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批处理的学生数量（默认 500）',
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.order_by('pk')
+        if options['student_id']:
+            students = students.filter(student_id_num=options['student_id'])
+            if not students.exists():
+                self.stdout.write(
+                    self.style.ERROR(f'学号为 {options["student_id"]} 的学生不存在')
+                )
+                return
+
+        student_ids = list(students.values_list('pk', flat=True))
+        self.stdout.write(f'开始为 {len(student_ids)} 名学生重建成绩汇总...')
+
+        refresh_academic_summaries(student_ids, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'成功重建了 {len(student_ids)} 名学生的成绩汇总')
+        )
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from grades.services import rescale_gpa
+
+
+class Command(BaseCommand):
+    help = '按当前启用的绩点换算方案重算全部成绩的绩点'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='只统计各分段将发生变化的成绩数量，不写入数据库',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        report = rescale_gpa(dry_run=dry_run)
+
+        for item in report:
+            scale = item['scale']
+            title = str(scale) if scale is not None else '默认绩点换算（未配置方案的学生）'
+            self.stdout.write(f"{title}: 共 {item['total']} 条成绩，{item['changed']} 条绩点将变化")
+            for band in item['bands']:
+                self.stdout.write(
+                    f"  ≥{band['min_score']:>6} → {band['gpa']}: "
+                    f"{band['total']} 条，变化 {band['changed']} 条"
+                )
+
+        changed = sum(item['changed'] for item in report)
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'试运行：共有 {changed} 条成绩的绩点将发生变化，未写入数据库'))
+        elif changed:
+            self.stdout.write(self.style.SUCCESS(f'已重算绩点，{changed} 条成绩的绩点发生变化'))
+        else:
+            self.stdout.write(self.style.SUCCESS('所有成绩的绩点均与换算方案一致，无需更新'))
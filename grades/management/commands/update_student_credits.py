@@ -1,9 +1,41 @@
-from django.core.management.base import BaseCommand
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from grades.models import Grade
+from grades.services import recalculate_credits
 from users.models import Student
-from grades.services import calculate_and_update_student_credits
+
+PROGRESS_BAR_WIDTH = 30
+
+
+def parse_since(value):
+    """解析 --since：支持 'YYYY-MM-DD' 或 'YYYY-MM-DD HH:MM[:SS]'，返回带时区的时间"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"无法解析时间 '{value}'，请使用 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS")
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def split_ranges(low, high, parts):
+    """将主键区间 [low, high] 均分为 parts 段，返回 [(起, 止), ...]（左闭右开）"""
+    step = max((high - low + 1 + parts - 1) // parts, 1)
+    return [(start, min(start + step, high + 1)) for start in range(low, high + 1, step)]
+
 
 class Command(BaseCommand):
-    help = '为所有学生重新计算并更新学分统计'
+    help = '为学生完整重算并更新学分统计（分组聚合计算，批量写回）'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -11,46 +43,87 @@ class Command(BaseCommand):
             type=str,
             help='指定学号，只更新特定学生的学分（可选）',
         )
+        parser.add_argument(
+            '--since',
+            type=str,
+            help='只更新在该时间之后录入或修改过成绩的学生，格式 YYYY-MM-DD[ HH:MM:SS]（可选）',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='按学生主键区间分段并行处理的线程数（默认 1）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='每批写回的学生数量（默认 500）',
+        )
 
     def handle(self, *args, **options):
+        students = Student.objects.all()
         if options['student_id']:
-            # 更新特定学生
-            try:
-                student = Student.objects.get(student_id_num=options['student_id'])
-                result = calculate_and_update_student_credits(student)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f"成功更新学生 {student.name} ({student.student_id_num}): "
-                        f"主修 {result['major_credits']} 学分, "
-                        f"辅修 {result['minor_credits']} 学分, "
-                        f"总计 {result['total_credits']} 学分"
-                    )
-                )
-            except Student.DoesNotExist:
+            students = students.filter(student_id_num=options['student_id'])
+            if not students.exists():
                 self.stdout.write(
                     self.style.ERROR(f'学号为 {options["student_id"]} 的学生不存在')
                 )
+                return
+        if options['since']:
+            since = parse_since(options['since'])
+            students = students.filter(pk__in=Grade.objects.filter(
+                last_modified_time__gte=since
+            ).values('student_id'))
+
+        bounds = students.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('没有需要更新学分的学生'))
+            return
+
+        self.total = students.count()
+        self.done = 0
+        self.lock = threading.Lock()
+        self.stdout.write(f'开始为 {self.total} 名学生更新学分...')
+
+        workers = max(options['workers'], 1)
+        ranges = split_ranges(bounds['low'], bounds['high'], workers)
+        batch_size = options['batch_size']
+
+        if workers == 1:
+            processed, updated = recalculate_credits(
+                students, batch_size=batch_size, progress=self.advance,
+            )
         else:
-            # 更新所有学生
-            students = Student.objects.all()
-            updated_count = 0
-            
-            self.stdout.write(f'开始为 {students.count()} 名学生更新学分...')
-            
-            for student in students:
-                try:
-                    result = calculate_and_update_student_credits(student)
-                    updated_count += 1
-                    self.stdout.write(
-                        f"✓ {student.name} ({student.student_id_num}): "
-                        f"主修 {result['major_credits']} 学分, "
-                        f"辅修 {result['minor_credits']} 学分"
-                    )
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f"✗ 更新学生 {student.name} 时出错: {str(e)}")
-                    )
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'成功更新了 {updated_count} 名学生的学分统计')
-            )
\ No newline at end of file
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(
+                    lambda bounds: self.process_range(students, bounds, batch_size), ranges,
+                ))
+            processed = sum(result[0] for result in results)
+            updated = sum(result[1] for result in results)
+
+        self.stdout.write('')
+        self.stdout.write(
+            self.style.SUCCESS(f'已重算 {processed} 名学生的学分，其中 {updated} 名学生的学分发生变化')
+        )
+
+    def process_range(self, students, bounds, batch_size):
+        start, end = bounds
+        try:
+            return recalculate_credits(
+                students.filter(pk__gte=start, pk__lt=end),
+                batch_size=batch_size, progress=self.advance,
+            )
+        finally:
+            # 每个线程使用独立的数据库连接，结束时关闭
+            connection.close()
+
+    def advance(self, count):
+        """更新进度条"""
+        with self.lock:
+            self.done += count
+            ratio = self.done / self.total if self.total else 1
+            filled = int(PROGRESS_BAR_WIDTH * ratio)
+            bar = '#' * filled + '-' * (PROGRESS_BAR_WIDTH - filled)
+            self.stdout.write(f'\r[{bar}] {ratio:6.1%} {self.done}/{self.total}', ending='')
+            self.stdout.flush()
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from users.models import Student
+from grades.services import find_credit_drift
+
+class Command(BaseCommand):
+    help = '校验学分台账与完整重算结果是否一致，可选修复偏差'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--student-id',
+            type=str,
+            help='指定学号，只校验特定学生（可选）',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='将存在偏差的学生学分修正为完整重算的结果',
+        )
+
+    def handle(self, *args, **options):
+        students = Student.objects.select_related('major', 'minor_major').order_by('student_id_num')
+        if options['student_id']:
+            students = students.filter(student_id_num=options['student_id'])
+            if not students.exists():
+                self.stdout.write(
+                    self.style.ERROR(f'学号为 {options["student_id"]} 的学生不存在')
+                )
+                return
+
+        drifted = find_credit_drift(students.iterator(chunk_size=500))
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('学分台账与重算结果一致，未发现偏差'))
+            return
+
+        for student, expected_major, expected_minor in drifted:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"✗ {student.name} ({student.student_id_num}): "
+                    f"主修 {student.credits_earned} → {expected_major}, "
+                    f"辅修 {student.minor_credits_earned} → {expected_minor}"
+                )
+            )
+
+        if options['repair']:
+            for student, expected_major, expected_minor in drifted:
+                student.credits_earned = expected_major
+                student.minor_credits_earned = expected_minor
+            Student.objects.bulk_update(
+                [student for student, _, _ in drifted],
+                ['credits_earned', 'minor_credits_earned'],
+                batch_size=500,
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'已修复 {len(drifted)} 名学生的学分偏差')
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(f'发现 {len(drifted)} 名学生学分存在偏差，使用 --repair 进行修复')
+            )
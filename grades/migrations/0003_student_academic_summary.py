@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 01:44
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0002_initial'),
+        ('users', '0003_update_credits_field_labels'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAcademicSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester', models.CharField(blank=True, default='', help_text='为空表示累计汇总', max_length=50, verbose_name='学期')),
+                ('total_courses', models.PositiveIntegerField(default=0, verbose_name='课程总数')),
+                ('graded_courses', models.PositiveIntegerField(default=0, verbose_name='已录入成绩课程数')),
+                ('passed_courses', models.PositiveIntegerField(default=0, verbose_name='及格课程数')),
+                ('failed_courses', models.PositiveIntegerField(default=0, verbose_name='不及格课程数')),
+                ('excellent_count', models.PositiveIntegerField(default=0, verbose_name='优秀(90-100)')),
+                ('good_count', models.PositiveIntegerField(default=0, verbose_name='良好(80-89)')),
+                ('average_count', models.PositiveIntegerField(default=0, verbose_name='中等(70-79)')),
+                ('pass_count', models.PositiveIntegerField(default=0, verbose_name='及格(60-69)')),
+                ('fail_count', models.PositiveIntegerField(default=0, verbose_name='不及格(<60)')),
+                ('average_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='平均分')),
+                ('weighted_average_score', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True, verbose_name='学分加权平均分')),
+                ('avg_gpa', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True, verbose_name='平均绩点')),
+                ('weighted_gpa', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True, verbose_name='学分加权绩点')),
+                ('total_credits', models.DecimalField(decimal_places=1, default=Decimal('0.0'), max_digits=6, verbose_name='课程总学分')),
+                ('earned_credits', models.DecimalField(decimal_places=1, default=Decimal('0.0'), max_digits=6, verbose_name='已获学分')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='academic_summaries', to='users.student', verbose_name='学生')),
+            ],
+            options={
+                'verbose_name': '学生成绩汇总',
+                'verbose_name_plural': '学生成绩汇总',
+                'constraints': [models.UniqueConstraint(fields=('student', 'semester'), name='unique_student_semester_summary')],
+            },
+        ),
+    ]
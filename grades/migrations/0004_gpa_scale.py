@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+DEFAULT_BANDS = [
+    ('90', '4.0'), ('85', '3.7'), ('80', '3.3'), ('75', '3.0'),
+    ('70', '2.7'), ('65', '2.3'), ('60', '2.0'), ('0', '0.0'),
+]
+
+
+def create_default_scale(apps, schema_editor):
+    """创建与原换算规则一致的全校默认方案，并为已有成绩计算绩点"""
+    GpaScale = apps.get_model('grades', 'GpaScale')
+    GpaScaleBand = apps.get_model('grades', 'GpaScaleBand')
+    Grade = apps.get_model('grades', 'Grade')
+
+    scale = GpaScale.objects.create(name='默认绩点换算', version=1, is_active=True)
+    GpaScaleBand.objects.bulk_create([
+        GpaScaleBand(scale=scale, min_score=Decimal(min_score), gpa=Decimal(gpa))
+        for min_score, gpa in DEFAULT_BANDS
+    ])
+
+    gpa_field = models.DecimalField(max_digits=3, decimal_places=2)
+    Grade.objects.update(gpa=models.Case(
+        *[
+            models.When(score__gte=Decimal(min_score), then=models.Value(Decimal(gpa), output_field=gpa_field))
+            for min_score, gpa in DEFAULT_BANDS
+        ],
+        default=None,
+        output_field=gpa_field,
+    ))
+
+
+class Migration(migrations.Migration):
+    """
+    绩点由可配置的换算方案决定，仍为普通列（加索引），写入分数时按方案用
+    UPDATE ... SET gpa = CASE ... 统一计算。
+    """
+
+    dependencies = [
+        ('departments', '0001_initial'),
+        ('grades', '0003_student_academic_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GpaScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='方案名称')),
+                ('degree_level', models.CharField(blank=True, default='', help_text='为空表示不限学位等级', max_length=20, verbose_name='适用学位等级')),
+                ('version', models.PositiveIntegerField(default=1, verbose_name='版本')),
+                ('is_active', models.BooleanField(default=False, verbose_name='启用')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('department', models.ForeignKey(blank=True, help_text='为空表示不限院系', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='gpa_scales', to='departments.department', verbose_name='适用院系')),
+            ],
+            options={
+                'verbose_name': '绩点换算方案',
+                'verbose_name_plural': '绩点换算方案',
+                'ordering': ['department', 'degree_level', '-version'],
+                'constraints': [models.UniqueConstraint(fields=('department', 'degree_level', 'version'), name='unique_gpa_scale_version')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GpaScaleBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_score', models.DecimalField(decimal_places=2, max_digits=5, validators=[django.core.validators.MinValueValidator(Decimal('0.0')), django.core.validators.MaxValueValidator(Decimal('100.0'))], verbose_name='分数下限')),
+                ('gpa', models.DecimalField(decimal_places=2, max_digits=3, verbose_name='绩点')),
+                ('scale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='grades.gpascale', verbose_name='换算方案')),
+            ],
+            options={
+                'verbose_name': '绩点换算分段',
+                'verbose_name_plural': '绩点换算分段',
+                'ordering': ['scale', '-min_score'],
+                'constraints': [models.UniqueConstraint(fields=('scale', 'min_score'), name='unique_gpa_scale_band')],
+            },
+        ),
+        migrations.AlterField(
+            model_name='grade',
+            name='gpa',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, help_text='根据分数和绩点换算方案自动计算的绩点', max_digits=3, null=True, verbose_name='绩点'),
+        ),
+        migrations.RunPython(create_default_scale, migrations.RunPython.noop),
+    ]
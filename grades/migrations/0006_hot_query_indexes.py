@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 02:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_hot_query_indexes'),
+        ('grades', '0004_gpa_scale'),
+        ('users', '0003_update_credits_field_labels'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['teaching_assignment', 'score'], name='grade_assignment_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['student', 'score'], name='grade_student_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='grade',
+            index=models.Index(fields=['-entry_time', '-id'], name='grade_entry_time_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_academic_summaries(apps, schema_editor):
+    """为已有成绩的学生生成成绩汇总，按学生主键分块调用 refresh_academic_summaries"""
+    from grades.services import refresh_academic_summaries
+
+    Grade = apps.get_model('grades', 'Grade')
+    students = Grade.objects.order_by('student_id').values_list('student_id', flat=True).distinct()
+    last_id = None
+    while True:
+        chunk = students if last_id is None else students.filter(student_id__gt=last_id)
+        student_ids = list(chunk[:BACKFILL_CHUNK_SIZE])
+        if not student_ids:
+            break
+        refresh_academic_summaries(student_ids, batch_size=BACKFILL_CHUNK_SIZE)
+        last_id = student_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('grades', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_academic_summaries, migrations.RunPython.noop),
+    ]
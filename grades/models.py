@@ -1,11 +1,300 @@
 from django.conf import settings
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.lookups import GreaterThanOrEqual
 from decimal import Decimal 
 from django.core.validators import MinValueValidator, MaxValueValidator
 from courses.models import TeachingAssignment 
 from users.models import Student 
 
 
+# 默认的百分制分数到绩点换算：(分数下限, 绩点)，从高到低排列，60 分以下为 0.0。
+# 未配置任何启用的绩点换算方案时使用，也是初始方案的内容。
+GPA_BANDS = [
+    (Decimal('90'), Decimal('4.0')),
+    (Decimal('85'), Decimal('3.7')),
+    (Decimal('80'), Decimal('3.3')),
+    (Decimal('75'), Decimal('3.0')),
+    (Decimal('70'), Decimal('2.7')),
+    (Decimal('65'), Decimal('2.3')),
+    (Decimal('60'), Decimal('2.0')),
+    (Decimal('0'), Decimal('0.0')),
+]
+
+
+def _band_gpa(bands, score):
+    if score is None:
+        return None
+    for lower_bound, gpa in bands:
+        if score >= lower_bound:
+            return gpa
+    return None
+
+
+def bands_gpa_expression(bands, score_field='score'):
+    """
+    按分段生成绩点的 CASE 表达式，未录入分数时为 NULL。
+    score_field 可以是字段名，也可以是分数表达式（如 update() 中写入的新分数）。
+    """
+    gpa_field = models.DecimalField(max_digits=3, decimal_places=2)
+    if isinstance(score_field, str):
+        conditions = [models.Q(**{f'{score_field}__gte': lower_bound}) for lower_bound, _gpa in bands]
+    else:
+        conditions = [GreaterThanOrEqual(score_field, lower_bound) for lower_bound, _gpa in bands]
+    return models.Case(
+        *[
+            models.When(condition, then=models.Value(gpa, output_field=gpa_field))
+            for condition, (_lower_bound, gpa) in zip(conditions, bands)
+        ],
+        default=None,
+        output_field=gpa_field,
+    )
+
+
+def score_to_gpa(score):
+    """按默认换算方案将百分制分数换算为绩点，未录入分数时返回 None"""
+    return _band_gpa(GPA_BANDS, score)
+
+
+def gpa_expression(score_field='score'):
+    """与 score_to_gpa 相同换算规则的数据库表达式"""
+    return bands_gpa_expression(GPA_BANDS, score_field)
+
+
+class GpaScaleQuerySet(models.QuerySet):
+    def active(self):
+        """启用中的方案，按适用范围从宽到窄排列，分段已预取"""
+        scales = list(self.filter(is_active=True).prefetch_related('bands'))
+        scales.sort(key=lambda scale: (scale.specificity, scale.pk))
+        return scales
+
+
+class GpaScale(models.Model):
+    """
+    绩点换算方案。
+
+    可以适用于全校，也可以限定院系和/或学位等级；同一适用范围可以有多个版本，
+    但同时只能启用一个。一条成绩使用与学生匹配的、范围最窄的启用方案：
+    院系+学位等级 > 院系 > 学位等级 > 全校。
+    修改方案后需运行 rescale_gpa 命令重新计算已有成绩的绩点。
+    """
+    name = models.CharField('方案名称', max_length=100)
+    department = models.ForeignKey(
+        'departments.Department',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='gpa_scales',
+        verbose_name='适用院系',
+        help_text='为空表示不限院系',
+    )
+    degree_level = models.CharField(
+        '适用学位等级', max_length=20, blank=True, default='', help_text='为空表示不限学位等级'
+    )
+    version = models.PositiveIntegerField('版本', default=1)
+    is_active = models.BooleanField('启用', default=False)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+
+    objects = GpaScaleQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = '绩点换算方案'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(
+                fields=['department', 'degree_level', 'version'],
+                name='unique_gpa_scale_version',
+            ),
+        ]
+        ordering = ['department', 'degree_level', '-version']
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+    @property
+    def specificity(self):
+        return (2 if self.department_id else 0) + (1 if self.degree_level else 0)
+
+    def matches(self, department_id, degree_level):
+        return (
+            (self.department_id is None or self.department_id == department_id)
+            and (not self.degree_level or self.degree_level == degree_level)
+        )
+
+    def band_list(self):
+        """[(分数下限, 绩点), ...]，从高到低"""
+        return [(band.min_score, band.gpa) for band in self.bands.all()]
+
+    def gpa_for(self, score):
+        return _band_gpa(self.band_list(), score)
+
+    def gpa_expression(self, score_field='score'):
+        return bands_gpa_expression(self.band_list(), score_field)
+
+    def student_filter(self, scales):
+        """
+        本方案实际适用的学生条件：与本方案匹配，且不被 scales 中范围更窄的方案覆盖。
+        各启用方案的条件互不重叠，每条成绩只属于一个方案。
+        """
+        condition = models.Q()
+        if self.department_id:
+            condition &= models.Q(department_id=self.department_id)
+        if self.degree_level:
+            condition &= models.Q(degree_level=self.degree_level)
+        for other in scales:
+            if other.pk == self.pk or other.specificity <= self.specificity:
+                continue
+            if (
+                (self.department_id and other.department_id and other.department_id != self.department_id)
+                or (self.degree_level and other.degree_level and other.degree_level != self.degree_level)
+            ):
+                continue
+            narrower = models.Q()
+            if other.department_id:
+                narrower &= models.Q(department_id=other.department_id)
+            if other.degree_level:
+                narrower &= models.Q(degree_level=other.degree_level)
+            condition &= ~narrower
+        return condition
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if self.is_active:
+            # 同一适用范围只保留一个启用的版本
+            GpaScale.objects.filter(
+                department_id=self.department_id, degree_level=self.degree_level, is_active=True,
+            ).exclude(pk=self.pk).update(is_active=False)
+
+
+class GpaScaleBand(models.Model):
+    """绩点换算分段：分数不低于 min_score 时取 gpa（取满足条件的最高分段）"""
+    scale = models.ForeignKey(GpaScale, on_delete=models.CASCADE, related_name='bands', verbose_name='换算方案')
+    min_score = models.DecimalField(
+        '分数下限', max_digits=5, decimal_places=2,
+        validators=[MinValueValidator(Decimal('0.0')), MaxValueValidator(Decimal('100.0'))],
+    )
+    gpa = models.DecimalField('绩点', max_digits=3, decimal_places=2)
+
+    class Meta:
+        verbose_name = '绩点换算分段'
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(fields=['scale', 'min_score'], name='unique_gpa_scale_band'),
+        ]
+        ordering = ['scale', '-min_score']
+
+    def __str__(self):
+        return f"≥{self.min_score}: {self.gpa}"
+
+
+GPA_SCALE_CACHE_SCOPE = 'gpa-scales'
+
+
+def active_gpa_scales():
+    """
+    启用中的方案（带缓存），供单条成绩保存等频繁调用的地方使用，避免每次写入都查询方案和分段。
+    方案或分段变化时由 grades.signals 使缓存失效。
+    """
+    from core.dashboard_cache import cached_fragment
+
+    return cached_fragment('gpa-scales', GpaScale.objects.active, scope=GPA_SCALE_CACHE_SCOPE)
+
+
+def invalidate_gpa_scales():
+    """使方案缓存失效（事务提交后会再失效一次，见 core.dashboard_cache）"""
+    from core.dashboard_cache import invalidate_generations
+
+    invalidate_generations([GPA_SCALE_CACHE_SCOPE])
+
+
+def select_gpa_scale(scales, department_id, degree_level):
+    """从 GpaScale.objects.active() 的结果中选出适用于学生的方案，没有时返回 None"""
+    matching = [scale for scale in scales if scale.matches(department_id, degree_level)]
+    return max(matching, key=lambda scale: scale.specificity) if matching else None
+
+
+def gpa_for_student(student_id, score, scales=None, student=None):
+    """
+    按适用于学生的换算方案计算绩点；没有启用的方案时使用默认换算。
+    scales 默认取缓存的启用方案；传入已加载的 student 时不再查询学生的院系和学位等级。
+    """
+    if score is None:
+        return None
+    if scales is None:
+        scales = active_gpa_scales()
+    if not scales:
+        return score_to_gpa(score)
+    if len(scales) == 1 and scales[0].specificity == 0:
+        return scales[0].gpa_for(score)
+    if student is not None:
+        profile = {'department_id': student.department_id, 'degree_level': student.degree_level}
+    else:
+        profile = Student.objects.filter(pk=student_id).values('department_id', 'degree_level').first() or {}
+    scale = select_gpa_scale(scales, profile.get('department_id'), profile.get('degree_level'))
+    return scale.gpa_for(score) if scale else score_to_gpa(score)
+
+
+class GradeQuerySet(models.QuerySet):
+    # 影响学分统计的字段
+    CREDIT_FIELDS = {'score', 'student', 'student_id', 'teaching_assignment', 'teaching_assignment_id'}
+
+    def update(self, **kwargs):
+        """
+        update()（包括 bulk_update）不经过 save() 和成绩信号：修改影响学分的字段时，
+        把涉及的学生记为待刷新（事务提交后完整重算学分和成绩汇总），修改分数时同时重算绩点。
+        """
+        if not self.CREDIT_FIELDS & set(kwargs):
+            return super().update(**kwargs)
+        from .deferred import mark_students_dirty
+
+        with transaction.atomic(using=self.db):
+            # 过滤条件可能引用被修改的字段，先取出涉及的学生
+            student_ids = set(self.order_by().values_list('student_id', flat=True).distinct())
+            new_student = kwargs.get('student', kwargs.get('student_id'))
+            if new_student is not None and not hasattr(new_student, 'resolve_expression'):
+                student_ids.add(getattr(new_student, 'pk', new_student))
+            rows = self._update_with_gpa(kwargs)
+            if rows:
+                mark_students_dirty(student_ids, recalculate_credits=True)
+        return rows
+
+    def _update_with_gpa(self, kwargs):
+        """
+        修改分数时按适用的换算方案划分成绩，每个方案一条 UPDATE，
+        在同一语句中用新分数计算绩点：SET score = 新值, gpa = CASE 新值 ...。
+        各方案覆盖的学生互不重叠，过滤条件引用 score 时也不会重复更新。
+        """
+        if 'score' not in kwargs or 'gpa' in kwargs:
+            return super().update(**kwargs)
+        from .services import _gpa_scale_partitions
+
+        score = kwargs['score']
+        if not hasattr(score, 'resolve_expression'):
+            score = models.Value(score, output_field=self.model._meta.get_field('score'))
+        rows = 0
+        for _scale, bands, subset in _gpa_scale_partitions(self):
+            rows += super(GradeQuerySet, subset).update(**kwargs, gpa=bands_gpa_expression(bands, score))
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        批量插入前按适用的换算方案计算绩点（学生的院系和学位等级一次查询取出），
+        插入冲突时更新分数的同时也更新绩点。
+        """
+        objs = list(objs)
+        scales = active_gpa_scales()
+        students = {}
+        if scales and not (len(scales) == 1 and scales[0].specificity == 0):
+            students = Student.objects.only('department_id', 'degree_level').in_bulk(
+                {obj.student_id for obj in objs if obj.score is not None}
+            )
+        for obj in objs:
+            obj.gpa = gpa_for_student(obj.student_id, obj.score, scales, student=students.get(obj.student_id))
+        update_fields = kwargs.get('update_fields')
+        if update_fields and 'score' in update_fields and 'gpa' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'gpa']
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Grade(models.Model):
     """成绩模型"""
     
@@ -32,13 +321,17 @@ class Grade(models.Model):
         validators=[MinValueValidator(Decimal('0.0')), MaxValueValidator(Decimal('100.0'))]
     )
 
+    # 按适用的绩点换算方案计算后存储。save()、bulk_create() 以及修改分数的 update() / bulk_update()
+    # 都在写入分数的同一条语句中计算；绕过 ORM 的原始 SQL 写入后需运行 rescale_gpa
     gpa = models.DecimalField(
         verbose_name='绩点',
         max_digits=3,
         decimal_places=2,
         null=True,
         blank=True,
-        help_text="根据分数自动计算的绩点"
+        db_index=True,
+        editable=False,
+        help_text="根据分数和绩点换算方案自动计算的绩点"
     )
 
     entry_time = models.DateTimeField(
@@ -56,6 +349,26 @@ class Grade(models.Model):
         verbose_name="最后修改时间", auto_now=True
     )
 
+    objects = GradeQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.record_credit_state()
+        return instance
+
+    @property
+    def credit_state(self):
+        """影响学分的字段 (学生, 授课安排, 分数)；有字段被延迟加载时返回 None"""
+        loaded = self.__dict__
+        if not all(name in loaded for name in ('student_id', 'teaching_assignment_id', 'score')):
+            return None
+        return (self.student_id, self.teaching_assignment_id, self.score)
+
+    def record_credit_state(self):
+        """记录已落库的学分相关字段，供学分台账计算增量"""
+        self._saved_credit_state = self.credit_state
+
     @property
     def term(self):
         if self.teaching_assignment:
@@ -80,28 +393,39 @@ class Grade(models.Model):
         score_display = str(self.score) if self.score is not None else "未录入"
         return f"{student_display} - {assignment_display}: {score_display}"
 
+    def _lock_saved_credit_state(self, using):
+        """锁定成绩行并重新读取已落库的学分相关字段；记录已不存在时返回 None"""
+        return Grade._base_manager.using(using).select_for_update().filter(pk=self.pk).values_list(
+            'student_id', 'teaching_assignment_id', 'score',
+        ).first()
+
     def save(self, *args, **kwargs):
-        if self.score is not None:
-            # 绩点计算逻辑
-            if self.score >= 90:
-                self.gpa = Decimal('4.0')
-            elif self.score >= 85:
-                self.gpa = Decimal('3.7')
-            elif self.score >= 80:
-                self.gpa = Decimal('3.3')
-            elif self.score >= 75:
-                self.gpa = Decimal('3.0')
-            elif self.score >= 70:
-                self.gpa = Decimal('2.7')
-            elif self.score >= 65:
-                self.gpa = Decimal('2.3')
-            elif self.score >= 60:
-                self.gpa = Decimal('2.0')
-            else:
-                self.gpa = Decimal('0.0')
-        else:
-            self.gpa = None 
-        super().save(*args, **kwargs)
+        from .deferred import credit_updates_deferred
+
+        student = self.student if Grade.student.is_cached(self) else None
+        self.gpa = gpa_for_student(self.student_id, self.score, student=student)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'score' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'gpa'}
+        if self._state.adding or self.pk is None or credit_updates_deferred():
+            super().save(*args, **kwargs)
+            return
+        # 学分台账按变更前后的状态计算增量。两个请求用各自加载的旧实例修改同一条成绩时，
+        # 加载时记录的状态已过期，这里锁定行后按已落库的状态计算
+        using = kwargs.get('using') or router.db_for_write(Grade, instance=self)
+        with transaction.atomic(using=using):
+            self._saved_credit_state = self._lock_saved_credit_state(using)
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        """与 save() 相同，按锁定后读到的状态扣除学分；记录已被并发删除时不再重复扣除"""
+        using = kwargs.get('using') or router.db_for_write(Grade, instance=self)
+        with transaction.atomic(using=using):
+            saved_state = self._lock_saved_credit_state(using)
+            if saved_state is None:
+                return 0, {}
+            self._saved_credit_state = saved_state
+            return super().delete(*args, **kwargs)
 
     class Meta:
         verbose_name = "成绩"
@@ -112,8 +436,103 @@ class Grade(models.Model):
                 name="unique_student_teaching_assignment_grade",
             )
         ]
+        indexes = [
+            # 按授课安排统计分数（成绩统计、分数段分布），索引即可覆盖聚合
+            models.Index(fields=["teaching_assignment", "score"], name="grade_assignment_score_idx"),
+            # 按学生读取及格成绩（学分计算）
+            models.Index(fields=["student", "score"], name="grade_student_score_idx"),
+            # 管理员成绩列表按录入时间倒序的键集分页
+            models.Index(fields=["-entry_time", "-id"], name="grade_entry_time_idx"),
+        ]
         ordering = [
             "student",
             "teaching_assignment__semester",
             "teaching_assignment__course__course_name",
-        ]
\ No newline at end of file
+        ]
+
+class StudentAcademicSummary(models.Model):
+    """
+    学生成绩汇总（冗余表），由成绩写入路径在同一事务内维护。
+    semester 为空字符串的记录表示全部学期的累计汇总。
+    """
+    OVERALL = ''
+
+    student = models.ForeignKey(
+        Student,
+        on_delete=models.CASCADE,
+        verbose_name='学生',
+        related_name='academic_summaries'
+    )
+    semester = models.CharField(
+        verbose_name="学期", max_length=50, blank=True, default=OVERALL,
+        help_text="为空表示累计汇总"
+    )
+
+    total_courses = models.PositiveIntegerField(verbose_name="课程总数", default=0)
+    graded_courses = models.PositiveIntegerField(verbose_name="已录入成绩课程数", default=0)
+    passed_courses = models.PositiveIntegerField(verbose_name="及格课程数", default=0)
+    failed_courses = models.PositiveIntegerField(verbose_name="不及格课程数", default=0)
+
+    excellent_count = models.PositiveIntegerField(verbose_name="优秀(90-100)", default=0)
+    good_count = models.PositiveIntegerField(verbose_name="良好(80-89)", default=0)
+    average_count = models.PositiveIntegerField(verbose_name="中等(70-79)", default=0)
+    pass_count = models.PositiveIntegerField(verbose_name="及格(60-69)", default=0)
+    fail_count = models.PositiveIntegerField(verbose_name="不及格(<60)", default=0)
+
+    average_score = models.DecimalField(
+        verbose_name="平均分", max_digits=5, decimal_places=2, null=True, blank=True
+    )
+    weighted_average_score = models.DecimalField(
+        verbose_name="学分加权平均分", max_digits=5, decimal_places=2, null=True, blank=True
+    )
+    avg_gpa = models.DecimalField(
+        verbose_name="平均绩点", max_digits=3, decimal_places=2, null=True, blank=True
+    )
+    weighted_gpa = models.DecimalField(
+        verbose_name="学分加权绩点", max_digits=3, decimal_places=2, null=True, blank=True
+    )
+    total_credits = models.DecimalField(
+        verbose_name="课程总学分", max_digits=6, decimal_places=1, default=Decimal('0.0')
+    )
+    earned_credits = models.DecimalField(
+        verbose_name="已获学分", max_digits=6, decimal_places=1, default=Decimal('0.0')
+    )
+
+    updated_at = models.DateTimeField(verbose_name="更新时间", auto_now=True)
+
+    @property
+    def is_overall(self):
+        return self.semester == self.OVERALL
+
+    @property
+    def ungraded_courses(self):
+        return self.total_courses - self.graded_courses
+
+    @property
+    def pass_rate(self):
+        if not self.total_courses:
+            return 0
+        return round(self.passed_courses / self.total_courses * 100, 1)
+
+    @property
+    def grade_distribution(self):
+        return {
+            'excellent': self.excellent_count,
+            'good': self.good_count,
+            'average': self.average_count,
+            'pass': self.pass_count,
+            'fail': self.fail_count,
+        }
+
+    def __str__(self):
+        return f"{self.student} - {self.semester or '累计'}"
+
+    class Meta:
+        verbose_name = "学生成绩汇总"
+        verbose_name_plural = verbose_name
+        constraints = [
+            models.UniqueConstraint(
+                fields=["student", "semester"],
+                name="unique_student_semester_summary",
+            )
+        ]
@@ -0,0 +1,129 @@
+"""
+学生排名（按学分加权绩点）。
+
+排名基于成绩汇总表 StudentAcademicSummary 中已按学生、学期聚合好的 weighted_gpa，
+用窗口函数在一次查询中算出每名学生的三种名次：
+- major：同年级、同专业内的名次；
+- department：同年级、同院系内的名次；
+- cohort：整个年级（grade_year）内的名次。
+
+名次使用 Rank()，绩点相同的学生名次相同；percent_rank 为 PercentRank()，
+0 表示第一名，越接近 1 越靠后。semester 为空字符串时按累计汇总排名，否则按该学期排名。
+
+结果按年级缓存，缓存键带有该年级的代数。成绩汇总刷新后把涉及学生所在年级的代数加一，
+该年级的排名随即失效，其它年级的缓存不受影响。
+"""
+from urllib.parse import quote
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import PercentRank, Rank
+
+from core.dashboard_cache import bump_generations, cached_fragment
+from users.models import Student
+
+from .models import StudentAcademicSummary
+
+SCOPES = ('major', 'department', 'cohort')
+
+CAMPUS_SCOPE = 'ranking:campus'
+
+# grade_year 参数的默认值，表示不限年级（None 表示未填写年级的学生）
+ALL_COHORTS = object()
+
+
+def cohort_scope(grade_year):
+    return f'ranking:cohort:{grade_year}'
+
+
+def _fragment_name(semester):
+    # 学期名称可能带空格等字符，编码后作为缓存键的一部分
+    return f'ranking:{quote(semester, safe="")}'
+
+
+def _partitions():
+    return {
+        'major': [F('student__grade_year'), F('student__major_id')],
+        'department': [F('student__grade_year'), F('student__department_id')],
+        'cohort': [F('student__grade_year')],
+    }
+
+
+def ranking_queryset(semester=StudentAcademicSummary.OVERALL, grade_year=ALL_COHORTS):
+    """带三种名次窗口注解的成绩汇总查询集，按年级、年级名次排序"""
+    summaries = StudentAcademicSummary.objects.filter(
+        semester=semester, weighted_gpa__isnull=False,
+    )
+    if grade_year is not ALL_COHORTS:
+        # 分区都在年级之内，先按年级过滤不影响名次
+        summaries = summaries.filter(student__grade_year=grade_year)
+
+    order = F('weighted_gpa').desc()
+    windows = {}
+    for scope, partition in _partitions().items():
+        windows[f'{scope}_rank'] = Window(Rank(), partition_by=partition, order_by=order)
+        windows[f'{scope}_percent_rank'] = Window(PercentRank(), partition_by=partition, order_by=order)
+        windows[f'{scope}_size'] = Window(Count('pk'), partition_by=partition)
+
+    return summaries.annotate(**windows).values(
+        'student_id', 'weighted_gpa', *windows,
+        student_id_num=F('student__student_id_num'),
+        name=F('student__name'),
+        grade_year=F('student__grade_year'),
+        major_id=F('student__major_id'),
+        major_name=F('student__major__major_name'),
+        department_id=F('student__department_id'),
+        department_name=F('student__department__dept_name'),
+    ).order_by(F('student__grade_year').asc(nulls_first=True), 'cohort_rank', 'student_id')
+
+
+def _ranking_row(row):
+    ranks = {
+        scope: {
+            'rank': row.pop(f'{scope}_rank'),
+            'size': row.pop(f'{scope}_size'),
+            'percent_rank': round(row.pop(f'{scope}_percent_rank'), 4),
+        }
+        for scope in SCOPES
+    }
+    row['ranks'] = ranks
+    return row
+
+
+def compute_rankings(semester=StudentAcademicSummary.OVERALL, grade_year=ALL_COHORTS):
+    """执行排名查询（不经缓存），返回按年级、年级名次排序的行列表"""
+    return [_ranking_row(row) for row in ranking_queryset(semester, grade_year)]
+
+
+def cohort_rankings(grade_year, semester=StudentAcademicSummary.OVERALL):
+    """某个年级的排名（带缓存）"""
+    return cached_fragment(
+        _fragment_name(semester),
+        lambda: compute_rankings(semester, grade_year),
+        scope=cohort_scope(grade_year),
+    )
+
+
+def campus_rankings(semester=StudentAcademicSummary.OVERALL):
+    """全校所有年级的排名（带缓存），一次查询算出"""
+    return cached_fragment(
+        _fragment_name(semester),
+        lambda: compute_rankings(semester),
+        scope=CAMPUS_SCOPE,
+    )
+
+
+def student_ranking(student, semester=StudentAcademicSummary.OVERALL):
+    """学生在所在年级排名中的一行；没有已录入绩点的成绩时返回 None"""
+    for row in cohort_rankings(student.grade_year, semester):
+        if row['student_id'] == student.pk:
+            return row
+    return None
+
+
+def invalidate_rankings(student_ids):
+    """成绩汇总变化后，使相关学生所在年级以及全校的排名缓存失效"""
+    grade_years = set(
+        Student.objects.filter(pk__in=list(student_ids)).values_list('grade_year', flat=True)
+    )
+    if grade_years:
+        bump_generations((CAMPUS_SCOPE, *(cohort_scope(year) for year in grade_years)))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 
+from common.serializers import EagerLoadingMixin
 from courses.models import Course, TeachingAssignment  
 from users.models import Student, Teacher   
 
@@ -17,6 +18,7 @@ class SimpleStudentSerializer(serializers.ModelSerializer):
             "student_id_num",
             "full_name",
         ]
+        eager_sources = ["name", "user.username"]
 
     def get_full_name(self, obj):
         return obj.name or obj.user.username
@@ -39,6 +41,7 @@ class SimpleTeacherSerializer(serializers.ModelSerializer):
             "teacher_id_num",
             "full_name",
         ]
+        eager_sources = ["name", "user.username"]
 
     def get_full_name(self, obj):
         return obj.name or obj.user.username
@@ -53,7 +56,7 @@ class SimpleTeachingAssignmentSerializer(serializers.ModelSerializer):
         fields = ["id", "course", "teacher", "semester"]
 
 
-class GradeSerializer(serializers.ModelSerializer):
+class GradeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     student = SimpleStudentSerializer(read_only=True)
     student_id = serializers.IntegerField(
         write_only=True, help_text="要录入成绩的学生的ID (Student Profile PK)"
@@ -138,3 +141,14 @@ class GradeUpdateSerializer(serializers.Serializer):
             return value
         except InvalidOperation:
             raise serializers.ValidationError("无效的分数格式，请输入数字。")
+
+
+class GradeBatchItemSerializer(GradeUpdateSerializer):
+    """批量录入中的一项：score 必须显式给出，null 或空字符串表示清除分数"""
+    score = serializers.CharField(
+        required=True,
+        allow_blank=True,
+        allow_null=True,
+        max_length=6,
+        help_text="分数 (例如 '85.5'，null 或空表示清除)",
+    )
@@ -1,27 +1,41 @@
-from decimal import Decimal, InvalidOperation
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.db.models import Sum, Q
+from django.db import connection, transaction
+from django.db.models import (
+    Avg, Case, CharField, Count, DecimalField, F, IntegerField, Max, Min, OuterRef, Q,
+    Subquery, Sum, Value, When, Window,
+)
+from django.db.models.functions import Cast, Floor, Least, Round, RowNumber
+from django.utils import timezone
 
-from courses.models import TeachingAssignment, Course
+from core.dashboard_cache import invalidate_dashboard
+from courses.models import CourseEnrollment, TeachingAssignment, Course
 from users.models import CustomUser, Student, Teacher
+from utils.jobs import enqueue
+from utils.search import index_grades
 
-from .models import Grade
+from .deferred import mark_students_dirty
+from .ranking import invalidate_rankings
+from .models import (
+    GPA_BANDS, GpaScale, Grade, StudentAcademicSummary, active_gpa_scales, bands_gpa_expression,
+    invalidate_gpa_scales,
+)
 
 
-def calculate_and_update_student_credits(student_profile):
-    """计算并更新学生的学分信息"""
-    if not isinstance(student_profile, Student):
-        return
-    
+PASSING_SCORE = Decimal("60")
+RESCALE_SUMMARY_CHUNK = 1000
+
+
+def compute_student_credits(student_profile):
+    """根据全部及格成绩完整计算学生的学分（不写库）"""
     student_major = student_profile.major
     student_minor_major = student_profile.minor_major
     
     # 获取所有及格的成绩记录
     passing_grades = Grade.objects.filter(
         student=student_profile,
-        score__gte=60
+        score__gte=PASSING_SCORE
     ).select_related('teaching_assignment__course')
     
     total_credits = 0
@@ -33,23 +47,15 @@ def calculate_and_update_student_credits(student_profile):
         course = grade.teaching_assignment.course
         course_credits = course.credits
         
-        if student_major and course.department == student_major.department:
+        if student_major and course.department_id == student_major.department_id:
             major_credits += course_credits
-        elif student_minor_major and course.department == student_minor_major.department:
+        elif student_minor_major and course.department_id == student_minor_major.department_id:
             minor_credits += course_credits
         else:
             elective_credits += course_credits
         
         total_credits += course_credits
     
-    student_profile.credits_earned = major_credits + elective_credits
-    student_profile.minor_credits_earned = minor_credits
-    
-    student_profile.save(update_fields=[
-        'credits_earned', 
-        'minor_credits_earned'
-    ])
-    
     return {
         'total_credits': total_credits,
         'major_credits': major_credits,
@@ -58,117 +64,797 @@ def calculate_and_update_student_credits(student_profile):
     }
 
 
-def get_student_grade_summary(student_profile):
-    """获取学生成绩汇总信息"""
+def calculate_and_update_student_credits(student_profile):
+    """计算并更新学生的学分信息"""
     if not isinstance(student_profile, Student):
-        return {}
+        return
     
-    all_grades = Grade.objects.filter(
-        student=student_profile
-    ).select_related('teaching_assignment__course')
+    result = compute_student_credits(student_profile)
     
-    if not all_grades.exists():
-        return {
-            'total_courses': 0,
-            'passed_courses': 0,
-            'failed_courses': 0,
-            'average_score': 0,
-            'gpa': 0,
-            'total_credits': 0,
-            'earned_credits': 0,
-        }
+    student_profile.credits_earned = result['major_credits'] + result['elective_credits']
+    student_profile.minor_credits_earned = result['minor_credits']
     
-    total_courses = all_grades.count()
-    passed_grades = all_grades.filter(score__gte=60)
-    passed_courses = passed_grades.count()
-    failed_courses = total_courses - passed_courses
-    
-    # 计算平均分
-    total_score = sum(grade.score for grade in all_grades)
-    average_score = total_score / total_courses if total_courses > 0 else 0
+    student_profile.save(update_fields=[
+        'credits_earned', 
+        'minor_credits_earned'
+    ])
     
-    # 计算 GPA (4.0制)
-    def score_to_gpa(score):
-        if score >= 90:
-            return 4.0
-        elif score >= 80:
-            return 3.0
-        elif score >= 70:
-            return 2.0
-        elif score >= 60:
-            return 1.0
+    return result
+
+
+def _credit_contributions(states):
+    """
+    计算一组成绩状态对学分的贡献。
+
+    states 为 (student_id, teaching_assignment_id, score) 元组列表，
+    返回 {(student_id, 学分字段): 学分}，不及格或未录入的成绩不产生贡献。
+    """
+    passing = [
+        state for state in states
+        if state is not None and state[2] is not None and state[2] >= PASSING_SCORE
+    ]
+    if not passing:
+        return {}
+
+    assignments = {
+        row['pk']: row
+        for row in TeachingAssignment.objects.filter(
+            pk__in={state[1] for state in passing}
+        ).values('pk', 'course__credits', 'course__department_id')
+    }
+    students = {
+        row['pk']: row
+        for row in Student.objects.filter(
+            pk__in={state[0] for state in passing}
+        ).values('pk', 'major__department_id', 'minor_major__department_id')
+    }
+
+    contributions = {}
+    for student_id, assignment_id, _score in passing:
+        assignment = assignments.get(assignment_id)
+        student = students.get(student_id)
+        if assignment is None or student is None:
+            continue
+        course_department_id = assignment['course__department_id']
+        # 与 compute_student_credits 的归类规则保持一致：辅修院系课程计入辅修，其余计入主修
+        if (
+            course_department_id != student['major__department_id']
+            and student['minor_major__department_id'] is not None
+            and course_department_id == student['minor_major__department_id']
+        ):
+            field = 'minor_credits_earned'
         else:
-            return 0.0
-    
-    total_gpa_points = sum(score_to_gpa(grade.score) for grade in all_grades)
-    gpa = total_gpa_points / total_courses if total_courses > 0 else 0
-    
-    # 计算学分
-    total_credits = sum(
-        grade.teaching_assignment.course.credits 
-        for grade in all_grades
-    )
-    earned_credits = sum(
-        grade.teaching_assignment.course.credits 
-        for grade in passed_grades
+            field = 'credits_earned'
+        key = (student_id, field)
+        contributions[key] = contributions.get(key, 0) + (assignment['course__credits'] or 0)
+    return contributions
+
+
+def apply_grade_credit_delta(previous_state, current_state):
+    """
+    学分台账：只根据单条成绩变更前后的状态增量更新学生学分。
+
+    previous_state / current_state 为 (student_id, teaching_assignment_id, score)
+    元组，新建时 previous_state 为 None，删除时 current_state 为 None。
+    通过 F 表达式原子更新，避免每次成绩写入都重新汇总学生的全部成绩。
+    """
+    if previous_state == current_state:
+        return {}
+
+    def is_passing(state):
+        return state is not None and state[2] is not None and state[2] >= PASSING_SCORE
+
+    # 同一学生、同一授课安排且及格状态未变化时学分不变，无需查询
+    if (
+        previous_state is not None and current_state is not None
+        and previous_state[:2] == current_state[:2]
+        and is_passing(previous_state) == is_passing(current_state)
+    ):
+        return {}
+
+    deltas = {}
+    for key, amount in _credit_contributions([previous_state]).items():
+        deltas[key] = deltas.get(key, 0) - amount
+    for key, amount in _credit_contributions([current_state]).items():
+        deltas[key] = deltas.get(key, 0) + amount
+
+    updates = {}
+    for (student_id, field), amount in deltas.items():
+        if amount:
+            updates.setdefault(student_id, {})[field] = F(field) + amount
+    for student_id, fields in updates.items():
+        Student.objects.filter(pk=student_id).update(**fields)
+
+    return {key: amount for key, amount in deltas.items() if amount}
+
+
+def _credit_bucket():
+    """按课程开课院系把成绩归入主修/辅修/其他（选修），与 compute_student_credits 口径一致"""
+    return Case(
+        When(
+            teaching_assignment__course__department=F('student__major__department'),
+            then=Value('major'),
+        ),
+        When(
+            teaching_assignment__course__department=F('student__minor_major__department'),
+            then=Value('minor'),
+        ),
+        default=Value('elective'),
+        output_field=CharField(),
     )
-    
+
+
+def aggregate_student_credits(grades):
+    """
+    在一条分组聚合查询中汇总一组成绩中及格部分的学分。
+
+    返回 {student_id: (主修学分（含选修）, 辅修学分)}，没有及格成绩的学生不在结果中。
+    """
+    totals = {}
+    rows = grades.filter(score__gte=PASSING_SCORE).annotate(
+        bucket=_credit_bucket()
+    ).values('student_id', 'bucket').annotate(
+        credits=Sum('teaching_assignment__course__credits')
+    ).order_by()
+    for row in rows:
+        totals.setdefault(row['student_id'], {})[row['bucket']] = row['credits'] or 0
     return {
-        'total_courses': total_courses,
-        'passed_courses': passed_courses,
-        'failed_courses': failed_courses,
-        'average_score': round(average_score, 2),
-        'gpa': round(gpa, 2),
-        'total_credits': total_credits,
-        'earned_credits': earned_credits,
+        student_id: (buckets.get('major', 0) + buckets.get('elective', 0), buckets.get('minor', 0))
+        for student_id, buckets in totals.items()
     }
 
 
-def calculate_class_grade_statistics(teaching_assignment):
-    """计算班级成绩统计信息"""
-    grades = Grade.objects.filter(teaching_assignment=teaching_assignment)
-    
-    if not grades.exists():
-        return {
-            'total_students': 0,
-            'submitted_count': 0,
-            'average_score': 0,
-            'highest_score': 0,
-            'lowest_score': 0,
-            'pass_rate': 0,
-            'score_distribution': {},
+def recalculate_credits(students, batch_size=500, progress=None):
+    """
+    完整重算一组学生（Student 查询集）的学分。
+
+    一条分组聚合算出全部学生的学分，再按主键分块读取学生当前的学分，只把有变化的
+    学生用 bulk_update 写回。progress 为可选回调，每处理一块学生调用一次，
+    参数为该块的学生数。返回 (处理人数, 更新人数)。
+    """
+    totals = aggregate_student_credits(
+        Grade.objects.filter(student__in=students.values('pk'))
+    )
+    current = students.order_by('pk').values_list('pk', 'credits_earned', 'minor_credits_earned')
+
+    processed = updated = 0
+    last_pk = None
+    while True:
+        # 按主键分块读取，不在写回期间保持打开的游标
+        chunk = current if last_pk is None else current.filter(pk__gt=last_pk)
+        rows = list(chunk[:batch_size])
+        if not rows:
+            break
+        changed = []
+        for pk, major_credits, minor_credits in rows:
+            expected_major, expected_minor = totals.get(pk, (0, 0))
+            if major_credits != expected_major or minor_credits != expected_minor:
+                changed.append(Student(
+                    pk=pk, credits_earned=expected_major, minor_credits_earned=expected_minor,
+                ))
+        if changed:
+            Student.objects.bulk_update(changed, ['credits_earned', 'minor_credits_earned'])
+        processed += len(rows)
+        updated += len(changed)
+        last_pk = rows[-1][0]
+        if progress is not None:
+            progress(len(rows))
+    return processed, updated
+
+
+def recalculate_credits_for_students(student_ids, batch_size=500):
+    """
+    批量完整重算学生学分。
+
+    在一条分组聚合查询中按课程开课院系（主修/辅修/其他）汇总及格成绩的学分，
+    再用 bulk_update 写回，查询数量与学生人数无关。
+    """
+    student_ids = list(student_ids)
+    for start in range(0, len(student_ids), batch_size):
+        chunk = student_ids[start:start + batch_size]
+        recalculate_credits(Student.objects.filter(pk__in=chunk), batch_size=batch_size)
+
+
+def refresh_student_records(credit_ids=(), summary_ids=()):
+    """成绩变更后的后续处理：完整重算 credit_ids 学生的学分，刷新 summary_ids 学生的成绩汇总"""
+    if credit_ids:
+        recalculate_credits_for_students(credit_ids)
+    if summary_ids:
+        refresh_academic_summaries(summary_ids)
+
+
+def parse_score(score_value):
+    """解析分数输入，空值返回 None，格式或范围错误时抛出 ValidationError"""
+    if score_value is None or str(score_value).strip() == "":
+        return None
+    try:
+        parsed_score = Decimal(str(score_value).strip())
+    except InvalidOperation:
+        raise ValidationError("无效的分数格式，请输入数字。")
+    if not parsed_score.is_finite() or not (Decimal("0.00") <= parsed_score <= Decimal("100.00")):
+        raise ValidationError("分数必须在 0.00 到 100.00 之间。")
+    return parsed_score
+
+
+def _upsert_conflict_options():
+    """bulk_create 冲突更新参数；MySQL 不支持指定冲突目标字段"""
+    options = {
+        'update_conflicts': True,
+        'update_fields': ['score', 'last_modified_by', 'last_modified_time'],
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['student', 'teaching_assignment']
+    return options
+
+
+def bulk_upsert_grades(teaching_assignment, raw_scores, requesting_user, batch_size=500):
+    """
+    为一个授课安排批量录入或更新成绩。
+
+    raw_scores 为 [(student_pk, 原始分数), ...]。选课记录和已有成绩各用一次查询预取，
+    所有分数先在内存中校验，再通过 bulk_create / bulk_update 写入，事务提交后对受影响的
+    学生统一重算一次学分，因此查询数量不随学生人数增长。
+
+    返回与输入顺序一致的结果列表，每项包含 student_id、student、status
+    ('created' / 'updated' / 'unchanged' / 'error')、error 和 grade。
+    """
+    enrollments = {
+        enrollment.student_id: enrollment
+        for enrollment in CourseEnrollment.objects.filter(
+            teaching_assignment=teaching_assignment
+        ).exclude(status=CourseEnrollment.STATUS_WAITLISTED).select_related('student')
+    }
+    existing_grades = {
+        grade.student_id: grade
+        for grade in Grade.objects.filter(teaching_assignment=teaching_assignment)
+    }
+
+    unknown_ids = {student_pk for student_pk, _ in raw_scores if student_pk not in enrollments}
+    known_students = Student.objects.only(
+        'pk', 'name', 'student_id_num'
+    ).in_bulk(unknown_ids) if unknown_ids else {}
+
+    results = []
+    to_create = {}
+    to_update = {}
+    now = timezone.now()
+
+    for student_pk, raw_score in raw_scores:
+        result = {
+            'student_id': student_pk, 'student': None, 'status': 'error', 'error': None, 'grade': None,
         }
+        results.append(result)
+
+        enrollment = enrollments.get(student_pk)
+        if enrollment is None:
+            result['student'] = known_students.get(student_pk)
+            result['error'] = "未找到选课记录" if result['student'] else "学生不存在"
+            continue
+        result['student'] = enrollment.student
+        if enrollment.status != 'ENROLLED':
+            result['error'] = f"选课状态为 '{enrollment.status}'，不是 'ENROLLED'"
+            continue
+
+        try:
+            score = parse_score(raw_score)
+        except ValidationError as e:
+            result['error'] = e.messages[0]
+            continue
+
+        grade = existing_grades.get(student_pk) or to_create.get(student_pk)
+        if grade is None:
+            grade = Grade(
+                student=enrollment.student,
+                teaching_assignment=teaching_assignment,
+                score=score,
+                last_modified_by=requesting_user,
+            )
+            to_create[student_pk] = grade
+            result['status'] = 'created'
+        elif grade.pk is not None and grade.score == score and student_pk not in to_update:
+            result['status'] = 'unchanged'
+        else:
+            grade.score = score
+            grade.last_modified_by = requesting_user
+            grade.last_modified_time = now
+            if grade.pk is not None:
+                to_update[student_pk] = grade
+            result['status'] = 'created' if grade.pk is None else 'updated'
+        result['grade'] = grade
+
+    if to_create or to_update:
+        with transaction.atomic():
+            if to_update:
+                Grade.objects.bulk_update(
+                    list(to_update.values()),
+                    ['score', 'last_modified_by', 'last_modified_time'],
+                    batch_size=batch_size,
+                )
+            if to_create:
+                Grade.objects.bulk_create(
+                    list(to_create.values()), batch_size=batch_size, **_upsert_conflict_options()
+                )
+            affected_students = set(to_create) | set(to_update)
+            # bulk 写入不会触发 post_save，提交后为受影响学生统一重算一次学分和成绩汇总
+            mark_students_dirty(affected_students, recalculate_credits=True)
+            if to_create:
+                # 新成绩需要检索文档；更新只改分数，不影响检索内容
+                index_grades(Grade.objects.filter(
+                    teaching_assignment=teaching_assignment, student_id__in=list(to_create),
+                ))
+            if affected_students:
+                invalidate_dashboard([teaching_assignment.teacher_id])
+
+    return results
+
+
+def _gpa_scale_partitions(grades, scales=None):
+    """
+    将成绩按适用的绩点换算方案划分，返回 [(方案或 None, 分段, 成绩查询集), ...]。
+    各部分互不重叠；没有全校方案时，未被任何方案覆盖的学生使用默认换算（方案为 None）。
+    """
+    scales = active_gpa_scales() if scales is None else scales
+    partitions = []
+    covered = Q()
+    for scale in scales:
+        condition = scale.student_filter(scales)
+        subset = grades
+        if condition:
+            subset = grades.filter(student_id__in=Student.objects.filter(condition).values('pk'))
+        partitions.append((scale, scale.band_list(), subset))
+        covered |= scale.student_filter([])
+
+    if not any(scale.specificity == 0 for scale in scales):
+        default = grades
+        if covered:
+            default = grades.exclude(student_id__in=Student.objects.filter(covered).values('pk'))
+        partitions.append((None, GPA_BANDS, default))
+    return partitions
+
+
+def apply_gpa_scales(grades, scales=None):
+    """
+    按适用的换算方案重新计算一组成绩的绩点。
+    每个方案一条 UPDATE ... SET gpa = CASE ... 语句，不逐行处理；返回更新的行数。
+    """
+    updated = 0
+    for _scale, bands, subset in _gpa_scale_partitions(grades, scales):
+        updated += subset.update(gpa=bands_gpa_expression(bands))
+    return updated
+
+
+def gpa_rescale_report(grades=None, scales=None):
+    """
+    预估按当前启用的方案重算绩点的影响（不写库）。
+    每个方案一条分组查询，返回 [{'scale', 'bands': [{min_score, gpa, total, changed}], 'total', 'changed'}]。
+    """
+    if grades is None:
+        grades = Grade.objects.all()
+    report = []
+    for scale, bands, subset in _gpa_scale_partitions(grades.filter(score__isnull=False), scales):
+        band = Case(
+            *[When(score__gte=lower_bound, then=Value(lower_bound)) for lower_bound, _gpa in bands],
+            default=None,
+            output_field=DecimalField(max_digits=5, decimal_places=2),
+        )
+        changed = (
+            Q(gpa__lt=F('new_gpa')) | Q(gpa__gt=F('new_gpa'))
+            | Q(gpa__isnull=True, new_gpa__isnull=False)
+            | Q(gpa__isnull=False, new_gpa__isnull=True)
+        )
+        rows = subset.annotate(band=band, new_gpa=bands_gpa_expression(bands)).values('band').annotate(
+            total=Count('pk'), changed=Count('pk', filter=changed),
+        ).order_by()
+        counts = {row['band']: row for row in rows}
+        band_rows = [
+            {
+                'min_score': lower_bound,
+                'gpa': gpa,
+                'total': counts.get(lower_bound, {}).get('total', 0),
+                'changed': counts.get(lower_bound, {}).get('changed', 0),
+            }
+            for lower_bound, gpa in bands
+        ]
+        report.append({
+            'scale': scale,
+            'bands': band_rows,
+            'total': sum(row['total'] for row in counts.values()),
+            'changed': sum(row['changed'] for row in counts.values()),
+        })
+    return report
+
+
+def rescale_gpa(dry_run=False):
+    """
+    按当前启用的绩点换算方案重算全部成绩的绩点，返回 gpa_rescale_report 的结果。
+    绩点有变化时刷新涉及学生的成绩汇总（通过后台任务）并使首页统计失效。
+    """
+    scales = GpaScale.objects.active()
+    if not dry_run:
+        # 分段可能是用 bulk_create 写入的（不触发信号），以本次读取的方案为准
+        invalidate_gpa_scales()
+    report = gpa_rescale_report(scales=scales)
+    if dry_run or not any(item['changed'] for item in report):
+        return report
+
+    with transaction.atomic():
+        apply_gpa_scales(Grade.objects.all(), scales=scales)
+
+    student_ids = list(Grade.objects.values_list('student_id', flat=True).distinct().order_by())
+    for start in range(0, len(student_ids), RESCALE_SUMMARY_CHUNK):
+        enqueue(
+            'grades.services.refresh_student_records',
+            summary_ids=student_ids[start:start + RESCALE_SUMMARY_CHUNK],
+        )
+    invalidate_dashboard()
+    return report
+
+
+def find_credit_drift(students):
+    """
+    将台账中的学分与完整重算结果比较，返回存在偏差的学生列表。
+
+    每项为 (student, 期望主修学分, 期望辅修学分)。
+    """
+    drifted = []
+    for student in students:
+        result = compute_student_credits(student)
+        expected_major = Decimal(result['major_credits'] + result['elective_credits'])
+        expected_minor = Decimal(result['minor_credits'])
+        if (
+            Decimal(student.credits_earned) != expected_major
+            or Decimal(student.minor_credits_earned) != expected_minor
+        ):
+            drifted.append((student, expected_major, expected_minor))
+    return drifted
+
+
+def weighted_gpa_subquery(semester=None):
+    """
+    学生按学分加权的 GPA（保留两位小数）相关子查询。
+
+    用于 Student 查询集的 annotate，口径与 Student.calculate_cumulative_gpa 一致：
+    只统计已有绩点且学分大于 0 的成绩；没有此类成绩时结果为 NULL。
+    """
+    grades = Grade.objects.filter(
+        student=OuterRef('pk'),
+        gpa__isnull=False,
+        teaching_assignment__course__credits__gt=0,
+    )
+    if semester:
+        grades = grades.filter(teaching_assignment__semester=semester)
+
+    weighted = grades.order_by().values('student').annotate(
+        weighted_gpa=Round(
+            Sum(F('gpa') * F('teaching_assignment__course__credits'))
+            / Sum('teaching_assignment__course__credits'),
+            2,
+        )
+    ).values('weighted_gpa')
+    return Subquery(weighted, output_field=DecimalField(max_digits=4, decimal_places=2))
+
+
+def _quantize(value, places="0.01"):
+    if value is None:
+        return None
+    return Decimal(value).quantize(Decimal(places), rounding=ROUND_HALF_UP)
+
+
+def grade_statistics_aggregates():
+    """
+    成绩统计所需的全部条件聚合表达式。
+
+    既可以直接传给 aggregate() 在一次查询中统计一组成绩，
+    也可以配合 values() 分组用于 annotate()。
+    """
+    credits = F('teaching_assignment__course__credits')
+    graded = Q(score__isnull=False)
+    return {
+        'total_courses': Count('pk'),
+        'graded_courses': Count('pk', filter=graded),
+        'passed_courses': Count('pk', filter=Q(score__gte=PASSING_SCORE)),
+        'excellent_count': Count('pk', filter=Q(score__gte=90)),
+        'good_count': Count('pk', filter=Q(score__gte=80, score__lt=90)),
+        'average_count': Count('pk', filter=Q(score__gte=70, score__lt=80)),
+        'pass_count': Count('pk', filter=Q(score__gte=60, score__lt=70)),
+        'fail_count': Count('pk', filter=Q(score__lt=60)),
+        'score_sum': Sum('score'),
+        'weighted_score_sum': Sum(F('score') * credits, filter=graded),
+        'graded_credits': Sum(credits, filter=graded),
+        'gpa_sum': Sum('gpa'),
+        'gpa_count': Count('gpa'),
+        'weighted_gpa_sum': Sum(F('gpa') * credits, filter=Q(gpa__isnull=False)),
+        'gpa_credits': Sum(credits, filter=Q(gpa__isnull=False)),
+        'total_credits': Sum(credits),
+        'earned_credits': Sum(credits, filter=Q(score__gte=PASSING_SCORE)),
+    }
+
+
+_STATISTICS_COUNT_FIELDS = (
+    'total_courses', 'graded_courses', 'passed_courses', 'excellent_count',
+    'good_count', 'average_count', 'pass_count', 'fail_count', 'gpa_count',
+)
+_STATISTICS_SUM_FIELDS = (
+    'score_sum', 'weighted_score_sum', 'graded_credits', 'gpa_sum',
+    'weighted_gpa_sum', 'gpa_credits', 'total_credits', 'earned_credits',
+)
+
+
+def summarize_grade_statistics(totals):
+    """由 grade_statistics_aggregates() 的计数与求和结果计算各项统计指标"""
+    def ratio(numerator, denominator):
+        if not denominator or numerator is None:
+            return None
+        return Decimal(numerator) / Decimal(denominator)
+
+    return {
+        'total_courses': totals['total_courses'],
+        'graded_courses': totals['graded_courses'],
+        'passed_courses': totals['passed_courses'],
+        'failed_courses': totals['graded_courses'] - totals['passed_courses'],
+        'excellent_count': totals['excellent_count'],
+        'good_count': totals['good_count'],
+        'average_count': totals['average_count'],
+        'pass_count': totals['pass_count'],
+        'fail_count': totals['fail_count'],
+        'average_score': _quantize(ratio(totals['score_sum'], totals['graded_courses'])),
+        'weighted_average_score': _quantize(ratio(totals['weighted_score_sum'], totals['graded_credits'])),
+        'avg_gpa': _quantize(ratio(totals['gpa_sum'], totals['gpa_count'])),
+        'weighted_gpa': _quantize(ratio(totals['weighted_gpa_sum'], totals['gpa_credits'])),
+        'total_credits': _quantize(totals['total_credits'] or 0, "0.1"),
+        'earned_credits': _quantize(totals['earned_credits'] or 0, "0.1"),
+    }
+
+
+def grade_statistics(queryset):
+    """在一次 aggregate() 查询中计算一组成绩的全部统计指标"""
+    totals = queryset.order_by().aggregate(**grade_statistics_aggregates())
+    return summarize_grade_statistics(totals)
+
+
+def compute_academic_summaries(student_ids):
+    """
+    从成绩原始记录计算学生的累计及分学期汇总（不写库）。
+
+    按 (学生, 学期) 分组一次查询得到计数与求和，累计汇总由各学期结果相加得到。
+    返回 {student_id: [累计汇总, 学期汇总, ...]}，每个学生都会有一条累计汇总。
+    """
+    student_ids = list(student_ids)
+    overall = {
+        student_id: dict.fromkeys(_STATISTICS_COUNT_FIELDS + _STATISTICS_SUM_FIELDS, 0)
+        for student_id in student_ids
+    }
+    summaries = {student_id: [] for student_id in student_ids}
+
+    rows = Grade.objects.filter(student_id__in=student_ids).values(
+        'student_id', 'teaching_assignment__semester'
+    ).annotate(**grade_statistics_aggregates()).order_by()
+    for row in rows:
+        student_id = row['student_id']
+        summaries[student_id].append(StudentAcademicSummary(
+            student_id=student_id,
+            semester=row['teaching_assignment__semester'],
+            **summarize_grade_statistics(row),
+        ))
+        for field in _STATISTICS_COUNT_FIELDS + _STATISTICS_SUM_FIELDS:
+            overall[student_id][field] += row[field] or 0
+
+    for student_id, totals in overall.items():
+        summaries[student_id].insert(0, StudentAcademicSummary(
+            student_id=student_id,
+            semester=StudentAcademicSummary.OVERALL,
+            **summarize_grade_statistics(totals),
+        ))
+    return summaries
+
+
+def refresh_academic_summaries(student_ids, batch_size=500):
+    """在事务中重建指定学生的成绩汇总记录，并使这些学生所在年级的排名缓存失效"""
+    student_ids = list(student_ids)
+    for start in range(0, len(student_ids), batch_size):
+        chunk = student_ids[start:start + batch_size]
+        summaries = compute_academic_summaries(chunk)
+        with transaction.atomic():
+            StudentAcademicSummary.objects.filter(student_id__in=chunk).delete()
+            StudentAcademicSummary.objects.bulk_create(
+                [summary for rows in summaries.values() for summary in rows],
+                batch_size=batch_size,
+            )
+    invalidate_rankings(student_ids)
+
+
+def get_academic_summary(student_profile, semester=StudentAcademicSummary.OVERALL):
+    """读取学生的成绩汇总；尚未生成时用一次聚合查询临时计算（不写库）"""
+    summary = StudentAcademicSummary.objects.filter(
+        student=student_profile, semester=semester
+    ).first()
+    if summary is None:
+        grades = Grade.objects.filter(student=student_profile)
+        if semester != StudentAcademicSummary.OVERALL:
+            grades = grades.filter(teaching_assignment__semester=semester)
+        summary = StudentAcademicSummary(
+            student=student_profile, semester=semester, **grade_statistics(grades)
+        )
+    return summary
+
+
+def get_student_grade_summary(student_profile):
+    """获取学生成绩汇总信息"""
+    if not isinstance(student_profile, Student):
+        return {}
     
-    scores = [grade.score for grade in grades]
-    total_students = grades.count()
-    
-    average_score = sum(scores) / len(scores)
-    highest_score = max(scores)
-    lowest_score = min(scores)
-    
-    # 及格率
-    passing_count = len([s for s in scores if s >= 60])
-    pass_rate = (passing_count / total_students) * 100
+    summary = get_academic_summary(student_profile)
     
-    # 分数段分布
-    score_distribution = {
-        '90-100': len([s for s in scores if 90 <= s <= 100]),
-        '80-89': len([s for s in scores if 80 <= s < 90]),
-        '70-79': len([s for s in scores if 70 <= s < 80]),
-        '60-69': len([s for s in scores if 60 <= s < 70]),
-        '0-59': len([s for s in scores if s < 60]),
+    return {
+        'total_courses': summary.total_courses,
+        'passed_courses': summary.passed_courses,
+        'failed_courses': summary.failed_courses,
+        'average_score': summary.average_score or 0,
+        'gpa': summary.avg_gpa or 0,
+        'total_credits': summary.total_credits,
+        'earned_credits': summary.earned_credits,
     }
-    
+
+
+SCORE_CEILING = 100
+DEFAULT_PERCENTILES = (25, 50, 75)
+
+# 原有的五段分数分布（保持返回结构兼容）
+SCORE_DISTRIBUTION_BANDS = {
+    '90-100': Q(score__gte=90, score__lte=100),
+    '80-89': Q(score__gte=80, score__lt=90),
+    '70-79': Q(score__gte=70, score__lt=80),
+    '60-69': Q(score__gte=60, score__lt=70),
+    '0-59': Q(score__lt=60),
+}
+
+
+def _histogram_bins(bin_width):
+    """按宽度划分 [0, 100] 的分数段，最后一段包含满分"""
+    bin_count = -(-SCORE_CEILING // bin_width)
+    bins = {}
+    for index in range(bin_count):
+        lower = index * bin_width
+        upper = SCORE_CEILING if index == bin_count - 1 else lower + bin_width - 1
+        bins[index] = f'{lower}-{upper}'
+    return bins
+
+
+def _percentile_positions(submitted, percentile):
+    """线性插值所需的两个行号（从 1 开始）及插值权重"""
+    rank = Decimal(percentile) / 100 * (submitted - 1)
+    lower = int(rank)
+    return lower + 1, min(lower + 2, submitted), rank - lower
+
+
+def _population_stddev(count, total, square_total):
+    """由计数、和、平方和计算总体标准差（各数据库行为一致，且自动忽略空分数）"""
+    mean = Decimal(str(total)) / count
+    variance = Decimal(str(square_total)) / count - mean * mean
+    return _quantize(max(variance, Decimal(0)).sqrt())
+
+
+def empty_section_statistics(bin_width=10, percentiles=DEFAULT_PERCENTILES):
+    """没有任何成绩记录的授课安排的统计结果"""
     return {
-        'total_students': total_students,
-        'submitted_count': total_students,
-        'average_score': round(average_score, 2),
-        'highest_score': highest_score,
-        'lowest_score': lowest_score,
-        'pass_rate': round(pass_rate, 2),
-        'score_distribution': score_distribution,
+        'total_students': 0,
+        'submitted_count': 0,
+        'average_score': 0,
+        'highest_score': 0,
+        'lowest_score': 0,
+        'stddev': None,
+        'median': None,
+        'percentiles': {percentile: None for percentile in percentiles},
+        'pass_rate': 0,
+        'histogram': {label: 0 for label in _histogram_bins(bin_width).values()},
+        'score_distribution': {},
+    }
+
+
+def section_grade_statistics(teaching_assignments, bin_width=10, percentiles=DEFAULT_PERCENTILES):
+    """
+    在数据库中批量计算多个授课安排的成绩统计，返回 {授课安排ID: 统计结果}。
+
+    teaching_assignments 可以是授课安排查询集、实例或主键列表。无论涉及多少个
+    授课安排，都只执行三次查询：基础聚合、分数段直方图、百分位所在行。
+    未录入分数的记录计入总人数，但不参与均值、极值、及格率等统计。
+    没有任何成绩记录的授课安排不会出现在结果中。
+    """
+    if bin_width <= 0:
+        raise ValueError('分数段宽度必须为正整数')
+
+    grades = Grade.objects.filter(teaching_assignment__in=teaching_assignments).order_by()
+    scored = grades.filter(score__isnull=False)
+    bins = _histogram_bins(bin_width)
+
+    # 1. 基础聚合：人数、均值、极值、标准差、及格人数及五段分布
+    band_counts = {
+        f'band_{index}': Count('id', filter=condition)
+        for index, condition in enumerate(SCORE_DISTRIBUTION_BANDS.values())
+    }
+    results = {}
+    for row in grades.values('teaching_assignment_id').annotate(
+        total_students=Count('id'),
+        submitted_count=Count('score'),
+        average_score=Avg('score'),
+        highest_score=Max('score'),
+        lowest_score=Min('score'),
+        score_sum=Sum('score'),
+        score_square_sum=Sum(F('score') * F('score')),
+        passed_count=Count('id', filter=Q(score__gte=PASSING_SCORE)),
+        **band_counts,
+    ):
+        statistics = empty_section_statistics(bin_width, percentiles)
+        statistics['total_students'] = row['total_students']
+        submitted = statistics['submitted_count'] = row['submitted_count']
+        if submitted:
+            statistics.update({
+                'average_score': _quantize(row['average_score']),
+                'highest_score': row['highest_score'],
+                'lowest_score': row['lowest_score'],
+                'stddev': _population_stddev(submitted, row['score_sum'], row['score_square_sum']),
+                'pass_rate': _quantize(Decimal(row['passed_count']) * 100 / submitted),
+                'score_distribution': {
+                    label: row[f'band_{index}']
+                    for index, label in enumerate(SCORE_DISTRIBUTION_BANDS)
+                },
+            })
+        results[row['teaching_assignment_id']] = statistics
+
+    if not any(statistics['submitted_count'] for statistics in results.values()):
+        return results
+
+    # 2. 直方图：按 floor(score / 宽度) 分组计数，满分并入最后一段
+    for row in scored.annotate(
+        bucket=Least(
+            Cast(Floor(F('score') / Value(bin_width)), IntegerField()),
+            Value(len(bins) - 1),
+        )
+    ).values('teaching_assignment_id', 'bucket').annotate(count=Count('id')):
+        results[row['teaching_assignment_id']]['histogram'][bins[row['bucket']]] = row['count']
+
+    # 3. 百分位：按分数排序编号，只取线性插值需要的行
+    wanted_percentiles = set(percentiles) | {50}
+    wanted_positions = set()
+    for statistics in results.values():
+        for percentile in wanted_percentiles:
+            if statistics['submitted_count']:
+                lower, upper, _ = _percentile_positions(statistics['submitted_count'], percentile)
+                wanted_positions.update((lower, upper))
+
+    ranked_scores = {
+        (row['teaching_assignment_id'], row['position']): row['score']
+        for row in scored.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F('teaching_assignment_id')],
+                order_by=[F('score').asc(), F('id').asc()],
+            )
+        ).filter(position__in=wanted_positions).values('teaching_assignment_id', 'position', 'score')
     }
 
+    for assignment_id, statistics in results.items():
+        submitted = statistics['submitted_count']
+        if not submitted:
+            continue
+        values = {}
+        for percentile in wanted_percentiles:
+            lower, upper, weight = _percentile_positions(submitted, percentile)
+            low_score = ranked_scores[(assignment_id, lower)]
+            high_score = ranked_scores[(assignment_id, upper)]
+            values[percentile] = _quantize(low_score + (high_score - low_score) * weight)
+        statistics['median'] = values[50]
+        statistics['percentiles'] = {percentile: values[percentile] for percentile in percentiles}
+
+    return results
+
+
+def calculate_class_grade_statistics(teaching_assignment, bin_width=10, percentiles=DEFAULT_PERCENTILES):
+    """计算班级成绩统计信息"""
+    return section_grade_statistics(
+        [teaching_assignment.pk], bin_width=bin_width, percentiles=percentiles,
+    ).get(teaching_assignment.pk) or empty_section_statistics(bin_width, percentiles)
+
 def create_or_update_grade(
     student_id: int,
     teaching_assignment_id: int,
@@ -196,14 +882,7 @@ def create_or_update_grade(
     ):
         raise PermissionError("您没有权限为该授课安排录入或修改成绩。")
 
-    parsed_score = None
-    if score_value is not None and str(score_value).strip() != "":
-        try:
-            parsed_score = Decimal(str(score_value))
-            if not (Decimal("0.00") <= parsed_score <= Decimal("100.00")):
-                raise ValidationError("分数必须在 0.00 到 100.00 之间。")
-        except InvalidOperation:
-            raise ValidationError("无效的分数格式，请输入数字。")
+    parsed_score = parse_score(score_value)
 
     grade, created = Grade.objects.get_or_create(
         student=student,
@@ -217,7 +896,4 @@ def create_or_update_grade(
             grade.last_modified_by = requesting_user
             grade.save()
 
-    # 更新学分信息
-    calculate_and_update_student_credits(student)
-
     return grade
@@ -1,13 +1,118 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Grade
-from .services import calculate_and_update_student_credits 
+from .models import GpaScale, GpaScaleBand, Grade, invalidate_gpa_scales
+from .deferred import credit_updates_deferred, mark_students_dirty
+from .services import apply_grade_credit_delta
+from core.dashboard_cache import invalidate_dashboard
+from courses.models import Course, TeachingAssignment
+from departments.models import Department
+from users.models import Student, Teacher
 
-@receiver([post_save, post_delete], sender=Grade)
-def trigger_credit_recalculation(sender, instance, **kwargs):
+
+@receiver(post_save, sender=Grade)
+def trigger_credit_recalculation(sender, instance, created, raw=False, **kwargs):
+    """
+    当一个成绩被保存时，按变更前后的状态增量更新学生学分（学分台账），
+    并将学生记为待刷新成绩汇总（事务提交后每名学生只刷新一次）。
+    """
+    if raw:
+        # fixture 导入的数据自带学分，不做处理
+        return
+
+    current_state = instance.credit_state
+    previous_state = None if created else getattr(instance, '_saved_credit_state', None)
+
+    affected_students = {instance.student_id}
+    if previous_state is not None:
+        affected_students.add(previous_state[0])
+
+    # 批量写入期间或无法确定变更前状态时，不走台账，刷新时完整重算
+    recalculate = credit_updates_deferred() or current_state is None or (
+        not created and previous_state is None
+    )
+    if not recalculate:
+        apply_grade_credit_delta(previous_state, current_state)
+    mark_students_dirty(affected_students, recalculate_credits=recalculate)
+
+    instance.record_credit_state()
+
+
+@receiver(post_delete, sender=Grade)
+def trigger_credit_deduction(sender, instance, **kwargs):
     """
-    当一个成绩被保存或删除时，触发学生学分重新计算。
+    当一个成绩被删除时，从学生学分中扣除该成绩的贡献，并将学生记为待刷新成绩汇总。
     """
-    # instance 是 Grade 对象，从中获取学生 profile
-    student_profile = instance.student
-    calculate_and_update_student_credits(student_profile)
\ No newline at end of file
+    previous_state = getattr(instance, '_saved_credit_state', None) or instance.credit_state
+
+    recalculate = credit_updates_deferred() or previous_state is None
+    if not recalculate:
+        apply_grade_credit_delta(previous_state, None)
+    mark_students_dirty({instance.student_id}, recalculate_credits=recalculate)
+
+
+def _grade_teacher_ids(instance):
+    """成绩所属授课安排的教师（教师主键即其用户主键）"""
+    if Grade.teaching_assignment.is_cached(instance):
+        return [instance.teaching_assignment.teacher_id]
+    return TeachingAssignment.objects.filter(
+        pk=instance.teaching_assignment_id
+    ).values_list('teacher_id', flat=True)
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+def invalidate_dashboard_for_grade(sender, instance, **kwargs):
+    """成绩变动后，使首页的全局统计和对应教师的成绩分布缓存失效"""
+    invalidate_dashboard(_grade_teacher_ids(instance))
+
+
+@receiver(post_save, sender=TeachingAssignment)
+@receiver(post_delete, sender=TeachingAssignment)
+def invalidate_dashboard_for_assignment(sender, instance, **kwargs):
+    """授课安排变动（包括更换教师）后，使新旧教师的成绩分布缓存失效"""
+    teacher_ids = {instance.teacher_id, getattr(instance, '_saved_teacher_id', None)} - {None}
+    invalidate_dashboard(teacher_ids)
+
+
+@receiver(post_save, sender=Course)
+def refresh_students_for_course(sender, instance, created, raw=False, **kwargs):
+    """课程学分或开课院系变化后，修过该课程的学生需要完整重算学分并刷新成绩汇总"""
+    if raw or created:
+        return
+    if getattr(instance, '_saved_credit_state', None) == (instance.credits, instance.department_id):
+        return
+    student_ids = Grade.objects.filter(teaching_assignment__course=instance).values_list('student_id', flat=True)
+    mark_students_dirty(set(student_ids), recalculate_credits=True)
+
+
+@receiver(post_save, sender=TeachingAssignment)
+def refresh_students_for_assignment(sender, instance, created, raw=False, **kwargs):
+    """授课安排更换课程或学期后，其学生的学分和分学期成绩汇总需要刷新"""
+    if raw or created:
+        return
+    if getattr(instance, '_saved_summary_state', None) == (instance.course_id, instance.semester):
+        return
+    student_ids = Grade.objects.filter(teaching_assignment=instance).values_list('student_id', flat=True)
+    mark_students_dirty(set(student_ids), recalculate_credits=True)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_dashboard_counts(sender, **kwargs):
+    """学生、教师、课程、院系的增删影响首页的数量统计"""
+    invalidate_dashboard()
+
+
+@receiver(post_save, sender=GpaScale)
+@receiver(post_delete, sender=GpaScale)
+@receiver(post_save, sender=GpaScaleBand)
+@receiver(post_delete, sender=GpaScaleBand)
+def invalidate_gpa_scale_cache(sender, **kwargs):
+    """绩点换算方案或分段变动后，使单条成绩保存时使用的方案缓存失效"""
+    invalidate_gpa_scales()
@@ -6,6 +6,9 @@ from django.urls import reverse
 from decimal import Decimal
 
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.db.utils import IntegrityError as DjangoIntegrityError
 
 from users.models import CustomUser, Student, Teacher 
@@ -22,6 +25,9 @@ User = get_user_model()
 class GradeModelTest(TestCase):
     """测试Grade模型及GPA计算和验证"""
     def setUp(self):
+        # 换算方案缓存不随测试事务回滚，每个测试从空缓存开始
+        caches['dashboard'].clear()
+        self.addCleanup(caches['dashboard'].clear)
         self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
         self.major = Major.objects.create(major_name="软件工程", department=self.department, bachelor_credits_required=Decimal('120.0')) 
 
@@ -80,6 +86,121 @@ class GradeModelTest(TestCase):
         grade_b = Grade.objects.create(student=self.student_profile, teaching_assignment=grade_b_ta, score=Decimal('59.9'))
         self.assertEqual(grade_b.gpa, Decimal('0.0'))
 
+    def test_score_updates_keep_gpa_consistent(self):
+        """测试不经过 save() 的分数修改（update / bulk_update）也会重算绩点"""
+        grade = Grade.objects.create(student=self.student_profile, teaching_assignment=self.teaching_assignment, score=Decimal('72'))
+        # 过滤条件引用了被修改的分数
+        Grade.objects.filter(score__lt=Decimal('80')).update(score=Decimal('88'))
+        grade.refresh_from_db()
+        self.assertEqual(grade.gpa, Decimal('3.7'))
+
+        grade.score = Decimal('45')
+        Grade.objects.bulk_update([grade], ['score'])
+        self.assertEqual(Grade.objects.get(pk=grade.pk).gpa, Decimal('0.0'))
+
+        Grade.objects.filter(pk=grade.pk).update(score=None)
+        self.assertIsNone(Grade.objects.get(pk=grade.pk).gpa)
+
+    def test_bulk_writes_recompute_gpa_with_scales(self):
+        """测试 bulk_create 和 update() 在写入语句中按适用的方案计算绩点，不先取出主键"""
+        from django.db.models import F
+        from grades.models import GpaScale, GpaScaleBand
+
+        scale = GpaScale.objects.create(name='计算机系两级制', department=self.department, is_active=True)
+        GpaScaleBand.objects.create(scale=scale, min_score=Decimal('60'), gpa=Decimal('3.0'))
+        GpaScaleBand.objects.create(scale=scale, min_score=Decimal('0'), gpa=Decimal('1.0'))
+        other_department = Department.objects.create(dept_code="EE", dept_name="电子工程系")
+        other_user = User.objects.create_user(username='ee_bulk_student', password='password123', role=CustomUser.Role.STUDENT)
+        other_student = Student.objects.create(
+            user=other_user, student_id_num='S2024099', name='电子学生', gender='女',
+            major=Major.objects.create(major_name="通信工程", department=other_department),
+            department=other_department, degree_level='本科',
+        )
+
+        Grade.objects.bulk_create([
+            Grade(student=self.student_profile, teaching_assignment=self.teaching_assignment, score=Decimal('45')),
+            Grade(student=other_student, teaching_assignment=self.teaching_assignment, score=Decimal('50')),
+        ])
+        self.assertEqual(Grade.objects.get(student=self.student_profile).gpa, Decimal('1.0'))
+        self.assertEqual(Grade.objects.get(student=other_student).gpa, Decimal('0.0'))
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = Grade.objects.filter(score__lt=Decimal('60')).update(score=F('score') + 20)
+        self.assertEqual(rows, 2)
+        # 每个方案一条 UPDATE；只取出涉及的学生（用于刷新学分），不取出成绩主键
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('UPDATE')]), 2)
+        self.assertFalse([sql for sql in statements if sql.startswith('SELECT') and '"grades_grade"."id"' in sql])
+        self.assertEqual(Grade.objects.get(student=self.student_profile).gpa, Decimal('3.0'))
+        self.assertEqual(Grade.objects.get(student=other_student).gpa, Decimal('2.7'))
+
+    def test_department_scale_and_rescale_dry_run(self):
+        """测试院系方案覆盖全校方案，以及试运行与重算"""
+        from io import StringIO
+        from django.core.management import call_command
+        from grades.models import GpaScale, GpaScaleBand
+
+        grade = Grade.objects.create(student=self.student_profile, teaching_assignment=self.teaching_assignment, score=Decimal('86'))
+        other_department = Department.objects.create(dept_code="EE", dept_name="电子工程系")
+        other_major = Major.objects.create(major_name="通信工程", department=other_department)
+        other_user = User.objects.create_user(username='ee_student', password='password123', role=CustomUser.Role.STUDENT)
+        other_student = Student.objects.create(
+            user=other_user, student_id_num='S54321', name='王五', gender='男',
+            major=other_major, department=other_department, degree_level='本科'
+        )
+        other_grade = Grade.objects.create(student=other_student, teaching_assignment=self.teaching_assignment, score=Decimal('86'))
+
+        scale = GpaScale.objects.create(name='计算机系五级制', department=self.department, is_active=True)
+        GpaScaleBand.objects.bulk_create([
+            GpaScaleBand(scale=scale, min_score=min_score, gpa=gpa)
+            for min_score, gpa in [(Decimal('90'), Decimal('4.0')), (Decimal('80'), Decimal('3.0')),
+                                   (Decimal('70'), Decimal('2.0')), (Decimal('60'), Decimal('1.0')),
+                                   (Decimal('0'), Decimal('0.0'))]
+        ])
+
+        out = StringIO()
+        call_command('rescale_gpa', '--dry-run', stdout=out)
+        self.assertIn('计算机系五级制 v1: 共 1 条成绩，1 条绩点将变化', out.getvalue())
+        grade.refresh_from_db()
+        self.assertEqual(grade.gpa, Decimal('3.7'))
+
+        call_command('rescale_gpa', stdout=StringIO())
+        grade.refresh_from_db()
+        other_grade.refresh_from_db()
+        self.assertEqual(grade.gpa, Decimal('3.0'))
+        self.assertEqual(other_grade.gpa, Decimal('3.7'))
+
+        # 之后的单条保存同样使用院系方案
+        grade.score = Decimal('75')
+        grade.save()
+        self.assertEqual(Grade.objects.get(pk=grade.pk).gpa, Decimal('2.0'))
+
+    def test_single_save_uses_cached_scales(self):
+        """测试单条保存复用缓存的换算方案，方案变动后缓存失效"""
+        from grades.models import GpaScale, GpaScaleBand, gpa_for_student
+
+        scale = GpaScale.objects.create(name='计算机系两级制', department=self.department, is_active=True)
+        GpaScaleBand.objects.create(scale=scale, min_score=Decimal('60'), gpa=Decimal('3.0'))
+        band = GpaScaleBand.objects.create(scale=scale, min_score=Decimal('0'), gpa=Decimal('1.0'))
+
+        grade = Grade(student=self.student_profile, teaching_assignment=self.teaching_assignment, score=Decimal('95'))
+        grade.save()
+        self.assertEqual(grade.gpa, Decimal('3.0'))
+
+        grade.score = Decimal('50')
+        with CaptureQueriesContext(connection) as queries:
+            grade.save()
+        self.assertEqual(grade.gpa, Decimal('1.0'))
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('grades_gpascale', sql)
+        with self.assertNumQueries(0):
+            self.assertEqual(gpa_for_student(self.student_profile.pk, Decimal('70'), student=self.student_profile), Decimal('3.0'))
+
+        band.gpa = Decimal('0.5')
+        band.save()
+        grade.save()
+        self.assertEqual(grade.gpa, Decimal('0.5'))
+
     def test_grade_unique_together(self):
         """测试唯一性约束"""
         Grade.objects.create(student=self.student_profile, teaching_assignment=self.teaching_assignment, score=Decimal('80.0'))
@@ -194,3 +315,727 @@ class GradeAPITest(TestCase):
         response = self.client.get(reverse('teaching-assignment-grades-list', kwargs={'teaching_assignment_id': self.teaching_cs.pk}))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
+
+
+class GradeCreditLedgerTest(TestCase):
+    """测试学分台账的增量更新与偏差修复"""
+    def setUp(self):
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.minor_department = Department.objects.create(dept_code="MATH", dept_name="数学系")
+        self.major = Major.objects.create(major_name="软件工程", department=self.department)
+        self.minor_major = Major.objects.create(major_name="应用数学", department=self.minor_department)
+
+        student_user = User.objects.create_user(username='ledger_student', password='password123', role=CustomUser.Role.STUDENT)
+        self.student = Student.objects.create(
+            user=student_user, student_id_num='S20001', name='台账学生', gender='男',
+            major=self.major, department=self.department,
+            minor_major=self.minor_major, minor_department=self.minor_department, degree_level='本科'
+        )
+        teacher_user = User.objects.create_user(username='ledger_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        self.teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T20001', name='台账教师', department=self.department)
+
+        self.cs_course = Course.objects.create(course_id='CS201', course_name='数据结构', credits=Decimal('3.0'), department=self.department)
+        self.math_course = Course.objects.create(course_id='MA201', course_name='线性代数', credits=Decimal('2.0'), department=self.minor_department)
+        self.cs_assignment = TeachingAssignment.objects.create(teacher=self.teacher, course=self.cs_course, semester='2024 Fall')
+        self.math_assignment = TeachingAssignment.objects.create(teacher=self.teacher, course=self.math_course, semester='2024 Fall')
+
+    def assertCredits(self, major, minor):
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.credits_earned, Decimal(major))
+        self.assertEqual(self.student.minor_credits_earned, Decimal(minor))
+
+    def test_ledger_applies_pass_state_changes(self):
+        grade = Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('80'))
+        Grade.objects.create(student=self.student, teaching_assignment=self.math_assignment, score=Decimal('90'))
+        self.assertCredits('3.0', '2.0')
+
+        grade.score = Decimal('55')
+        grade.save()
+        self.assertCredits('0.0', '2.0')
+
+        grade = Grade.objects.get(pk=grade.pk)
+        grade.score = Decimal('75')
+        grade.save()
+        self.assertCredits('3.0', '2.0')
+
+        grade.delete()
+        self.assertCredits('0.0', '2.0')
+
+    def test_score_change_within_passing_is_free(self):
+        grade = Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('70'))
+        grade.score = Decimal('95')
+        with CaptureQueriesContext(connection) as queries:
+            grade.save()
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE') and 'users_student' in query['sql'] for query in queries
+        ))
+        self.assertCredits('3.0', '0.0')
+
+    def test_writes_in_one_transaction_refresh_once(self):
+        from unittest import mock
+        from grades.models import StudentAcademicSummary
+        from utils.jobs import enqueue
+
+        with mock.patch('grades.deferred.enqueue', wraps=enqueue) as refreshes, \
+                self.captureOnCommitCallbacks(execute=True):
+            cs_grade = Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('40'))
+            Grade.objects.create(student=self.student, teaching_assignment=self.math_assignment, score=Decimal('90'))
+            for score in ('65', '70', '80'):
+                cs_grade.score = Decimal(score)
+                cs_grade.save()
+            self.assertFalse(StudentAcademicSummary.objects.exists())
+        self.assertEqual(refreshes.call_count, 1)
+        self.assertEqual(StudentAcademicSummary.objects.get(student=self.student, semester='').graded_courses, 2)
+        self.assertCredits('3.0', '2.0')
+
+    def test_stale_instances_do_not_double_apply(self):
+        grade = Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('50'))
+        first = Grade.objects.get(pk=grade.pk)
+        second = Grade.objects.get(pk=grade.pk)
+        first.score = Decimal('90')
+        first.save()
+        # second 加载时仍是 50 分，增量按已落库的 90 分计算
+        second.score = Decimal('95')
+        second.save()
+        self.assertCredits('3.0', '0.0')
+
+        first.delete()
+        second.delete()
+        self.assertCredits('0.0', '0.0')
+
+    def test_queryset_update_refreshes_credits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            grade = Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('80'))
+        self.assertCredits('3.0', '0.0')
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.filter(pk=grade.pk).update(score=Decimal('40'))
+        self.assertCredits('0.0', '0.0')
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.filter(pk=grade.pk).update(teaching_assignment=self.math_assignment, score=Decimal('70'))
+        self.assertCredits('0.0', '2.0')
+
+    def test_rolled_back_savepoint_drops_pending_refresh(self):
+        from unittest import mock
+        from django.db import transaction
+        from grades.deferred import mark_students_dirty
+
+        with mock.patch('grades.deferred.enqueue') as refreshes, self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    mark_students_dirty({self.student.pk})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            # 回滚后重新登记回调，只刷新回滚之后记录的学生
+            mark_students_dirty({-1})
+            mark_students_dirty({-2})
+        refreshes.assert_called_once()
+        self.assertEqual(refreshes.call_args.kwargs['summary_ids'], [-2, -1])
+
+    def test_deferred_block_recalculates_once(self):
+        from unittest import mock
+        from grades.deferred import defer_credit_updates
+        from utils.jobs import enqueue
+
+        with mock.patch('grades.deferred.enqueue', wraps=enqueue) as refreshes, \
+                self.captureOnCommitCallbacks(execute=True):
+            with defer_credit_updates():
+                with CaptureQueriesContext(connection) as queries:
+                    grade = Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('80'))
+                    Grade.objects.create(student=self.student, teaching_assignment=self.math_assignment, score=Decimal('90'))
+                    grade.score = Decimal('50')
+                    grade.save()
+                self.assertFalse([
+                    q for q in queries if q['sql'].startswith('UPDATE') and 'users_student' in q['sql']
+                ])
+            self.assertCredits('0.0', '0.0')
+        self.assertEqual(refreshes.call_count, 1)
+        self.assertCredits('0.0', '2.0')
+
+    def test_verify_command_repairs_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('88'))
+        Student.objects.filter(pk=self.student.pk).update(credits_earned=Decimal('10.0'))
+
+        out = StringIO()
+        call_command('verify_student_credits', stdout=out)
+        self.assertIn('S20001', out.getvalue())
+        self.assertCredits('10.0', '0.0')
+
+        call_command('verify_student_credits', '--repair', stdout=StringIO())
+        self.assertCredits('3.0', '0.0')
+
+    def test_update_credits_command_set_based(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from grades.management.commands.update_student_credits import split_ranges
+
+        Grade.objects.create(student=self.student, teaching_assignment=self.cs_assignment, score=Decimal('88'))
+        Grade.objects.create(student=self.student, teaching_assignment=self.math_assignment, score=Decimal('75'))
+        Student.objects.filter(pk=self.student.pk).update(credits_earned=Decimal('10.0'), minor_credits_earned=0)
+
+        call_command('update_student_credits', '--since', '2999-01-01', stdout=StringIO())
+        self.assertCredits('10.0', '0.0')
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('update_student_credits', '--since', '2000-01-01', stdout=out)
+        self.assertCredits('3.0', '2.0')
+        self.assertIn('1 名学生的学分发生变化', out.getvalue())
+        self.assertLessEqual(len(queries), 6)
+
+        self.assertEqual(split_ranges(1, 10, 3), [(1, 5), (5, 9), (9, 11)])
+        self.assertEqual(split_ranges(7, 7, 4), [(7, 8)])
+
+
+class GradeEntryBulkTest(TestCase):
+    """测试教师批量录入成绩"""
+    def setUp(self):
+        from courses.models import CourseEnrollment
+
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.major = Major.objects.create(major_name="软件工程", department=self.department)
+        self.teacher_user = User.objects.create_user(username='entry_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        self.teacher = Teacher.objects.create(user=self.teacher_user, teacher_id_num='T30001', name='录入教师', department=self.department)
+        self.course = Course.objects.create(course_id='CS301', course_name='操作系统', credits=Decimal('4.0'), department=self.department)
+
+        self.students = []
+        for i in range(12):
+            user = User.objects.create_user(username=f'entry_student_{i}', password='password123', role=CustomUser.Role.STUDENT)
+            self.students.append(Student.objects.create(
+                user=user, student_id_num=f'S3{i:04d}', name=f'学生{i}', gender='男',
+                major=self.major, department=self.department, degree_level='本科'
+            ))
+        self.assignments = []
+        for semester in ('2024 Fall', '2025 Spring'):
+            assignment = TeachingAssignment.objects.create(teacher=self.teacher, course=self.course, semester=semester)
+            for student in self.students:
+                CourseEnrollment.objects.create(student=student, teaching_assignment=assignment)
+            self.assignments.append(assignment)
+        self.client.force_login(self.teacher_user)
+
+    def post_scores(self, assignment, scores):
+        data = {f'score_{student.pk}': score for student, score in scores}
+        return self.client.post(reverse('grades:grade-entry', kwargs={'assignment_id': assignment.pk}), data)
+
+    def test_bulk_entry_writes_grades_gpa_and_credits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.students[0], teaching_assignment=self.assignments[0], score=Decimal('50'))
+            self.post_scores(self.assignments[0], [(self.students[0], '86'), (self.students[1], '59'), (self.students[2], 'abc')])
+
+        grade = Grade.objects.get(student=self.students[0], teaching_assignment=self.assignments[0])
+        self.assertEqual(grade.score, Decimal('86'))
+        self.assertEqual(grade.gpa, Decimal('3.7'))
+        self.assertEqual(grade.last_modified_by, self.teacher_user)
+        self.assertEqual(Grade.objects.get(student=self.students[1]).gpa, Decimal('0.0'))
+        self.assertFalse(Grade.objects.filter(student=self.students[2]).exists())
+
+        self.students[0].refresh_from_db()
+        self.students[1].refresh_from_db()
+        self.assertEqual(self.students[0].credits_earned, Decimal('4.0'))
+        self.assertEqual(self.students[1].credits_earned, Decimal('0.0'))
+
+    def test_query_count_independent_of_section_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post_scores(self.assignments[0], [(s, '80') for s in self.students[:3]])
+        with CaptureQueriesContext(connection) as large:
+            self.post_scores(self.assignments[1], [(s, '80') for s in self.students])
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Grade.objects.filter(teaching_assignment=self.assignments[1]).count(), 12)
+
+    def test_batch_api_upserts_and_reports_per_item(self):
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.teacher_user)
+        url = reverse('grades-api:teaching-assignment-grades-batch-api', kwargs={'teaching_assignment_id': self.assignments[0].pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.students[0], teaching_assignment=self.assignments[0], score=Decimal('50'))
+            response = client.post(url, {'grades': [
+                {'student_id': self.students[0].pk, 'score': '91'},
+                {'student_id': self.students[1].pk, 'score': '101'},
+                {'student_id': self.students[2].pk, 'score': ''},
+                {'score': '80'},
+                {'student_id': self.students[3].pk, 'score': None},
+                {'student_id': self.students[0].pk},
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary'], {'created': 2, 'updated': 1, 'unchanged': 0, 'error': 3})
+        statuses = [item['status'] for item in response.data['results']]
+        self.assertEqual(statuses, ['updated', 'error', 'created', 'error', 'created', 'error'])
+        self.assertIn('student_id', response.data['results'][3]['error'])
+        # 缺少 score 不等于清除分数
+        self.assertIn('score', response.data['results'][5]['error'])
+        self.assertEqual(Grade.objects.get(student=self.students[0], teaching_assignment=self.assignments[0]).score, Decimal('91'))
+        self.assertIsNone(Grade.objects.get(student=self.students[3]).score)
+        self.students[0].refresh_from_db()
+        self.assertEqual(self.students[0].credits_earned, Decimal('4.0'))
+        self.assertIsNone(Grade.objects.get(student=self.students[2]).score)
+
+        other_user = User.objects.create_user(username='other_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        Teacher.objects.create(user=other_user, teacher_id_num='T30002', name='其他教师', department=self.department)
+        client.force_authenticate(other_user)
+        self.assertEqual(client.post(url, {'grades': [{'student_id': self.students[0].pk, 'score': '1'}]}, format='json').status_code, 403)
+
+
+class GpaDistributionTest(TestCase):
+    """测试首页GPA分布的SQL聚合与逐个学生计算结果一致"""
+    def test_distribution_matches_cumulative_gpa(self):
+        from core.views import get_gpa_distribution
+
+        department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        major = Major.objects.create(major_name="软件工程", department=department)
+        teacher_user = User.objects.create_user(username='gpa_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T40001', name='GPA教师', department=department)
+        heavy = Course.objects.create(course_id='CS401', course_name='编译原理', credits=Decimal('4.0'), department=department)
+        light = Course.objects.create(course_id='CS402', course_name='编译实验', credits=Decimal('1.0'), department=department)
+        heavy_ta = TeachingAssignment.objects.create(teacher=teacher, course=heavy, semester='2024 Fall')
+        light_ta = TeachingAssignment.objects.create(teacher=teacher, course=light, semester='2024 Fall')
+
+        score_pairs = [('95', '95'), ('86', '50'), ('72', '90'), ('61', '40'), ('30', '30'), (None, None)]
+        students = []
+        for i, (heavy_score, light_score) in enumerate(score_pairs):
+            user = User.objects.create_user(username=f'gpa_student_{i}', password='password123', role=CustomUser.Role.STUDENT)
+            student = Student.objects.create(
+                user=user, student_id_num=f'S4{i:04d}', name=f'学生{i}', gender='女',
+                major=major, department=department, degree_level='本科'
+            )
+            if heavy_score is not None:
+                Grade.objects.create(student=student, teaching_assignment=heavy_ta, score=Decimal(heavy_score))
+                Grade.objects.create(student=student, teaching_assignment=light_ta, score=Decimal(light_score))
+            students.append(student)
+
+        with self.assertNumQueries(1):
+            distribution = get_gpa_distribution()
+
+        expected = [0] * 5
+        for student in students:
+            gpa = student.calculate_cumulative_gpa()
+            index = next((i for i, bound in enumerate(['3.7', '3.0', '2.0', '1.0']) if gpa >= Decimal(bound)), 4)
+            expected[index] += 1
+        self.assertEqual(distribution['data'], expected)
+        self.assertEqual(len(distribution['labels']), 5)
+
+
+class StudentAcademicSummaryTest(TestCase):
+    """测试成绩汇总表随成绩写入维护"""
+    def setUp(self):
+        from grades.models import StudentAcademicSummary
+
+        self.Summary = StudentAcademicSummary
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.major = Major.objects.create(major_name="软件工程", department=self.department)
+        self.student_user = User.objects.create_user(username='summary_student', password='password123', role=CustomUser.Role.STUDENT)
+        self.student = Student.objects.create(
+            user=self.student_user, student_id_num='S50001', name='汇总学生', gender='男',
+            major=self.major, department=self.department, degree_level='本科'
+        )
+        teacher_user = User.objects.create_user(username='summary_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T50001', name='汇总教师', department=self.department)
+        course_a = Course.objects.create(course_id='CS501', course_name='网络', credits=Decimal('3.0'), department=self.department)
+        course_b = Course.objects.create(course_id='CS502', course_name='数据库', credits=Decimal('1.0'), department=self.department)
+        course_c = Course.objects.create(course_id='CS503', course_name='软件工程', credits=Decimal('2.0'), department=self.department)
+        self.fall_a = TeachingAssignment.objects.create(teacher=teacher, course=course_a, semester='2024 Fall')
+        self.fall_b = TeachingAssignment.objects.create(teacher=teacher, course=course_b, semester='2024 Fall')
+        self.spring_c = TeachingAssignment.objects.create(teacher=teacher, course=course_c, semester='2025 Spring')
+
+    def test_summary_follows_grade_writes(self):
+        # 成绩汇总在事务提交后刷新
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, teaching_assignment=self.fall_a, score=Decimal('92'))
+            Grade.objects.create(student=self.student, teaching_assignment=self.fall_b, score=Decimal('50'))
+            grade = Grade.objects.create(student=self.student, teaching_assignment=self.spring_c, score=None)
+
+        overall = self.Summary.objects.get(student=self.student, semester='')
+        self.assertEqual(overall.total_courses, 3)
+        self.assertEqual(overall.graded_courses, 2)
+        self.assertEqual(overall.passed_courses, 1)
+        self.assertEqual(overall.average_score, Decimal('71.00'))
+        self.assertEqual(overall.weighted_average_score, Decimal('81.50'))
+        self.assertEqual(overall.weighted_gpa, Decimal('3.00'))
+        self.assertEqual(overall.earned_credits, Decimal('3.0'))
+        self.assertEqual(overall.grade_distribution['excellent'], 1)
+        self.assertEqual(overall.grade_distribution['fail'], 1)
+        self.assertEqual(self.Summary.objects.get(student=self.student, semester='2024 Fall').graded_courses, 2)
+        self.assertEqual(self.Summary.objects.get(student=self.student, semester='2025 Spring').graded_courses, 0)
+        self.assertEqual(self.student.calculate_cumulative_gpa(), Decimal('3.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            grade.delete()
+        self.assertFalse(self.Summary.objects.filter(student=self.student, semester='2025 Spring').exists())
+
+    def test_my_grades_view_and_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Grade.objects.create(student=self.student, teaching_assignment=self.fall_a, score=Decimal('85'))
+        self.Summary.objects.all().delete()
+
+        self.client.force_login(self.student_user)
+        response = self.client.get(reverse('grades:my-grades'))
+        self.assertEqual(response.context['completed_courses'], 1)
+        self.assertEqual(response.context['weighted_avg_gpa'], Decimal('3.70'))
+
+        call_command('rebuild_academic_summaries', stdout=StringIO())
+        self.assertEqual(self.Summary.objects.filter(student=self.student).count(), 2)
+
+    def test_course_and_assignment_changes_refresh_summaries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, teaching_assignment=self.fall_a, score=Decimal('92'))
+            Grade.objects.create(student=self.student, teaching_assignment=self.fall_b, score=Decimal('50'))
+
+        course = Course.objects.get(pk='CS501')
+        course.credits = Decimal('4.0')
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        self.assertEqual(self.Summary.objects.get(student=self.student, semester='').earned_credits, Decimal('4.0'))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.credits_earned, Decimal('4.0'))
+
+        assignment = TeachingAssignment.objects.get(pk=self.fall_b.pk)
+        assignment.semester = '2025 Spring'
+        with self.captureOnCommitCallbacks(execute=True):
+            assignment.save()
+        self.assertEqual(self.Summary.objects.get(student=self.student, semester='2024 Fall').graded_courses, 1)
+        self.assertEqual(self.Summary.objects.get(student=self.student, semester='2025 Spring').graded_courses, 1)
+
+        # 与汇总无关的修改不触发刷新
+        from unittest import mock
+        course.course_name = '计算机网络'
+        with mock.patch('grades.signals.mark_students_dirty') as mark_dirty:
+            course.save()
+        mark_dirty.assert_not_called()
+
+    def test_migration_backfills_summaries(self):
+        from importlib import import_module
+        from unittest import mock
+        from django.apps import apps
+
+        Grade.objects.create(student=self.student, teaching_assignment=self.fall_a, score=Decimal('85'))
+        self.Summary.objects.all().delete()
+        migration = import_module('grades.migrations.0007_backfill_academic_summaries')
+        with mock.patch.object(migration, 'BACKFILL_CHUNK_SIZE', 1):
+            migration.backfill_academic_summaries(apps, None)
+        self.assertEqual(self.Summary.objects.filter(student=self.student).count(), 2)
+
+    def test_grade_statistics_single_aggregate(self):
+        from grades.services import grade_statistics
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=self.student, teaching_assignment=self.fall_a, score=Decimal('92'))
+            Grade.objects.create(student=self.student, teaching_assignment=self.fall_b, score=Decimal('50'))
+            Grade.objects.create(student=self.student, teaching_assignment=self.spring_c, score=None)
+
+        with self.assertNumQueries(1):
+            statistics = grade_statistics(Grade.objects.filter(student=self.student))
+        overall = self.Summary.objects.get(student=self.student, semester='')
+        for field, value in statistics.items():
+            self.assertEqual(value, getattr(overall, field), field)
+
+
+class SectionGradeStatisticsTest(TestCase):
+    """测试授课安排成绩统计在数据库端计算"""
+    def setUp(self):
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.major = Major.objects.create(major_name="软件工程", department=self.department)
+        teacher_user = User.objects.create_user(username='stats_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T60001', name='统计教师', department=self.department)
+        course = Course.objects.create(course_id='CS601', course_name='编译原理', credits=Decimal('3.0'), department=self.department)
+        self.sections = [
+            TeachingAssignment.objects.create(teacher=teacher, course=course, semester=f'202{i} Fall')
+            for i in range(3)
+        ]
+        scores = [Decimal('100'), Decimal('85'), Decimal('72'), Decimal('55'), None]
+        for index, score in enumerate(scores):
+            user = User.objects.create_user(username=f'stats_student{index}', password='password123', role=CustomUser.Role.STUDENT)
+            student = Student.objects.create(
+                user=user, student_id_num=f'S6000{index}', name=f'统计学生{index}', gender='男',
+                major=self.major, department=self.department, degree_level='本科'
+            )
+            Grade.objects.create(student=student, teaching_assignment=self.sections[0], score=score)
+            if score is not None:
+                Grade.objects.create(student=student, teaching_assignment=self.sections[1], score=score - 10)
+
+    def test_single_section_statistics(self):
+        from grades.services import calculate_class_grade_statistics
+
+        statistics = calculate_class_grade_statistics(self.sections[0])
+        self.assertEqual(statistics['total_students'], 5)
+        self.assertEqual(statistics['submitted_count'], 4)
+        self.assertEqual(statistics['average_score'], Decimal('78.00'))
+        self.assertEqual(statistics['highest_score'], Decimal('100'))
+        self.assertEqual(statistics['lowest_score'], Decimal('55'))
+        self.assertEqual(statistics['pass_rate'], Decimal('75.00'))
+        self.assertEqual(statistics['median'], Decimal('78.50'))
+        self.assertEqual(statistics['percentiles'][25], Decimal('67.75'))
+        self.assertEqual(statistics['stddev'], Decimal('16.57'))
+        self.assertEqual(statistics['histogram']['90-100'], 1)
+        self.assertEqual(statistics['histogram']['50-59'], 1)
+        self.assertEqual(statistics['score_distribution'], {
+            '90-100': 1, '80-89': 1, '70-79': 1, '60-69': 0, '0-59': 1,
+        })
+
+        empty = calculate_class_grade_statistics(self.sections[2])
+        self.assertEqual(empty['total_students'], 0)
+        self.assertEqual(empty['score_distribution'], {})
+
+    def test_many_sections_in_constant_queries(self):
+        from grades.services import section_grade_statistics
+
+        with self.assertNumQueries(3):
+            results = section_grade_statistics(
+                TeachingAssignment.objects.filter(pk__in=[s.pk for s in self.sections]), bin_width=25,
+            )
+        self.assertEqual(set(results), {self.sections[0].pk, self.sections[1].pk})
+        second = results[self.sections[1].pk]
+        self.assertEqual(second['submitted_count'], 4)
+        self.assertEqual(second['pass_rate'], Decimal('75.00'))
+        self.assertEqual(second['histogram'], {'0-24': 0, '25-49': 1, '50-74': 1, '75-100': 2})
+
+
+class DashboardCacheTest(TestCase):
+    """测试首页仪表盘缓存及其失效"""
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['dashboard'].clear()
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.major = Major.objects.create(major_name="软件工程", department=self.department)
+        self.admin_user = User.objects.create_user(username='dash_admin', password='password123', role=CustomUser.Role.ADMIN)
+        self.teacher_user = User.objects.create_user(username='dash_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=self.teacher_user, teacher_id_num='T70001', name='仪表盘教师', department=self.department)
+        course = Course.objects.create(course_id='CS701', course_name='操作系统', credits=Decimal('3.0'), department=self.department)
+        self.assignment = TeachingAssignment.objects.create(teacher=teacher, course=course, semester='2024 Fall')
+        student_user = User.objects.create_user(username='dash_student', password='password123', role=CustomUser.Role.STUDENT)
+        self.student = Student.objects.create(
+            user=student_user, student_id_num='S70001', name='仪表盘学生', gender='男',
+            major=self.major, department=self.department, degree_level='本科'
+        )
+
+    def test_admin_dashboard_cached_until_grade_changes(self):
+        self.client.force_login(self.admin_user)
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as cached:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['gpa_distribution_data']['data'], [0, 0, 0, 0, 1])
+        self.assertFalse([q for q in cached.captured_queries if 'grades_grade' in q['sql']])
+
+        Grade.objects.create(student=self.student, teaching_assignment=self.assignment, score=Decimal('95'))
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['gpa_distribution_data']['data'], [1, 0, 0, 0, 0])
+        self.assertEqual(response.context['course_distribution_data']['data'], [1])
+
+    def test_teacher_distribution_invalidated_by_bulk_entry(self):
+        from grades.services import bulk_upsert_grades
+
+        from courses.models import CourseEnrollment
+
+        CourseEnrollment.objects.create(student=self.student, teaching_assignment=self.assignment)
+        self.client.force_login(self.teacher_user)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['teacher_grade_distribution_data']['data'], [])
+
+        bulk_upsert_grades(self.assignment, [(self.student.pk, '72')], self.teacher_user)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['teacher_grade_distribution_data']['labels'], ['C (70-79)'])
+
+    def test_invalidation_repeats_after_commit(self):
+        from core.dashboard_cache import cached_fragment, invalidate_dashboard
+
+        cached_fragment('probe', lambda: 'old')
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_dashboard()
+            # 提交前的并发请求读到旧数据，按新一代写入缓存
+            self.assertEqual(cached_fragment('probe', lambda: 'old'), 'old')
+        self.assertEqual(cached_fragment('probe', lambda: 'new'), 'new')
+
+    def test_teacher_change_invalidates_previous_teacher(self):
+        Grade.objects.create(student=self.student, teaching_assignment=self.assignment, score=Decimal('72'))
+        self.client.force_login(self.teacher_user)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['teacher_grade_distribution_data']['labels'], ['C (70-79)'])
+
+        other_user = User.objects.create_user(username='dash_teacher2', password='password123', role=CustomUser.Role.TEACHER)
+        other = Teacher.objects.create(user=other_user, teacher_id_num='T70002', name='接任教师', department=self.department)
+        assignment = TeachingAssignment.objects.get(pk=self.assignment.pk)
+        assignment.teacher = other
+        assignment.save()
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['teacher_grade_distribution_data']['data'], [])
+        self.client.force_login(other_user)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['teacher_grade_distribution_data']['labels'], ['C (70-79)'])
+
+
+class StudentRankingTest(TestCase):
+    """测试按学分加权绩点的学生排名及其按年级缓存"""
+    def setUp(self):
+        from django.core.cache import caches
+
+        caches['dashboard'].clear()
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.software = Major.objects.create(major_name="软件工程", department=self.department)
+        self.network = Major.objects.create(major_name="网络工程", department=self.department)
+        self.admin_user = User.objects.create_user(username='rank_admin', password='password123', role=CustomUser.Role.ADMIN)
+        teacher_user = User.objects.create_user(username='rank_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T75001', name='排名教师', department=self.department)
+        course = Course.objects.create(course_id='CS751', course_name='算法', credits=Decimal('3.0'), department=self.department)
+        self.fall = TeachingAssignment.objects.create(teacher=teacher, course=course, semester='2024 Fall')
+        self.spring = TeachingAssignment.objects.create(teacher=teacher, course=course, semester='2025 Spring')
+
+        # (年级, 专业, 秋季分数, 春季分数)
+        plan = [
+            (2022, self.software, '95', '70'),
+            (2022, self.software, '85', '95'),
+            (2022, self.software, '85', None),
+            (2022, self.network, '75', '65'),
+            (2023, self.software, '60', None),
+        ]
+        self.students = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for index, (year, major, fall_score, spring_score) in enumerate(plan):
+                user = User.objects.create_user(username=f'rank_student{index}', password='password123', role=CustomUser.Role.STUDENT)
+                student = Student.objects.create(
+                    user=user, student_id_num=f'S7500{index}', name=f'排名学生{index}', gender='男',
+                    major=major, department=self.department, degree_level='本科', grade_year=year,
+                )
+                Grade.objects.create(student=student, teaching_assignment=self.fall, score=Decimal(fall_score))
+                if spring_score is not None:
+                    Grade.objects.create(student=student, teaching_assignment=self.spring, score=Decimal(spring_score))
+                self.students.append(student)
+
+    def test_window_ranking_in_one_query(self):
+        from grades.ranking import compute_rankings
+
+        with self.assertNumQueries(1):
+            rows = {row['student_id']: row for row in compute_rankings('2024 Fall')}
+        first, second, third, fourth, other = (rows[student.pk] for student in self.students)
+        self.assertEqual(first['ranks']['major'], {'rank': 1, 'size': 3, 'percent_rank': 0})
+        # 绩点相同名次相同
+        self.assertEqual(second['ranks']['major']['rank'], 2)
+        self.assertEqual(third['ranks']['major']['rank'], 2)
+        self.assertEqual(fourth['ranks']['major'], {'rank': 1, 'size': 1, 'percent_rank': 0})
+        self.assertEqual(fourth['ranks']['department']['rank'], 4)
+        self.assertEqual(fourth['ranks']['cohort']['percent_rank'], 1)
+        self.assertEqual(other['ranks']['cohort'], {'rank': 1, 'size': 1, 'percent_rank': 0})
+
+        overall = {row['student_id']: row for row in compute_rankings()}
+        self.assertEqual(overall[self.students[1].pk]['ranks']['cohort']['rank'], 1)
+        self.assertEqual(overall[self.students[1].pk]['weighted_gpa'], Decimal('3.85'))
+
+    def test_cohort_cache_invalidated_by_grade_write_in_cohort(self):
+        from grades.ranking import cohort_rankings
+
+        cohort_rankings(2022)
+        with self.assertNumQueries(0):
+            cohort_rankings(2022)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.filter(student=self.students[4]).get().delete()
+        with self.assertNumQueries(0):
+            cohort_rankings(2022)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for grade in Grade.objects.filter(student=self.students[3]):
+                grade.score = Decimal('100')
+                grade.save()
+        rows = cohort_rankings(2022)
+        self.assertEqual(rows[0]['student_id'], self.students[3].pk)
+
+    def test_admin_api_and_my_grades_view(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin_user)
+        url = reverse('grades-api:student-rankings-api')
+        response = client.get(url, {'grade_year': 2022, 'scope': 'major', 'major': self.software.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['results'][0]['student_id'], self.students[1].pk)
+        self.assertEqual(client.get(url).data['count'], 5)
+        self.assertEqual(client.get(url, {'scope': 'class'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        client.force_authenticate(user=self.students[0].user)
+        self.assertEqual(client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_login(self.students[0].user)
+        response = self.client.get(reverse('grades:my-grades'))
+        labels = [label for label, row in response.context['rankings']]
+        self.assertEqual(labels, ['累计', '2025 Spring', '2024 Fall'])
+        self.assertEqual(response.context['rankings'][2][1]['ranks']['cohort']['rank'], 1)
+
+
+class AdminGradeKeysetPaginationTest(TestCase):
+    """测试管理员成绩列表的键集分页"""
+    def setUp(self):
+        department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        major = Major.objects.create(major_name="软件工程", department=department)
+        teacher_user = User.objects.create_user(username='page_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T80001', name='分页教师', department=department)
+        student_user = User.objects.create_user(username='page_student', password='password123', role=CustomUser.Role.STUDENT)
+        student = Student.objects.create(
+            user=student_user, student_id_num='S80001', name='分页学生', gender='男',
+            major=major, department=department, degree_level='本科'
+        )
+        course = Course.objects.create(course_id='CS801', course_name='分页课程', credits=Decimal('1.0'), department=department)
+        for index in range(25):
+            assignment = TeachingAssignment.objects.create(teacher=teacher, course=course, semester=f'学期{index:02d}')
+            Grade.objects.create(student=student, teaching_assignment=assignment, score=Decimal('80'))
+        self.admin = User.objects.create_user(username='page_admin', password='password123', role=CustomUser.Role.ADMIN)
+        self.client.force_login(self.admin)
+
+    def test_cursor_pages_cover_all_rows_in_order(self):
+        url = reverse('grades:admin-grade-list')
+        first = self.client.get(url)
+        first_page = first.context['page_obj']
+        self.assertEqual(len(first.context['grades']), 20)
+        self.assertFalse(first_page.has_previous())
+        self.assertEqual(first_page.count, 25)
+
+        second = self.client.get(url, {'cursor': first_page.next_cursor})
+        second_page = second.context['page_obj']
+        self.assertEqual(len(second.context['grades']), 5)
+        self.assertFalse(second_page.has_next())
+
+        ids = [g.pk for g in first.context['grades']] + [g.pk for g in second.context['grades']]
+        expected = list(Grade.objects.order_by('-entry_time', '-id').values_list('pk', flat=True))
+        self.assertEqual(ids, expected)
+
+        back = self.client.get(url, {'cursor': second_page.previous_cursor})
+        self.assertEqual([g.pk for g in back.context['grades']], expected[:20])
+        self.assertFalse(back.context['page_obj'].has_previous())
+
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_count_runs_once_and_links_keep_query_params(self):
+        from unittest import mock
+        from django.http import QueryDict
+
+        url = reverse('grades:admin-grade-list')
+        with mock.patch('common.pagination.approximate_count', return_value=(25, False)) as counted:
+            first = self.client.get(url, {'q': '', 'view': 'compact'})
+            first_page = first.context['page_obj']
+            second = self.client.get(url, {'cursor': first_page.next_cursor, 'view': 'compact'})
+        self.assertEqual(counted.call_count, 1)
+        self.assertEqual(second.context['page_obj'].count, 25)
+
+        params = QueryDict(first_page.next_query)
+        self.assertEqual(params['cursor'], first_page.next_cursor)
+        self.assertEqual(params['view'], 'compact')
+        self.assertIn('q', params)
+        previous = QueryDict(second.context['page_obj'].previous_query)
+        self.assertEqual(previous['view'], 'compact')
+        self.assertEqual(previous.getlist('cursor'), [second.context['page_obj'].previous_cursor])
+
+    def test_grade_serializer_eager_loading_single_query(self):
+        from grades.serializers import GradeSerializer
+
+        queryset = GradeSerializer.setup_eager_loading(Grade.objects.order_by('id'))
+        with self.assertNumQueries(1):
+            data = GradeSerializer(queryset, many=True).data
+        self.assertEqual(len(data), 25)
+        self.assertEqual(data[0]['student']['full_name'], '分页学生')
+        self.assertEqual(data[0]['teaching_assignment']['teacher']['full_name'], '分页教师')
+        self.assertEqual(data[0]['course_name'], '分页课程')
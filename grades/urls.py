@@ -1,7 +1,14 @@
 from django.urls import path
 from .views import GradeEntryView 
+from .api_views import StudentRankingView, TeachingAssignmentGradeBatchView
 
 app_name = 'grades'
 urlpatterns = [
     path('entry/', GradeEntryView.as_view(), name='grade_entry'),
-]
\ No newline at end of file
+    path(
+        'teaching-assignments/<int:teaching_assignment_id>/grades/batch/',
+        TeachingAssignmentGradeBatchView.as_view(),
+        name='teaching-assignment-grades-batch-api',
+    ),
+    path('rankings/', StudentRankingView.as_view(), name='student-rankings-api'),
+]
@@ -10,12 +10,18 @@ from django.core.exceptions import PermissionDenied
 from django.http import JsonResponse
 from django.db.models import Avg, Count, Q
 from decimal import Decimal, InvalidOperation
+from itertools import groupby
 
 from .models import Grade, TeachingAssignment
 from courses.models import CourseEnrollment
 from users.models import Student, Teacher, CustomUser
 from .forms import GradeFormForAdmin 
+from .services import bulk_upsert_grades, get_academic_summary
+from .ranking import student_ranking
 from common.mixins import TeacherRequiredMixin, StudentRequiredMixin, AdminRequiredMixin, OwnDataOnlyMixin
+from common.pagination import KeysetPaginationMixin
+from utils.models import SearchDocument
+from utils.search import matching_ids
 
 
 class TeacherCoursesView(TeacherRequiredMixin, generic.ListView):
@@ -124,58 +130,31 @@ class GradeEntryView(TeacherRequiredMixin, View):
         except AttributeError:
             return redirect('home')
         
-        updated_count = 0
-        error_count = 0
         error_details = []
+        raw_scores = []
         
         for key, value in request.POST.items():
             if key.startswith('score_') and value.strip():
                 try:
                     student_pk = int(key.replace('score_', ''))
-                    score_val = Decimal(value)
-                    
-                    if not (0 <= score_val <= 100):
-                        error_count += 1
-                        error_details.append(f"学生ID {student_pk}: 分数 {score_val} 超出有效范围(0-100)")
-                        continue
-                    
-                    try:
-                        student = Student.objects.get(pk=student_pk)
-                    except Student.DoesNotExist:
-                        error_count += 1
-                        error_details.append(f"学生ID {student_pk}: 学生不存在")
-                        continue
-                    
-                    enrollment = CourseEnrollment.objects.filter(
-                        student=student, 
-                        teaching_assignment=assignment
-                    ).first()
-                    
-                    if not enrollment:
-                        error_count += 1
-                        error_details.append(f"学生 {student.name}({student.student_id_num}): 未找到选课记录")
-                        continue
-                    
-                    if enrollment.status != 'ENROLLED':
-                        error_count += 1
-                        error_details.append(f"学生 {student.name}({student.student_id_num}): 选课状态为 '{enrollment.status}'，不是 'ENROLLED'")
-                        continue
-                    
-                    grade, created = Grade.objects.update_or_create(
-                        student=student,
-                        teaching_assignment=assignment,
-                        defaults={'score': score_val, 'last_modified_by': request.user}
-                    )
-                    updated_count += 1
-                    
-                except (ValueError, InvalidOperation) as e:
-                    error_count += 1
-                    error_details.append(f"学生ID {student_pk}: 分数格式错误 - {str(e)}")
-                    continue
-                except Exception as e:
-                    error_count += 1
-                    error_details.append(f"学生ID {student_pk}: 未知错误 - {str(e)}")
+                except ValueError as e:
+                    error_details.append(f"{key}: 分数格式错误 - {str(e)}")
                     continue
+                raw_scores.append((student_pk, value))
+        
+        results = bulk_upsert_grades(assignment, raw_scores, request.user)
+        
+        updated_count = 0
+        for result in results:
+            if result['status'] == 'error':
+                student = result['student']
+                if student is not None:
+                    error_details.append(f"学生 {student.name}({student.student_id_num}): {result['error']}")
+                else:
+                    error_details.append(f"学生ID {result['student_id']}: {result['error']}")
+            else:
+                updated_count += 1
+        error_count = len(error_details)
     
         if updated_count > 0:
             messages.success(request, f"成功录入/更新了 {updated_count} 条成绩记录。")
@@ -217,91 +196,41 @@ class MyGradesView(StudentRequiredMixin, generic.ListView):
         
         grades = context['grades_list']
         
-        if grades.exists():
-            total_courses = grades.count()
-            graded_courses = grades.filter(score__isnull=False)
-            completed_courses = graded_courses.filter(score__gte=60).count()
-            
-            # 计算总学分
-            total_credits = sum(
-                grade.teaching_assignment.course.credits 
-                for grade in graded_courses.filter(score__gte=60)
-                if grade.teaching_assignment and grade.teaching_assignment.course
-            )
-            
-            # 计算平均分
-            avg_score = graded_courses.aggregate(avg=Avg('score'))['avg']
-            if avg_score:
-                avg_score = round(float(avg_score), 2)
-            
-            # 计算加权平均分
-            weighted_total = 0
-            credit_total = 0
-            for grade in graded_courses:
-                if grade.score is not None and grade.teaching_assignment and grade.teaching_assignment.course:
-                    credits = grade.teaching_assignment.course.credits
-                    weighted_total += float(grade.score) * float(credits)
-                    credit_total += float(credits)
-            
-            weighted_avg_score = round(weighted_total / credit_total, 2) if credit_total > 0 else None
-            
-            # 成绩分布
-            grade_distribution = {
-                'excellent': graded_courses.filter(score__gte=90).count(),
-                'good': graded_courses.filter(score__gte=80, score__lt=90).count(),
-                'average': graded_courses.filter(score__gte=70, score__lt=80).count(),
-                'pass': graded_courses.filter(score__gte=60, score__lt=70).count(),
-                'fail': graded_courses.filter(score__lt=60).count(),
-            }
-            
-            # GPA统计
-            gpa_grades = graded_courses.exclude(gpa__isnull=True)
-            if gpa_grades.exists():
-                avg_gpa = gpa_grades.aggregate(avg=Avg('gpa'))['avg']
-                if avg_gpa:
-                    avg_gpa = round(float(avg_gpa), 2)
-                
-                # 按学分加权的GPA
-                weighted_gpa_total = 0
-                gpa_credit_total = 0
-                for grade in gpa_grades:
-                    if grade.gpa is not None and grade.teaching_assignment and grade.teaching_assignment.course:
-                        credits = grade.teaching_assignment.course.credits
-                        weighted_gpa_total += float(grade.gpa) * float(credits)
-                        gpa_credit_total += float(credits)
-                
-                weighted_avg_gpa = round(weighted_gpa_total / gpa_credit_total, 2) if gpa_credit_total > 0 else None
-            else:
-                avg_gpa = None
-                weighted_avg_gpa = None
-            
-            # 通过率
-            pass_rate = round(completed_courses / total_courses * 100, 1) if total_courses > 0 else 0
+        if grades:
+            # 统计数据直接读取成绩汇总表，不再逐项聚合原始成绩
+            summary = get_academic_summary(self.request.user.student_profile)
             
             context.update({
-                'total_courses': total_courses,
-                'completed_courses': completed_courses,
-                'graded_courses': graded_courses.count(),
-                'ungraded_courses': total_courses - graded_courses.count(),
-                'total_credits': total_credits,
-                'average_score': avg_score,
-                'weighted_average_score': weighted_avg_score,
-                'avg_gpa': avg_gpa,
-                'weighted_avg_gpa': weighted_avg_gpa,
-                'pass_rate': pass_rate,
-                'grade_distribution': grade_distribution,
+                'total_courses': summary.total_courses,
+                'completed_courses': summary.passed_courses,
+                'graded_courses': summary.graded_courses,
+                'ungraded_courses': summary.ungraded_courses,
+                'total_credits': summary.earned_credits,
+                'average_score': summary.average_score,
+                'weighted_average_score': summary.weighted_average_score,
+                'avg_gpa': summary.avg_gpa,
+                'weighted_avg_gpa': summary.weighted_gpa,
+                'pass_rate': summary.pass_rate,
+                'grade_distribution': summary.grade_distribution,
             })
             
-            # 按学期分组
-            semester_grades = {}
-            for grade in grades:
-                semester = grade.teaching_assignment.semester
-                if semester not in semester_grades:
-                    semester_grades[semester] = []
-                semester_grades[semester].append(grade)
-            
-            context['semester_grades'] = semester_grades
+            # 按学期分组：查询集已按学期排序，直接复用已取出的成绩行
+            context['semester_grades'] = {
+                semester: list(semester_rows)
+                for semester, semester_rows in groupby(
+                    grades, key=lambda grade: grade.teaching_assignment.semester
+                )
+            }
             
+            # 排名按年级缓存，通常直接命中缓存，不需要查询
+            student = self.request.user.student_profile
+            rankings = [('累计', student_ranking(student))]
+            rankings += [
+                (semester, student_ranking(student, semester))
+                for semester in context['semester_grades']
+            ]
+            context['rankings'] = [(label, row) for label, row in rankings if row is not None]
+
         else:
             context.update({
                 'total_courses': 0, 'completed_courses': 0, 'graded_courses': 0,
@@ -310,6 +239,7 @@ class MyGradesView(StudentRequiredMixin, generic.ListView):
                 'pass_rate': 0,
                 'grade_distribution': {'excellent': 0, 'good': 0, 'average': 0, 'pass': 0, 'fail': 0,},
                 'semester_grades': {},
+                'rankings': [],
             })
         
         return context
@@ -340,12 +270,13 @@ class GradeDeleteView(TeacherRequiredMixin, View):
         return redirect('grades:grade-entry', assignment_id=assignment_id)
 
 
-class AdminGradeListView(AdminRequiredMixin, generic.ListView):
+class AdminGradeListView(AdminRequiredMixin, KeysetPaginationMixin, generic.ListView):
     """管理员查看和筛选所有成绩"""
     model = Grade
     template_name = 'grades/admin_grade_list.html'
     context_object_name = 'grades'
     paginate_by = 20
+    keyset_ordering = ('-entry_time', '-id')
 
     def get_queryset(self):
         queryset = Grade.objects.select_related(
@@ -356,13 +287,9 @@ class AdminGradeListView(AdminRequiredMixin, generic.ListView):
 
         search_query = self.request.GET.get('q', '').strip()
         if search_query:
+            # 先在检索文档表中查出匹配的成绩主键，再按主键取回成绩
             queryset = queryset.filter(
-                Q(student__name__icontains=search_query) |
-                Q(student__student_id_num__icontains=search_query) |
-                Q(teaching_assignment__course__course_name__icontains=search_query) |
-                Q(teaching_assignment__course__course_id__icontains=search_query) |
-                Q(teaching_assignment__teacher__name__icontains=search_query) |
-                Q(teaching_assignment__semester__icontains=search_query)
+                pk__in=matching_ids(SearchDocument.KIND_GRADE, search_query)
             )
         return queryset
 
@@ -1,5 +1,3 @@
-import pandas as pd
-from django.http import HttpResponse
 from django.urls import reverse, reverse_lazy
 from django.shortcuts import get_object_or_404
 from django.views import generic
@@ -15,6 +13,9 @@ from .forms import (
     TeacherProfileUpdateForm, StudentUpdateForm, StudentProfileEditForm
 )
 from .models import Teacher, Student 
+from utils.exports import EXPORT_FORMATS, export_response
+from utils.models import SearchDocument
+from utils.search import matching_ids
 from common.mixins import (
     AdminRequiredMixin, StudentRequiredMixin, 
     TeacherRequiredMixin, SensitiveInfoMixin
@@ -43,11 +44,7 @@ class StudentListView(AdminRequiredMixin, SensitiveInfoMixin, generic.ListView):
         
         if search_query:
             queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(student_id_num__icontains=search_query) |
-                Q(user__username__icontains=search_query) |
-                Q(major__major_name__icontains=search_query) |
-                Q(department__dept_name__icontains=search_query)
+                pk__in=matching_ids(SearchDocument.KIND_STUDENT, search_query)
             )
         
         return queryset
@@ -206,25 +203,21 @@ class TeacherProfileUpdateView(TeacherRequiredMixin, SuccessMessageMixin, generi
         return self.request.user
 
 class StudentExportExcelView(AdminRequiredMixin, generic.View):
+    """导出学生名单，?format=csv 导出 CSV，默认导出 Excel"""
+    export_columns = [
+        ('学号', 'student_id_num'),
+        ('姓名', 'name'),
+        ('登录用户名', 'user__username'),
+        ('性别', 'gender'),
+        ('院系', 'department__dept_name'),
+        ('专业', 'major__major_name'),
+        ('入学年份', 'grade_year'),
+        ('联系电话', 'phone'),
+    ]
+
     def get(self, request, *args, **kwargs):
-        students = Student.objects.select_related('user', 'major', 'department').all()
-        
-        data = {
-            '学号': [s.student_id_num for s in students],
-            '姓名': [s.name for s in students],
-            '登录用户名': [s.user.username for s in students],
-            '性别': [s.gender for s in students],
-            '院系': [s.department.dept_name for s in students],
-            '专业': [s.major.major_name for s in students],
-            '入学年份': [s.grade_year for s in students],
-            '联系电话': [s.phone for s in students],
-        }
-        
-        df = pd.DataFrame(data)
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        )
-        response['Content-Disposition'] = 'attachment; filename="students_export.xlsx"'
-        df.to_excel(response, index=False, engine='openpyxl')
-        
-        return response
+        export_format = request.GET.get('format', 'xlsx')
+        if export_format not in EXPORT_FORMATS:
+            export_format = 'xlsx'
+        students = Student.objects.order_by('student_id_num')
+        return export_response(students, self.export_columns, 'students_export', export_format)
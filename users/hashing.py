@@ -0,0 +1,55 @@
+"""
+批量密码哈希。
+
+PBKDF2 是刻意设计的高成本计算，批量创建账号时逐个哈希会占满单个 CPU 核心。
+这里把一批明文密码分发到进程池中并行哈希，返回可直接写入 password 字段的
+哈希值（顺序与输入一致），供 bulk_create 使用。
+
+进程数由 settings.PASSWORD_HASH_WORKERS 控制（默认 2，且不超过 CPU 核数）。
+每个 Web worker 都可能各自启动进程池，子进程还要各自加载 Django，因此上限应保持
+较小；大批量导入应交给后台任务执行（见 utils.importers.enqueue_student_import）。
+设为 1 或数量较少时直接串行计算；进程池无法启动时也会回退为串行。
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import os
+import pickle
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+logger = logging.getLogger(__name__)
+
+# 少于该数量时进程池的启动开销大于收益
+PARALLEL_HASH_THRESHOLD = 8
+DEFAULT_HASH_WORKERS = 2
+
+
+def _init_worker():
+    """子进程初始化：按父进程的 DJANGO_SETTINGS_MODULE 加载 Django 配置"""
+    import django
+    django.setup()
+
+
+def _hash_worker_count(workers=None):
+    if workers is None:
+        workers = getattr(settings, 'PASSWORD_HASH_WORKERS', DEFAULT_HASH_WORKERS)
+    return max(1, min(workers or DEFAULT_HASH_WORKERS, os.cpu_count() or 1))
+
+
+def hash_passwords(passwords, workers=None):
+    """并行哈希一批明文密码，返回与输入顺序一致的哈希值列表"""
+    passwords = list(passwords)
+    workers = min(_hash_worker_count(workers), len(passwords))
+
+    if workers <= 1 or len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return [make_password(password) for password in passwords]
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(executor.map(make_password, passwords, chunksize=chunksize))
+    except (BrokenProcessPool, OSError, NotImplementedError, pickle.PicklingError) as e:
+        logger.warning("进程池哈希失败，回退为串行计算: %s", e)
+        return [make_password(password) for password in passwords]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 02:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('departments', '0001_initial'),
+        ('users', '0003_update_credits_field_labels'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['grade_year', 'major'], name='student_cohort_idx'),
+        ),
+    ]
@@ -158,6 +158,11 @@ class Student(models.Model):
     )
     def calculate_cumulative_gpa(self):
         """计算并返回该学生的累计GPA"""
+        # 优先读取成绩写入时维护的累计汇总
+        summary = self.academic_summaries.filter(semester='').only('weighted_gpa').first()
+        if summary is not None:
+            return summary.weighted_gpa if summary.weighted_gpa is not None else Decimal("0.0")
+
         # 预加载相关数据，提高效率
         grades = self.grades_received.filter(gpa__isnull=False).select_related(
             'teaching_assignment__course'
@@ -190,6 +195,10 @@ class Student(models.Model):
     class Meta:
         verbose_name = _('学生档案')
         verbose_name_plural = _('学生档案')
+        indexes = [
+            # 按年级（及专业）筛选学生：年级排名、批量选课的学生选择器
+            models.Index(fields=['grade_year', 'major'], name='student_cohort_idx'),
+        ]
     
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -3,6 +3,7 @@ from django.contrib.auth.models import Group
 from rest_framework import serializers
 
 
+from common.serializers import EagerLoadingMixin
 from departments.models import Department, Major
 
 from .models import (Student,  
@@ -71,7 +72,7 @@ class CustomUserSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class StudentProfileSerializer(serializers.ModelSerializer):
+class StudentProfileSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     用于 Student Profile 模型的序列化器
     在创建 Profile 时，通常也会创建或关联一个 CustomUser
@@ -148,7 +149,7 @@ class StudentProfileSerializer(serializers.ModelSerializer):
     
 
 
-class TeacherProfileSerializer(serializers.ModelSerializer):
+class TeacherProfileSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """
     用于 Teacher Profile 模型的序列化器
     """
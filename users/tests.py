@@ -70,4 +70,68 @@ class TeacherGradeUpdateTest(APITestCase):
 
         # 验证数据库更新
         self.grade.refresh_from_db()
-        self.assertEqual(self.grade.score, Decimal('92.50'))
\ No newline at end of file
+        self.assertEqual(self.grade.score, Decimal('92.50'))
+
+class PasswordHashingTest(TestCase):
+    """测试批量密码哈希"""
+    def test_parallel_and_serial_hashes_verify(self):
+        from django.contrib.auth.hashers import check_password
+        from users.hashing import hash_passwords
+
+        passwords = [f'secret{i}' for i in range(12)]
+        for workers in (1, 2):
+            hashes = hash_passwords(passwords, workers=workers)
+            self.assertEqual(len(hashes), len(passwords))
+            for password, password_hash in zip(passwords, hashes):
+                self.assertTrue(check_password(password, password_hash))
+        self.assertEqual(hash_passwords([]), [])
+
+    def test_worker_count_capped_by_default(self):
+        import os
+        from django.test import override_settings
+        from users.hashing import DEFAULT_HASH_WORKERS, _hash_worker_count
+
+        with override_settings(PASSWORD_HASH_WORKERS=None):
+            self.assertEqual(_hash_worker_count(), min(DEFAULT_HASH_WORKERS, os.cpu_count() or 1))
+        self.assertLessEqual(_hash_worker_count(64), os.cpu_count() or 1)
+
+
+class StudentCursorPaginationTest(APITestCase):
+    """测试学生档案 API 的游标分页"""
+    def setUp(self):
+        department = Department.objects.create(dept_code="CS", dept_name="计算机科学")
+        major = Major.objects.create(major_name="软件工程", department=department)
+        for index in range(12):
+            user = CustomUser.objects.create_user(username=f'cursor_student{index}', password='password123', role=CustomUser.Role.STUDENT)
+            Student.objects.create(
+                user=user, student_id_num=f'S7{index:03d}', name=f'游标学生{index}', gender='男',
+                major=major, department=department, degree_level='本科'
+            )
+        admin = CustomUser.objects.create_user(username='cursor_admin', password='password123', role=CustomUser.Role.ADMIN)
+        self.client.force_authenticate(admin)
+
+    def test_cursor_and_page_number_modes(self):
+        url = reverse('users-api:studentprofile-list')
+        first = self.client.get(url).data
+        self.assertEqual(first['count'], 12)
+        self.assertEqual(len(first['results']), 10)
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+
+        numbered = self.client.get(url, {'page': 2}).data
+        self.assertEqual(numbered['count'], 12)
+        self.assertEqual(len(numbered['results']), 2)
+
+    def test_list_query_count_independent_of_page_size(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        url = reverse('users-api:studentprofile-list')
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(len(self.client.get(url, {'page_size': 2}).data['results']), 2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'page_size': 10})
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(response.data['results'][0]['username'], 'cursor_student0')
+        self.assertEqual(response.data['results'][0]['major_name'], '软件工程')
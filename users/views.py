@@ -23,6 +23,8 @@ from .serializers import (
 )
 from .permissions import IsAdminRole, IsOwnerOrAdminOnly, IsStudentRole, IsTeacherRole
 from .forms import CustomAuthenticationForm
+from common.pagination import StudentCursorPagination
+from common.serializers import EagerLoadingViewSetMixin
 
 CustomUser = get_user_model()
 
@@ -158,8 +160,9 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         serializer = CustomUserSerializer(user, context={'request': request})
         return Response(serializer.data)
 
-class StudentProfileViewSet(viewsets.ModelViewSet):
+class StudentProfileViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     serializer_class = StudentProfileSerializer
+    pagination_class = StudentCursorPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -190,7 +193,7 @@ class StudentProfileViewSet(viewsets.ModelViewSet):
         serializer.save()
 
 
-class TeacherProfileViewSet(viewsets.ModelViewSet):
+class TeacherProfileViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     serializer_class = TeacherProfileSerializer
 
     def get_queryset(self):
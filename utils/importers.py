@@ -0,0 +1,244 @@
+"""
+学生批量导入引擎。
+
+流程分为两个阶段：
+1. 校验：用 pandas 向量化地清洗各列、检查必填项与身份证格式、解析出生日期；
+   用户名、学号、身份证号的冲突以及院系、专业的查找，都通过少量 __in 查询
+   预取为集合/字典后在内存中比对。文件内部的重复行按顺序去重，后出现的行
+   报"已存在"，与逐行导入的行为一致。
+2. 写入：全部行校验通过后，先用进程池并行哈希密码，再开启事务，
+   用 bulk_create 分批写入用户和学生档案。
+   任何一行出错都不写入数据库，错误信息逐行返回。
+
+开启后台任务队列时，超过 STUDENT_IMPORT_ASYNC_ROWS 行的导入在请求中只做校验，
+哈希与写入由 enqueue_student_import 交给 worker 执行，避免在 Web 进程中启动进程池。
+"""
+import json
+
+from django.conf import settings
+from django.db import transaction
+import pandas as pd
+
+from core.dashboard_cache import invalidate_dashboard
+from departments.models import Department, Major
+from users.hashing import hash_passwords
+from users.models import CustomUser, Student
+
+from .jobs import enqueue, jobs_async
+from .search import index_students
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_ASYNC_ROWS = 200
+LOOKUP_CHUNK_SIZE = 900
+
+REQUIRED_COLUMNS = ("username", "password", "name", "student_id_num", "department_name", "major_name")
+OPTIONAL_COLUMNS = (
+    "minor_department_name", "minor_major_name", "gender", "phone", "id_card",
+    "home_address", "dormitory",
+)
+ID_CARD_PATTERN = r'^\d{17}[\dXx]$'
+
+
+def _clean_frame(df):
+    """将所有文本列规范为去除首尾空白的字符串，缺失值统一为空字符串"""
+    cleaned = pd.DataFrame(index=df.index)
+    for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS:
+        if column not in df.columns:
+            cleaned[column] = ""
+            continue
+        series = df[column]
+        text = series.astype(object).where(series.notna(), "").astype(str)
+        cleaned[column] = text.mask(text == "nan", "").str.strip()
+
+    cleaned["missing_required"] = (cleaned[list(REQUIRED_COLUMNS)] == "").any(axis=1)
+    cleaned["id_card_valid"] = cleaned["id_card"].str.match(ID_CARD_PATTERN)
+
+    if "birth_date" in df.columns:
+        birth_dates = pd.to_datetime(df["birth_date"], errors="coerce", format="mixed")
+        cleaned["birth_date"] = [None if pd.isna(value) else value.date() for value in birth_dates]
+    else:
+        cleaned["birth_date"] = None
+    return cleaned
+
+
+def _existing_values(model, field, values):
+    """分块执行 __in 查询，返回数据库中已存在的值集合"""
+    values = list({value for value in values if value})
+    existing = set()
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        chunk = values[start:start + LOOKUP_CHUNK_SIZE]
+        existing.update(
+            model.objects.filter(**{f"{field}__in": chunk}).values_list(field, flat=True)
+        )
+    return existing
+
+
+def _lookup_majors(frame):
+    """一次性取出文件中涉及的院系和专业"""
+    department_names = set(frame["department_name"]) | set(frame["minor_department_name"])
+    departments = Department.objects.in_bulk(
+        [name for name in department_names if name], field_name="dept_name"
+    )
+    major_names = set(frame["major_name"]) | set(frame["minor_major_name"])
+    majors = {
+        (major.major_name, major.department_id): major
+        for major in Major.objects.filter(
+            major_name__in=[name for name in major_names if name],
+            department__in=departments.values(),
+        ).select_related("department")
+    }
+    return departments, majors
+
+
+def prepare_students(df):
+    """
+    校验导入数据，返回 (待写入的 (用户, 学生档案, 明文密码) 列表, 错误信息列表)。
+    不修改数据库。
+    """
+    frame = _clean_frame(df)
+    departments, majors = _lookup_majors(frame)
+    taken_usernames = _existing_values(CustomUser, "username", frame["username"])
+    taken_student_ids = _existing_values(Student, "student_id_num", frame["student_id_num"])
+    taken_id_cards = _existing_values(Student, "id_card", frame["id_card"])
+
+    prepared = []
+    errors = []
+
+    for index, row in zip(frame.index, frame.itertuples(index=False)):
+        row_num = index + 2
+        try:
+            # --- 数据校验 ---
+            if row.missing_required:
+                errors.append(f"第 {row_num} 行：必填字段不能为空。")
+                continue
+
+            if row.id_card:
+                if not row.id_card_valid:
+                    errors.append(f"第 {row_num} 行：身份证号 '{row.id_card}' 格式不正确，应为18位数字或17位数字+X。")
+                    continue
+                if row.id_card in taken_id_cards:
+                    errors.append(f"第 {row_num} 行：身份证号 '{row.id_card}' 已存在。")
+                    continue
+
+            if row.username in taken_usernames:
+                errors.append(f"第 {row_num} 行：用户名 '{row.username}' 已存在。")
+                continue
+
+            if row.student_id_num in taken_student_ids:
+                errors.append(f"第 {row_num} 行：学号 '{row.student_id_num}' 已存在。")
+                continue
+
+            # --- 查找院系和专业 ---
+            department = departments.get(row.department_name)
+            if department is None:
+                errors.append(f"第 {row_num} 行：主修院系 '{row.department_name}' 不存在。")
+                continue
+
+            major = majors.get((row.major_name, department.pk))
+            if major is None:
+                errors.append(f"第 {row_num} 行：在 '{row.department_name}' 院系下找不到主修专业 '{row.major_name}'。")
+                continue
+
+            # 辅修信息不完整或找不到时忽略
+            minor_department = None
+            minor_major = None
+            if row.minor_department_name and row.minor_major_name:
+                minor_department = departments.get(row.minor_department_name)
+                if minor_department is not None:
+                    minor_major = majors.get((row.minor_major_name, minor_department.pk))
+                if minor_major is None:
+                    minor_department = None
+
+            user = CustomUser(
+                username=row.username,
+                first_name=row.name,
+                role=CustomUser.Role.STUDENT,
+            )
+            student = Student(
+                student_id_num=row.student_id_num,
+                name=row.name,
+                major=major,
+                department=department,
+                minor_major=minor_major,
+                minor_department=minor_department,
+                gender=row.gender or "男",
+                birth_date=row.birth_date,
+                phone=row.phone or None,
+                id_card=row.id_card or None,
+                home_address=row.home_address or None,
+                dormitory=row.dormitory or None,
+            )
+            student.clean()
+        except Exception as e:
+            errors.append(f"处理第 {row_num} 行时发生未知错误: {e}")
+            continue
+
+        # 本行将被导入，文件中后续重复的行视为已存在
+        taken_usernames.add(row.username)
+        taken_student_ids.add(row.student_id_num)
+        if row.id_card:
+            taken_id_cards.add(row.id_card)
+        prepared.append((user, student, row.password))
+
+    return prepared, errors
+
+
+def create_students(prepared, batch_size=IMPORT_BATCH_SIZE):
+    """并行哈希密码后，在一个事务内分批写入已校验的用户和学生档案，返回写入的学生数"""
+    password_hashes = hash_passwords([password for _, _, password in prepared])
+    for (user, _, _), password_hash in zip(prepared, password_hashes):
+        user.password = password_hash
+
+    with transaction.atomic():
+        for start in range(0, len(prepared), batch_size):
+            batch = prepared[start:start + batch_size]
+            users = CustomUser.objects.bulk_create([user for user, _, _ in batch])
+            if any(user.pk is None for user in users):
+                # MySQL 的 bulk_create 不回填主键，按用户名取回
+                user_ids = dict(
+                    CustomUser.objects.filter(
+                        username__in=[user.username for user in users]
+                    ).values_list("username", "pk")
+                )
+                for user in users:
+                    user.pk = user_ids[user.username]
+            for user, student, _ in batch:
+                student.user = user
+            Student.objects.bulk_create([student for _, student, _ in batch])
+            index_students(Student.objects.filter(pk__in=[user.pk for user in users]))
+
+    # bulk_create 不触发 post_save，手动使首页统计失效
+    invalidate_dashboard()
+    return len(prepared)
+
+
+def import_students(df, batch_size=IMPORT_BATCH_SIZE):
+    """校验并导入学生，返回 (导入数量, 错误信息列表)；有任何错误时不写入"""
+    prepared, errors = prepare_students(df)
+    if errors:
+        return 0, errors
+    return create_students(prepared, batch_size=batch_size), errors
+
+
+class StudentImportError(Exception):
+    """后台导入时校验未通过（如提交后数据已变化），异常信息记录到任务的 last_error"""
+
+
+def import_in_background(df):
+    """是否应把这次导入交给后台任务执行"""
+    return jobs_async() and len(df) >= getattr(settings, 'STUDENT_IMPORT_ASYNC_ROWS', IMPORT_ASYNC_ROWS)
+
+
+def enqueue_student_import(df):
+    """把导入数据序列化后提交为后台任务，返回 Job"""
+    rows = json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+    # 校验错误重试也不会消失，只执行一次
+    return enqueue(run_student_import, max_attempts=1, rows=rows)
+
+
+def run_student_import(rows):
+    """后台任务：重新校验并导入学生，有错误时抛出 StudentImportError"""
+    count, errors = import_students(pd.DataFrame(rows))
+    if errors:
+        raise StudentImportError("\n".join(errors))
+    return count
@@ -0,0 +1,197 @@
+"""
+基于数据库的后台任务队列。
+
+    enqueue('grades.services.refresh_student_records', credit_ids=[...], summary_ids=[...])
+
+- 任务是可导入的函数（传入函数对象或点号路径），参数必须可以 JSON 序列化；
+- 在事务中入队时任务行随事务一起提交或回滚，worker 只会看到已提交的任务；
+- dedup_key 相同且仍在等待的任务只保留一条（由数据库唯一约束保证，并发入队也不会重复）；
+- 执行失败后按指数退避重试，超过 max_attempts 次后标记为失败；
+- 执行中的任务定期续租（刷新 locked_at）；超过 JOB_LOCK_TIMEOUT 秒没有续租
+  （如 worker 被杀掉）会被重新放回队列；
+- 已完成和失败的任务保留 JOB_RETENTION 秒后由 worker 清理。
+
+未开启 BACKGROUND_JOBS_ASYNC 时（默认），enqueue 直接在当前进程中执行任务，
+不需要运行 worker，行为与同步调用一致。always_async=True 的任务（如选课请求队列）
+不在 Web 进程中执行，始终入队等待 worker 处理。
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+PURGE_BATCH_SIZE = 1000
+
+
+def jobs_async():
+    return getattr(settings, 'BACKGROUND_JOBS_ASYNC', False)
+
+
+def _task_path(task):
+    if isinstance(task, str):
+        return task
+    return f'{task.__module__}.{task.__qualname__}'
+
+
+def retry_delay(attempts):
+    """第 attempts 次失败后的等待秒数：基数 × 2^(attempts-1)"""
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 30)
+    return base * 2 ** max(attempts - 1, 0)
+
+
+def enqueue(task, dedup_key=None, delay=0, max_attempts=DEFAULT_MAX_ATTEMPTS,
+            always_async=False, **payload):
+    """
+    提交后台任务，返回 Job；同步模式下直接执行任务并返回 None。
+
+    dedup_key 相同的等待中任务已存在时不再重复创建，返回已有的任务。
+    always_async=True 时无论是否开启 BACKGROUND_JOBS_ASYNC 都只入队。
+    """
+    if not always_async and not jobs_async():
+        import_string(_task_path(task))(**payload)
+        return None
+
+    while True:
+        if dedup_key:
+            existing = Job.objects.filter(dedup_key=dedup_key, status=Job.STATUS_PENDING).first()
+            if existing is not None:
+                return existing
+        try:
+            # 并发入队时由唯一约束拦下重复的等待任务，在保存点中回滚后返回已有的任务
+            with transaction.atomic():
+                return Job.objects.create(
+                    task=_task_path(task),
+                    payload=payload,
+                    dedup_key=dedup_key,
+                    max_attempts=max_attempts,
+                    run_after=timezone.now() + timedelta(seconds=delay),
+                )
+        except IntegrityError:
+            if not dedup_key:
+                raise
+
+
+def _lock_timeout():
+    return getattr(settings, 'JOB_LOCK_TIMEOUT', 600)
+
+
+def requeue_stale_jobs():
+    """将超过 JOB_LOCK_TIMEOUT 秒没有续租的执行中任务放回队列，返回数量"""
+    cutoff = timezone.now() - timedelta(seconds=_lock_timeout())
+    return Job.objects.filter(status=Job.STATUS_RUNNING, locked_at__lt=cutoff).update(
+        status=Job.STATUS_PENDING, locked_by='', locked_at=None,
+    )
+
+
+def claim_next_job(worker_name, candidates=10):
+    """
+    领取一个到期的等待中任务。先读出若干候选，再用带 status 条件的 UPDATE 抢占；
+    UPDATE 影响 0 行说明已被其它 worker 领取，继续尝试下一个候选。
+    """
+    now = timezone.now()
+    candidate_ids = Job.objects.filter(
+        status=Job.STATUS_PENDING, run_after__lte=now,
+    ).order_by('run_after', 'pk').values_list('pk', flat=True)[:candidates]
+    for job_id in candidate_ids:
+        claimed = Job.objects.filter(pk=job_id, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING,
+            locked_by=worker_name,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+class _Heartbeat(threading.Thread):
+    """任务执行期间每隔 JOB_LOCK_TIMEOUT 的三分之一刷新一次 locked_at，长任务不会被当作超时重新入队"""
+
+    def __init__(self, job):
+        super().__init__(name=f'job-heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.interval = _lock_timeout() / 3
+        self.finished = threading.Event()
+
+    def run(self):
+        try:
+            while not self.finished.wait(self.interval):
+                _own(self.job).update(locked_at=timezone.now())
+        finally:
+            # 线程有独立的数据库连接，退出前关闭
+            connection.close()
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def _own(job):
+    """仍由本次领取持有的任务；已被重新入队并由其它 worker 领取时为空"""
+    return Job.objects.filter(pk=job.pk, status=Job.STATUS_RUNNING, locked_by=job.locked_by)
+
+
+def run_job(job):
+    """执行已领取的任务并记录结果，成功返回 True"""
+    heartbeat = _Heartbeat(job)
+    heartbeat.start()
+    try:
+        try:
+            import_string(job.task)(**job.payload)
+        finally:
+            heartbeat.stop()
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("后台任务 %s 执行失败（第 %s 次）", job, job.attempts)
+        if job.attempts < job.max_attempts:
+            _own(job).update(
+                status=Job.STATUS_PENDING,
+                run_after=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+                locked_by='', locked_at=None, last_error=error,
+            )
+        else:
+            _own(job).update(
+                status=Job.STATUS_FAILED, finished_at=timezone.now(), last_error=error,
+            )
+        return False
+
+    _own(job).update(status=Job.STATUS_SUCCEEDED, finished_at=timezone.now())
+    return True
+
+
+def purge_finished_jobs(batch_size=PURGE_BATCH_SIZE):
+    """删除结束超过 JOB_RETENTION 秒的已完成和失败任务，分批删除，返回删除的数量"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'JOB_RETENTION', 7 * 24 * 3600))
+    finished = Job.objects.filter(
+        status__in=[Job.STATUS_SUCCEEDED, Job.STATUS_FAILED], finished_at__lt=cutoff,
+    )
+    deleted = 0
+    while True:
+        # MySQL 不支持在 IN 子查询中使用 LIMIT，先取出主键
+        ids = list(finished.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Job.objects.filter(pk__in=ids).delete()[0]
+
+
+def run_pending_jobs(worker_name='inline', limit=None):
+    """在当前线程中依次执行到期的任务，直到队列为空或达到 limit，返回执行的任务数"""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job(worker_name)
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
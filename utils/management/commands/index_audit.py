@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from utils.query_audit import ISSUE_LABELS, audit_catalogue
+
+
+class Command(BaseCommand):
+    help = '对热点查询执行 EXPLAIN，检查是否存在全表扫描和额外排序'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='要检查的数据库别名（默认 default）',
+        )
+        parser.add_argument(
+            '--show-plans',
+            action='store_true',
+            help='输出每条查询的完整执行计划',
+        )
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help='发现问题时以非零状态退出（用于 CI）',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = audit_catalogue(using=options['database'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        flagged = 0
+        for result in results:
+            query = result.query
+            if result.issues:
+                flagged += 1
+                self.stdout.write(self.style.WARNING(f'[问题] {query.label} ({query.source})'))
+            else:
+                self.stdout.write(f'[正常] {query.label} ({query.source})')
+            for issue in result.issues:
+                self.stdout.write(self.style.WARNING(f'    {ISSUE_LABELS[issue.kind]}: {issue.detail}'))
+            for issue in dict.fromkeys(result.ignored):
+                self.stdout.write(f'    已知{ISSUE_LABELS[issue.kind]}（可接受）: {issue.detail}')
+            if options['show_plans']:
+                for line in result.plan.splitlines():
+                    self.stdout.write(f'    | {line}')
+
+        summary = f'共检查 {len(results)} 条查询，{flagged} 条存在全表扫描或额外排序'
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS(summary))
+        elif options['fail']:
+            raise CommandError(summary)
+        else:
+            self.stdout.write(self.style.WARNING(summary))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from utils.models import SearchDocument
+from utils.search import rebuild_index
+
+class Command(BaseCommand):
+    help = '重建成绩和学生的全文检索文档'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=[kind for kind, _ in SearchDocument.KIND_CHOICES],
+            help='只重建指定类型的检索文档（可选）',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='每批写入的文档数量（默认 1000）',
+        )
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else [kind for kind, _ in SearchDocument.KIND_CHOICES]
+        for kind in kinds:
+            count = rebuild_index(kind, batch_size=options['batch_size'])
+            self.stdout.write(
+                self.style.SUCCESS(f'已重建 {count} 条{dict(SearchDocument.KIND_CHOICES)[kind]}检索文档')
+            )
@@ -0,0 +1,97 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from utils.jobs import claim_next_job, purge_finished_jobs, requeue_stale_jobs, run_job
+
+# 空闲时清理过期任务记录的最短间隔（秒）
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = '运行后台任务 worker，从数据库任务队列中领取并执行任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='并发执行任务的线程数（默认 1）',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='队列为空时的轮询间隔秒数（默认 1）',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='执行完当前到期的任务后退出',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(options['concurrency'], 1)
+        self.verbosity = options['verbosity']
+        self.poll_interval = options['poll_interval']
+        self.once = options['once']
+        self.stop = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+
+        requeue_stale_jobs()
+        self.last_purge = None
+        self.purge_if_due()
+        self.stdout.write(f'worker 已启动，并发数 {concurrency}')
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.work_loop, f'{prefix}:{index}')
+                for index in range(concurrency)
+            ]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self.stdout.write('正在停止，等待执行中的任务结束...')
+                self.stop.set()
+
+        self.stdout.write(self.style.SUCCESS(f'worker 已停止，共执行 {self.processed} 个任务'))
+
+    def work_loop(self, worker_name):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_next_job(worker_name)
+                if job is None:
+                    if self.once:
+                        break
+                    requeue_stale_jobs()
+                    self.purge_if_due()
+                    self.stop.wait(self.poll_interval)
+                    continue
+                succeeded = run_job(job)
+                with self.lock:
+                    self.processed += 1
+                if self.verbosity > 1:
+                    self.stdout.write(f'{worker_name} {"完成" if succeeded else "失败"}: {job.task} #{job.pk}')
+        finally:
+            # 每个线程有独立的数据库连接，退出前关闭
+            connection.close()
+
+    def purge_if_due(self):
+        """距上次清理超过 PURGE_INTERVAL 时删除过期的已完成和失败任务（多个线程只由一个执行）"""
+        with self.lock:
+            now = time.monotonic()
+            if self.last_purge is not None and now - self.last_purge < PURGE_INTERVAL:
+                return
+            self.last_purge = now
+        deleted = purge_finished_jobs()
+        if deleted and self.verbosity > 1:
+            self.stdout.write(f'已清理 {deleted} 条过期任务记录')
+
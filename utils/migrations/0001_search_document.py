@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 01:52
+
+from django.db import migrations, models
+
+
+FULLTEXT_INDEX = "utils_searchdocument_content_ft"
+
+
+def create_fulltext_index(apps, schema_editor):
+    # 仅 MySQL 支持 ngram 全文索引，其它数据库检索时回退为 LIKE 匹配
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(
+        f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON utils_searchdocument (content) WITH PARSER ngram"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    schema_editor.execute(f"DROP INDEX {FULLTEXT_INDEX} ON utils_searchdocument")
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('grade', '成绩'), ('student', '学生')], max_length=20, verbose_name='文档类型')),
+                ('object_id', models.BigIntegerField(verbose_name='记录主键')),
+                ('content', models.TextField(verbose_name='检索内容')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '检索文档',
+                'verbose_name_plural': '检索文档',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def backfill_search_documents(apps, schema_editor):
+    """为已有的成绩和学生建立检索文档，按主键分块，每块交给检索模块的索引函数"""
+    from utils.search import index_queryset
+
+    SearchDocument = apps.get_model('utils', 'SearchDocument')
+    for kind, model in (('grade', apps.get_model('grades', 'Grade')), ('student', apps.get_model('users', 'Student'))):
+        last_pk = None
+        while True:
+            chunk = model.objects.order_by('pk')
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list('pk', flat=True)[:BACKFILL_CHUNK_SIZE])
+            if not pks:
+                break
+            index_queryset(
+                kind, model.objects.filter(pk__in=pks),
+                batch_size=BACKFILL_CHUNK_SIZE, document_model=SearchDocument,
+            )
+            last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0002_job'),
+        ('grades', '0006_hot_query_indexes'),
+        ('users', '0004_student_cohort_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 03:52
+
+from django.db import migrations, models
+
+
+def drop_duplicate_pending_jobs(apps, schema_editor):
+    """加约束前合并已有的重复等待任务，每个去重键保留最早的一条"""
+    Job = apps.get_model('utils', 'Job')
+    duplicates = (
+        Job.objects.filter(status='pending', dedup_key__isnull=False)
+        .values('dedup_key').annotate(count=models.Count('pk'), first=models.Min('pk'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates:
+        Job.objects.filter(status='pending', dedup_key=row['dedup_key']).exclude(pk=row['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('utils', '0003_backfill_search_documents'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_pending_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(models.Case(models.When(status='pending', then=models.F('dedup_key'))), name='unique_pending_job_dedup_key'),
+        ),
+    ]
@@ -1,3 +1,81 @@
 from django.db import models
 
-# Create your models here.
+
+class SearchDocument(models.Model):
+    """
+    全文检索文档：把需要搜索的多表字段拼接为一行文本（反范式），
+    列表页先在这张表中查出匹配的主键，再按主键取回原始记录。
+    MySQL 下 content 列建有 ngram 全文索引，其它数据库回退为 LIKE 匹配。
+    """
+    KIND_GRADE = 'grade'
+    KIND_STUDENT = 'student'
+    KIND_CHOICES = [
+        (KIND_GRADE, '成绩'),
+        (KIND_STUDENT, '学生'),
+    ]
+
+    kind = models.CharField('文档类型', max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField('记录主键')
+    content = models.TextField('检索内容')
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    class Meta:
+        verbose_name = '检索文档'
+        verbose_name_plural = '检索文档'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.object_id}"
+
+
+class Job(models.Model):
+    """
+    后台任务队列（数据库作为消息代理）。
+
+    任务以可导入的函数路径和 JSON 参数保存，由 run_worker 命令领取执行。
+    领取通过带状态条件的 UPDATE 完成，多个 worker 并发时同一任务只会被一个领取。
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待执行'),
+        (STATUS_RUNNING, '执行中'),
+        (STATUS_SUCCEEDED, '已完成'),
+        (STATUS_FAILED, '失败'),
+    ]
+
+    task = models.CharField('任务函数', max_length=200)
+    payload = models.JSONField('参数', default=dict, blank=True)
+    status = models.CharField('状态', max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    dedup_key = models.CharField('去重键', max_length=200, blank=True, null=True)
+    attempts = models.PositiveIntegerField('已尝试次数', default=0)
+    max_attempts = models.PositiveIntegerField('最大尝试次数', default=3)
+    run_after = models.DateTimeField('可执行时间')
+    locked_by = models.CharField('执行者', max_length=100, blank=True)
+    locked_at = models.DateTimeField('领取时间', null=True, blank=True)
+    last_error = models.TextField('最近错误', blank=True)
+    created_at = models.DateTimeField('创建时间', auto_now_add=True)
+    finished_at = models.DateTimeField('结束时间', null=True, blank=True)
+
+    class Meta:
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['dedup_key', 'status'], name='job_dedup_key_idx'),
+        ]
+        constraints = [
+            # 同一去重键最多一条等待中的任务。用表达式而不是 condition：MySQL 不支持部分索引，
+            # 非等待状态的表达式值为 NULL，不参与唯一性比较
+            models.UniqueConstraint(
+                models.Case(models.When(status='pending', then=models.F('dedup_key'))),
+                name='unique_pending_job_dedup_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.get_status_display()})"
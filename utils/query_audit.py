@@ -0,0 +1,263 @@
+"""
+热点查询的执行计划审计（manage.py index_audit）。
+
+QUERY_CATALOGUE 收录视图和服务中实际执行的查询形状，对每条查询执行 EXPLAIN，
+从执行计划中找出两类问题：
+- full_scan：对整张表的顺序扫描（SQLite 的 SCAN <表>、MySQL 的 type=ALL、PostgreSQL 的 Seq Scan）；
+- filesort：无法利用索引顺序、需要额外排序（SQLite 的 USE TEMP B-TREE、MySQL 的 Using filesort、
+  PostgreSQL 的 Sort 节点）。
+
+查询中的参数（学生、授课安排等）只取占位值，EXPLAIN 不要求数据存在。
+对结果集很小、排序无法避免的查询，条目的 allow 中列出可以接受的问题类型。
+新增热点查询时在目录中补充一条，新增或调整索引后重新运行即可确认执行计划。
+"""
+import json
+import re
+from collections import namedtuple
+
+from django.db import connections
+from django.db.models import Count
+
+FULL_SCAN = 'full_scan'
+FILESORT = 'filesort'
+
+ISSUE_LABELS = {
+    FULL_SCAN: '全表扫描',
+    FILESORT: '额外排序',
+}
+
+# 占位参数：EXPLAIN 只关心查询形状
+SAMPLE_ID = 1
+SAMPLE_SEMESTER = '2024-2025-1'
+SAMPLE_GRADE_YEAR = 2024
+
+AuditQuery = namedtuple('AuditQuery', 'label source build allow')
+AuditResult = namedtuple('AuditResult', 'query plan issues ignored')
+Issue = namedtuple('Issue', 'kind detail')
+
+
+def _admin_grade_page():
+    from common.pagination import _keyset_filter
+    from grades.models import Grade
+    from grades.views import AdminGradeListView
+
+    ordering = list(AdminGradeListView.keyset_ordering)
+    # 翻到第二页之后的查询：按游标位置过滤，多取一行
+    return Grade.objects.select_related(
+        'student__user', 'teaching_assignment__course', 'teaching_assignment__teacher',
+    ).order_by(*ordering).filter(
+        _keyset_filter(ordering, ['2024-01-01T00:00:00+00:00', SAMPLE_ID])
+    )[:AdminGradeListView.paginate_by + 1]
+
+
+def _enrollment_page():
+    from common.pagination import _keyset_filter
+    from courses.frontend_views import CourseEnrollmentListView
+    from courses.models import CourseEnrollment
+
+    ordering = list(CourseEnrollmentListView.keyset_ordering)
+    return CourseEnrollment.objects.select_related(
+        'student__user', 'student__department',
+        'teaching_assignment__course', 'teaching_assignment__teacher',
+    ).order_by(*ordering).filter(
+        _keyset_filter(ordering, ['2024-01-01T00:00:00+00:00', SAMPLE_ID])
+    )[:CourseEnrollmentListView.paginate_by + 1]
+
+
+def _passing_grades():
+    from grades.models import Grade
+    from grades.services import PASSING_SCORE
+
+    return Grade.objects.filter(
+        student_id=SAMPLE_ID, score__gte=PASSING_SCORE,
+    ).select_related('teaching_assignment__course')
+
+
+def _section_statistics():
+    from django.db.models import Avg, Max, Min
+
+    from grades.models import Grade
+
+    return Grade.objects.filter(
+        teaching_assignment__in=[SAMPLE_ID, SAMPLE_ID + 1],
+    ).order_by().values('teaching_assignment_id').annotate(
+        total_students=Count('id'),
+        submitted_count=Count('score'),
+        average_score=Avg('score'),
+        highest_score=Max('score'),
+        lowest_score=Min('score'),
+    )
+
+
+def _my_grades():
+    from grades.models import Grade
+
+    return Grade.objects.filter(student_id=SAMPLE_ID).select_related(
+        'teaching_assignment__course', 'teaching_assignment__teacher',
+    ).order_by('-teaching_assignment__semester', 'teaching_assignment__course__course_name')
+
+
+def _course_roster():
+    from courses.models import CourseEnrollment
+
+    return CourseEnrollment.objects.filter(
+        teaching_assignment_id=SAMPLE_ID, status=CourseEnrollment.STATUS_ENROLLED,
+    ).select_related('student__user', 'student__major').order_by('student__student_id_num')
+
+
+def _teacher_courses():
+    from courses.models import TeachingAssignment
+
+    return TeachingAssignment.objects.filter(teacher_id=SAMPLE_ID).select_related(
+        'course', 'teacher',
+    ).order_by('-semester', 'course__course_name')
+
+
+def _waitlist_head():
+    from courses.models import CourseEnrollment
+
+    return CourseEnrollment.objects.filter(
+        teaching_assignment_id=SAMPLE_ID, status=CourseEnrollment.STATUS_WAITLISTED,
+    ).order_by('enrollment_date', 'pk').values_list('student_id', flat=True)[:1]
+
+
+def _seat_recount():
+    from courses.models import CourseEnrollment
+
+    return CourseEnrollment.objects.filter(
+        teaching_assignment_id=SAMPLE_ID, status=CourseEnrollment.STATUS_ENROLLED,
+    ).order_by().values('teaching_assignment').annotate(total=Count('pk'))
+
+
+def _student_enrollments():
+    from courses.models import CourseEnrollment
+
+    return CourseEnrollment.objects.filter(
+        student_id__in=[SAMPLE_ID, SAMPLE_ID + 1],
+        teaching_assignment__semester=SAMPLE_SEMESTER,
+        status__in=[CourseEnrollment.STATUS_ENROLLED, CourseEnrollment.STATUS_WAITLISTED],
+    ).exclude(teaching_assignment_id__in=[SAMPLE_ID]).order_by().values_list(
+        'student_id', 'teaching_assignment_id',
+    )
+
+
+def _semester_timetable():
+    from courses.models import TimeSlot
+
+    return TimeSlot.objects.filter(teaching_assignment__semester=SAMPLE_SEMESTER).order_by().values_list(
+        'teaching_assignment_id', 'teaching_assignment__teacher_id',
+        'teaching_assignment__course__course_name',
+        'weekday', 'start_time', 'end_time', 'room',
+    )
+
+
+def _pending_selections():
+    from courses.models import SelectionRequest
+
+    return SelectionRequest.objects.filter(
+        status=SelectionRequest.STATUS_PENDING,
+    ).order_by('pk').values_list('pk', flat=True)[:100]
+
+
+def _cohort_ranking():
+    from grades.ranking import ranking_queryset
+
+    return ranking_queryset(grade_year=SAMPLE_GRADE_YEAR)
+
+
+QUERY_CATALOGUE = [
+    AuditQuery('管理员成绩列表（键集分页）', 'grades.views.AdminGradeListView', _admin_grade_page, ()),
+    AuditQuery('选课记录列表（键集分页）', 'courses.frontend_views.CourseEnrollmentListView', _enrollment_page, ()),
+    AuditQuery('学生及格成绩', 'grades.services.compute_student_credits', _passing_grades,
+               # 模型默认排序，单个学生的成绩行数很少
+               (FILESORT,)),
+    AuditQuery('授课安排成绩统计', 'grades.services.section_grade_statistics', _section_statistics, ()),
+    AuditQuery('学生本人成绩', 'grades.views.MyGradesView', _my_grades, (FILESORT,)),
+    AuditQuery('课程学生名单', 'grades.views.GradeEntryView', _course_roster, (FILESORT,)),
+    AuditQuery('教师授课列表', 'grades.views.TeacherCoursesView', _teacher_courses, (FILESORT,)),
+    AuditQuery('候补名单队首', 'courses.services.promote_waitlist', _waitlist_head, ()),
+    AuditQuery('重算已选人数', 'courses.services.recount_seats', _seat_recount, ()),
+    AuditQuery('学生同学期已选课程', 'courses.timetable.enrollment_conflicts', _student_enrollments, ()),
+    AuditQuery('学期课表', 'courses.timetable.SemesterTimetable', _semester_timetable, ()),
+    AuditQuery('待处理选课请求', 'courses.services.process_selection_requests', _pending_selections, ()),
+    AuditQuery('年级排名', 'grades.ranking.ranking_queryset', _cohort_ranking,
+               # 窗口函数需要按分区排序
+               (FILESORT,)),
+]
+
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\S+)(.*)$')
+_POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\S+)')
+_POSTGRES_SORT = re.compile(r'^(->\s*)?Sort\s+\(')
+
+
+def sqlite_issues(plan):
+    issues = []
+    for line in plan.splitlines():
+        # 每行为 "id parent notused detail"
+        parts = line.split(maxsplit=3)
+        detail = parts[3] if len(parts) == 4 else line.strip()
+        match = _SQLITE_SCAN.match(detail)
+        if match:
+            table, rest = match.groups()
+            # 子查询、常量行的扫描以及按索引顺序扫描都不算全表扫描
+            if not table.startswith('(') and table != 'CONSTANT' and 'INDEX' not in rest:
+                issues.append(Issue(FULL_SCAN, table))
+        elif detail.startswith('USE TEMP B-TREE'):
+            issues.append(Issue(FILESORT, detail))
+    return issues
+
+
+def _mysql_nodes(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _mysql_nodes(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _mysql_nodes(item)
+
+
+def mysql_issues(plan):
+    issues = []
+    for node in _mysql_nodes(json.loads(plan)):
+        if node.get('access_type') == 'ALL':
+            issues.append(Issue(FULL_SCAN, node.get('table_name', '?')))
+        if node.get('using_filesort'):
+            issues.append(Issue(FILESORT, 'Using filesort'))
+    return issues
+
+
+def postgresql_issues(plan):
+    issues = []
+    for line in plan.splitlines():
+        match = _POSTGRES_SEQ_SCAN.search(line)
+        if match:
+            issues.append(Issue(FULL_SCAN, match.group(1)))
+        elif _POSTGRES_SORT.match(line.strip()):
+            issues.append(Issue(FILESORT, line.strip().lstrip('-> ')))
+    return issues
+
+
+PLAN_PARSERS = {
+    'sqlite': ({}, sqlite_issues),
+    'mysql': ({'format': 'json'}, mysql_issues),
+    'postgresql': ({}, postgresql_issues),
+}
+
+
+def audit_query(query, using='default'):
+    """对一条目录查询执行 EXPLAIN，返回 AuditResult；不支持的数据库后端抛出 ValueError"""
+    vendor = connections[using].vendor
+    if vendor not in PLAN_PARSERS:
+        raise ValueError(f'不支持分析 {vendor} 的执行计划')
+    options, parse = PLAN_PARSERS[vendor]
+    plan = query.build().using(using).explain(**options)
+    issues, ignored = [], []
+    for issue in parse(plan):
+        (ignored if issue.kind in query.allow else issues).append(issue)
+    return AuditResult(query, plan, issues, ignored)
+
+
+def audit_catalogue(using='default', catalogue=None):
+    return [audit_query(query, using) for query in (catalogue or QUERY_CATALOGUE)]
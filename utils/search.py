@@ -0,0 +1,121 @@
+"""
+检索文档的构建与查询。
+
+成绩文档包含：学生姓名、学号、课程名、课程号、授课教师、学期；
+学生文档包含：姓名、学号、登录用户名、主修专业、主修院系。
+构建时只用 values_list 取出拼接所需的列，按批 upsert，不实例化模型对象。
+"""
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from grades.models import Grade
+from users.models import Student
+
+from .models import SearchDocument
+
+INDEX_BATCH_SIZE = 1000
+
+GRADE_FIELDS = (
+    'pk',
+    'student__name',
+    'student__student_id_num',
+    'teaching_assignment__course__course_name',
+    'teaching_assignment__course__course_id',
+    'teaching_assignment__teacher__name',
+    'teaching_assignment__semester',
+)
+STUDENT_FIELDS = (
+    'pk',
+    'name',
+    'student_id_num',
+    'user__username',
+    'major__major_name',
+    'department__dept_name',
+)
+
+INDEXED_FIELDS = {
+    SearchDocument.KIND_GRADE: (Grade, GRADE_FIELDS),
+    SearchDocument.KIND_STUDENT: (Student, STUDENT_FIELDS),
+}
+
+# ngram 分词的最小长度（MySQL 默认 ngram_token_size=2），更短的检索词无法命中全文索引
+MIN_FULLTEXT_QUERY_LENGTH = 2
+
+
+def _conflict_options():
+    """bulk_create 冲突更新参数；MySQL 不支持指定冲突目标字段"""
+    options = {
+        'update_conflicts': True,
+        'update_fields': ['content', 'updated_at'],
+    }
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['kind', 'object_id']
+    return options
+
+
+def _document_content(values):
+    return ' '.join(str(value) for value in values if value)
+
+
+def index_queryset(kind, queryset, batch_size=INDEX_BATCH_SIZE, document_model=SearchDocument):
+    """
+    为查询集中的记录创建或更新检索文档，返回处理的记录数。
+    数据迁移中传入历史模型的查询集和 document_model。
+    """
+    _, fields = INDEXED_FIELDS[kind]
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=batch_size)
+    now = timezone.now()
+    batch = []
+    count = 0
+    for pk, *values in rows:
+        batch.append(document_model(
+            kind=kind, object_id=pk, content=_document_content(values), updated_at=now,
+        ))
+        if len(batch) >= batch_size:
+            document_model.objects.bulk_create(batch, **_conflict_options())
+            count += len(batch)
+            batch = []
+    if batch:
+        document_model.objects.bulk_create(batch, **_conflict_options())
+        count += len(batch)
+    return count
+
+
+def index_grades(queryset, batch_size=INDEX_BATCH_SIZE):
+    return index_queryset(SearchDocument.KIND_GRADE, queryset, batch_size)
+
+
+def index_students(queryset, batch_size=INDEX_BATCH_SIZE):
+    return index_queryset(SearchDocument.KIND_STUDENT, queryset, batch_size)
+
+
+def remove_documents(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def rebuild_index(kind, batch_size=INDEX_BATCH_SIZE):
+    """重建某一类型的全部检索文档，并清理已不存在记录的文档"""
+    model, _ = INDEXED_FIELDS[kind]
+    count = index_queryset(kind, model.objects.all(), batch_size)
+    SearchDocument.objects.filter(kind=kind).exclude(
+        object_id__in=model.objects.values('pk')
+    ).delete()
+    return count
+
+
+def matching_ids(kind, query):
+    """
+    返回匹配检索词的记录主键（子查询），供列表页 pk__in 过滤使用。
+    MySQL 下使用 ngram 全文索引的短语匹配，效果等同于子串匹配；
+    其它数据库或检索词过短时回退为单表的 LIKE 匹配。
+    """
+    documents = SearchDocument.objects.filter(kind=kind)
+    query = query.replace('"', ' ').strip()
+    if connection.vendor == 'mysql' and len(query) >= MIN_FULLTEXT_QUERY_LENGTH:
+        documents = documents.annotate(
+            relevance=RawSQL('MATCH (content) AGAINST (%s IN BOOLEAN MODE)', (f'"{query}"',))
+        ).filter(relevance__gt=0)
+    else:
+        documents = documents.filter(content__icontains=query)
+    return documents.values('object_id')
@@ -0,0 +1,107 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from courses.models import Course, TeachingAssignment
+from departments.models import Department, Major
+from grades.models import Grade
+from users.models import Student, Teacher
+
+from .models import SearchDocument
+from .search import index_grades, index_students, remove_documents
+
+User = get_user_model()
+
+# 保存时只涉及其它字段（分数、学分统计等）不影响检索文档，无需重建
+GRADE_DOCUMENT_FIELDS = {'student', 'student_id', 'teaching_assignment', 'teaching_assignment_id'}
+STUDENT_DOCUMENT_FIELDS = {'name', 'student_id_num', 'major', 'major_id', 'department', 'department_id'}
+# 成绩文档中包含的学生字段
+STUDENT_GRADE_DOCUMENT_FIELDS = {'name', 'student_id_num'}
+
+
+def _touches(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver(pre_save, sender=Grade)
+def note_grade_document_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """保存前对比加载时的学生和授课安排，判断检索文档是否需要更新（post_save 时已记录为新状态）"""
+    saved_state = getattr(instance, '_saved_credit_state', None)
+    instance._search_document_stale = _touches(update_fields, GRADE_DOCUMENT_FIELDS) and (
+        saved_state is None
+        or instance._state.adding
+        or saved_state[:2] != (instance.student_id, instance.teaching_assignment_id)
+    )
+
+
+@receiver(post_save, sender=Grade)
+def index_grade(sender, instance, raw=False, **kwargs):
+    """成绩新建或更换学生、授课安排后更新其检索文档"""
+    if raw or not getattr(instance, '_search_document_stale', True):
+        return
+    index_grades(Grade.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Grade)
+def remove_grade_document(sender, instance, **kwargs):
+    remove_documents(SearchDocument.KIND_GRADE, [instance.pk])
+
+
+@receiver(post_save, sender=Student)
+def index_student(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """学生信息变化会影响学生文档及其全部成绩文档；只更新学分统计等字段时跳过"""
+    if raw or not _touches(update_fields, STUDENT_DOCUMENT_FIELDS):
+        return
+    index_students(Student.objects.filter(pk=instance.pk))
+    if not created and _touches(update_fields, STUDENT_GRADE_DOCUMENT_FIELDS):
+        index_grades(Grade.objects.filter(student=instance))
+
+
+@receiver(post_delete, sender=Student)
+def remove_student_document(sender, instance, **kwargs):
+    remove_documents(SearchDocument.KIND_STUDENT, [instance.pk])
+
+
+@receiver(post_save, sender=User)
+def reindex_user_student(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """登录用户名包含在学生文档中；只更新其它字段（如登录时的 last_login）时无需重建"""
+    if raw or created:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    index_students(Student.objects.filter(user=instance))
+
+
+@receiver(post_save, sender=Teacher)
+def reindex_teacher_grades(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    index_grades(Grade.objects.filter(teaching_assignment__teacher=instance))
+
+
+@receiver(post_save, sender=Course)
+def reindex_course_grades(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    index_grades(Grade.objects.filter(teaching_assignment__course=instance))
+
+
+@receiver(post_save, sender=TeachingAssignment)
+def reindex_assignment_grades(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    index_grades(Grade.objects.filter(teaching_assignment=instance))
+
+
+@receiver(post_save, sender=Major)
+def reindex_major_students(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    index_students(Student.objects.filter(major=instance))
+
+
+@receiver(post_save, sender=Department)
+def reindex_department_students(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    index_students(Student.objects.filter(department=instance))
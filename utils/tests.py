@@ -1,3 +1,459 @@
-from django.test import TestCase
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from openpyxl import load_workbook
+import pandas as pd
+
+from courses.models import Course, TeachingAssignment
+from departments.models import Department, Major
+from grades.models import Grade
+from users.models import CustomUser, Student, Teacher
+
+User = get_user_model()
+
+
+class StudentExportTest(TestCase):
+    """测试学生名单流式导出"""
+    def setUp(self):
+        department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        major = Major.objects.create(major_name="软件工程", department=department)
+        for index in range(3):
+            user = User.objects.create_user(username=f'export_student{index}', password='password123', role=CustomUser.Role.STUDENT)
+            Student.objects.create(
+                user=user, student_id_num=f'S8000{index}', name=f'导出学生{index}', gender='女',
+                major=major, department=department, degree_level='本科', grade_year=2024,
+            )
+        self.admin = User.objects.create_user(username='export_admin', password='password123', role=CustomUser.Role.ADMIN)
+        self.client.force_login(self.admin)
+
+    def test_xlsx_export(self):
+        response = self.client.get(reverse('users:student-export-excel'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        worksheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(worksheet.values)
+        self.assertEqual(rows[0][:3], ('学号', '姓名', '登录用户名'))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][:5], ('S80000', '导出学生0', 'export_student0', '女', '计算机科学与技术系'))
+
+    def test_csv_export_streams_rows(self):
+        response = self.client.get(reverse('users:student-export-excel'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertIn('students_export.csv', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(content), 4)
+        self.assertEqual(content[3], 'S80002,导出学生2,export_student2,女,计算机科学与技术系,软件工程,2024,')
+
+    def test_rows_read_in_keyset_chunks(self):
+        from utils.exports import iter_export_rows
+
+        columns = [('学号', 'student_id_num'), ('登录用户名', 'user__username')]
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(iter_export_rows(Student.objects.order_by('-student_id_num'), columns, chunk_size=2))
+        self.assertEqual([row[0] for row in rows], ['S80002', 'S80001', 'S80000'])
+        self.assertEqual(rows[0][1], 'export_student2')
+        self.assertEqual(len(queries.captured_queries), 2)
+        self.assertIn('LIMIT 2', queries.captured_queries[1]['sql'])
+
+
+class StudentImportEngineTest(TestCase):
+    """测试学生批量导入引擎"""
+    def setUp(self):
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        Major.objects.create(major_name="软件工程", department=self.department)
+        math = Department.objects.create(dept_code="MA", dept_name="数学系")
+        Major.objects.create(major_name="应用数学", department=math)
+        existing = User.objects.create_user(username='taken', password='password123', role=CustomUser.Role.STUDENT)
+        Student.objects.create(
+            user=existing, student_id_num='S90000', name='已有学生', gender='男',
+            major=Major.objects.get(major_name="软件工程"), department=self.department, degree_level='本科'
+        )
+
+    def _rows(self, count, start=1):
+        return [
+            {
+                'username': f'fresh{i}', 'password': 'secret123', 'name': f'新生{i}',
+                'student_id_num': f'S9{i:04d}', 'department_name': '计算机科学与技术系', 'major_name': '软件工程',
+                'minor_department_name': '数学系', 'minor_major_name': '应用数学',
+                'birth_date': '2006-09-01',
+            }
+            for i in range(start, start + count)
+        ]
+
+    def test_import_creates_users_and_students(self):
+        from utils.importers import import_students
+
+        count, errors = import_students(pd.DataFrame(self._rows(3)))
+        self.assertEqual((count, errors), (3, []))
+        student = Student.objects.select_related('user', 'minor_major').get(student_id_num='S90002')
+        self.assertEqual(student.user.username, 'fresh2')
+        self.assertEqual(student.user.role, CustomUser.Role.STUDENT)
+        self.assertTrue(student.user.check_password('secret123'))
+        self.assertEqual(student.minor_major.major_name, '应用数学')
+        self.assertEqual(str(student.birth_date), '2006-09-01')
+
+    def test_row_errors_reported_and_nothing_written(self):
+        from utils.importers import import_students
+
+        rows = self._rows(2)
+        rows.append(dict(rows[0], student_id_num='S99999'))
+        rows.append(dict(rows[1], username='taken', student_id_num='S99998'))
+        rows.append(dict(rows[1], username='other', department_name='不存在系', student_id_num='S99997'))
+        rows.append(dict(rows[1], username='other2', name='', student_id_num='S99996'))
+        rows.append(dict(rows[1], username='other3', id_card='123', student_id_num='S99995'))
+        count, errors = import_students(pd.DataFrame(rows))
+
+        self.assertEqual(count, 0)
+        self.assertEqual(errors, [
+            "第 4 行：用户名 'fresh1' 已存在。",
+            "第 5 行：用户名 'taken' 已存在。",
+            "第 6 行：主修院系 '不存在系' 不存在。",
+            "第 7 行：必填字段不能为空。",
+            "第 8 行：身份证号 '123' 格式不正确，应为18位数字或17位数字+X。",
+        ])
+        self.assertFalse(CustomUser.objects.filter(username__startswith='fresh').exists())
+
+    def test_query_count_independent_of_row_count(self):
+        from utils.importers import import_students
+
+        with CaptureQueriesContext(connection) as small:
+            import_students(pd.DataFrame(self._rows(3)))
+        with CaptureQueriesContext(connection) as large:
+            import_students(pd.DataFrame(self._rows(30, start=100)))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+    @override_settings(BACKGROUND_JOBS_ASYNC=True, STUDENT_IMPORT_ASYNC_ROWS=3)
+    def test_large_import_runs_in_worker(self):
+        from utils.importers import import_in_background, run_student_import
+        from utils.jobs import run_pending_jobs
+        from utils.models import Job
+
+        self.assertFalse(import_in_background(pd.DataFrame(self._rows(2))))
+        admin = User.objects.create_user(username='import_admin', password='password123', role=CustomUser.Role.ADMIN)
+        self.client.force_login(admin)
+        buffer = BytesIO()
+        pd.DataFrame(self._rows(3)).to_excel(buffer, index=False)
+        buffer.seek(0)
+        buffer.name = 'students.xlsx'
+        response = self.client.post(reverse('utils:student-bulk-import'), {'file': buffer})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(CustomUser.objects.filter(username__startswith='fresh').exists())
+        job = Job.objects.get(status=Job.STATUS_PENDING)
+        self.assertEqual((job.max_attempts, len(job.payload['rows'])), (1, 3))
+
+        run_pending_jobs()
+        student = Student.objects.select_related('user').get(student_id_num='S90003')
+        self.assertTrue(student.user.check_password('secret123'))
+        self.assertEqual(str(student.birth_date), '2006-09-01')
+
+        # 入队后数据发生冲突时任务失败，错误记录在任务上
+        with self.assertRaisesMessage(Exception, "用户名 'fresh1' 已存在"):
+            run_student_import(job.payload['rows'])
+
+
+class SearchIndexTest(TestCase):
+    """测试检索文档同步及列表页搜索"""
+    def setUp(self):
+        self.department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        self.major = Major.objects.create(major_name="软件工程", department=self.department)
+        teacher_user = User.objects.create_user(username='search_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T91001', name='王老师', department=self.department)
+        self.course = Course.objects.create(course_id='CS911', course_name='数据结构', credits=3, department=self.department)
+        assignment = TeachingAssignment.objects.create(teacher=teacher, course=self.course, semester='2024 Fall')
+        self.students = []
+        for index, name in enumerate(['张三', '李四']):
+            user = User.objects.create_user(username=f'search_student{index}', password='password123', role=CustomUser.Role.STUDENT)
+            student = Student.objects.create(
+                user=user, student_id_num=f'S9100{index}', name=name, gender='男',
+                major=self.major, department=self.department, degree_level='本科'
+            )
+            Grade.objects.create(student=student, teaching_assignment=assignment, score=80 + index)
+            self.students.append(student)
+        self.admin = User.objects.create_user(username='search_admin', password='password123', role=CustomUser.Role.ADMIN)
+        self.client.force_login(self.admin)
+
+    def _grade_names(self, query):
+        response = self.client.get(reverse('grades:admin-grade-list'), {'q': query})
+        return sorted(grade.student.name for grade in response.context['grades'])
+
+    def test_grade_search_follows_writes(self):
+        self.assertEqual(self._grade_names('张三'), ['张三'])
+        self.assertEqual(self._grade_names('数据结构'), ['张三', '李四'])
+        self.assertEqual(self._grade_names('王老师'), ['张三', '李四'])
+
+        self.course.course_name = '算法设计'
+        self.course.save()
+        self.assertEqual(self._grade_names('数据结构'), [])
+        self.assertEqual(self._grade_names('算法'), ['张三', '李四'])
+
+        self.students[1].name = '李小四'
+        self.students[1].save()
+        self.assertEqual(self._grade_names('小四'), ['李小四'])
+
+    def test_login_does_not_reindex_student(self):
+        user = self.students[0].user
+        with CaptureQueriesContext(connection) as queries:
+            self.client.force_login(user)
+        self.assertFalse([q for q in queries.captured_queries if 'utils_searchdocument' in q['sql']])
+
+        user.username = 'renamed_student'
+        user.save(update_fields=['username'])
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('users:student-list'), {'q': 'renamed_student'})
+        self.assertEqual([s.name for s in response.context['students']], ['张三'])
+
+    def test_non_indexed_saves_skip_reindex(self):
+        student = self.students[0]
+        grade = Grade.objects.get(student=student)
+        with CaptureQueriesContext(connection) as queries:
+            student.save(update_fields=['credits_earned', 'minor_credits_earned'])
+            grade.score = 95
+            grade.save()
+        self.assertFalse([q for q in queries.captured_queries if 'utils_searchdocument' in q['sql']])
+
+        student.name = '张小三'
+        student.save(update_fields=['name'])
+        self.assertEqual(self._grade_names('小三'), ['张小三'])
+
+    def test_student_search_and_rebuild(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from utils.models import SearchDocument
+
+        response = self.client.get(reverse('users:student-list'), {'q': 'search_student1'})
+        self.assertEqual([s.name for s in response.context['students']], ['李四'])
+
+        SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.filter(kind=SearchDocument.KIND_STUDENT).count(), 2)
+        self.assertEqual(SearchDocument.objects.filter(kind=SearchDocument.KIND_GRADE).count(), 2)
+        response = self.client.get(reverse('users:student-list'), {'q': '软件'})
+        self.assertEqual(len(response.context['students']), 2)
+
+    def test_migration_backfills_existing_records(self):
+        from importlib import import_module
+        from unittest import mock
+        from django.apps import apps
+        from utils.models import SearchDocument
+
+        migration = import_module('utils.migrations.0003_backfill_search_documents')
+        SearchDocument.objects.all().delete()
+        # 每块一条记录，覆盖多块的情况
+        with mock.patch.object(migration, 'BACKFILL_CHUNK_SIZE', 1):
+            migration.backfill_search_documents(apps, None)
+        self.assertEqual(SearchDocument.objects.filter(kind=SearchDocument.KIND_STUDENT).count(), 2)
+        self.assertEqual(SearchDocument.objects.filter(kind=SearchDocument.KIND_GRADE).count(), 2)
+        self.assertEqual(self._grade_names('数据结构'), ['张三', '李四'])
+
+
+JOB_CALLS = []
+
+
+def record_job_call(value):
+    JOB_CALLS.append(value)
+
+
+def failing_job():
+    raise RuntimeError("任务失败")
+
+
+def slow_job():
+    import time
+    time.sleep(0.2)
+
+
+@override_settings(BACKGROUND_JOBS_ASYNC=True, JOB_RETRY_BACKOFF=10)
+class JobQueueTest(TestCase):
+    """测试数据库任务队列的去重、重试和成绩后续处理"""
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def test_enqueue_dedup_and_run(self):
+        from utils.jobs import enqueue, run_pending_jobs
+        from utils.models import Job
+
+        first = enqueue(record_job_call, dedup_key='once', value=1)
+        second = enqueue(record_job_call, dedup_key='once', value=2)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(first.task, 'utils.tests.record_job_call')
+        self.assertEqual(JOB_CALLS, [])
+
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(JOB_CALLS, [1])
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.STATUS_SUCCEEDED)
+        # 已完成的任务不再参与去重
+        self.assertNotEqual(enqueue(record_job_call, dedup_key='once', value=3).pk, first.pk)
+
+    def test_failed_job_retries_with_backoff(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from utils.jobs import enqueue, run_pending_jobs
+        from utils.models import Job
+
+        job = enqueue(failing_job, max_attempts=2)
+        with self.assertLogs('utils.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_PENDING, 1))
+        self.assertIn('任务失败', job.last_error)
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+
+        # 未到重试时间不会被领取
+        self.assertEqual(run_pending_jobs(), 0)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('utils.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.STATUS_FAILED, 2))
+
+    def test_dedup_enforced_by_constraint(self):
+        from unittest import mock
+        from django.db import IntegrityError, transaction
+        from django.db.models import QuerySet
+        from django.utils import timezone
+        from utils.jobs import enqueue
+        from utils.models import Job
+
+        first = enqueue(record_job_call, dedup_key='race', value=1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(task=first.task, dedup_key='race', run_after=timezone.now())
+
+        # 模拟并发：检查时对方的任务尚未可见，插入被约束拦下后返回已有的任务
+        original_first = QuerySet.first
+        calls = []
+
+        def first_missing_once(queryset):
+            calls.append(queryset)
+            return None if len(calls) == 1 else original_first(queryset)
+
+        with mock.patch.object(QuerySet, 'first', first_missing_once):
+            second = enqueue(record_job_call, dedup_key='race', value=2)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(Job.objects.filter(dedup_key='race').count(), 1)
+
+    @override_settings(JOB_LOCK_TIMEOUT=0.03)
+    def test_running_job_renews_lease(self):
+        from unittest import mock
+        from utils.jobs import claim_next_job, enqueue, run_job
+
+        enqueue(slow_job)
+        job = claim_next_job('worker-1')
+        with mock.patch('utils.jobs._own') as own, mock.patch('utils.jobs.connection'):
+            self.assertTrue(run_job(job))
+        renewals = [call for call in own.return_value.update.call_args_list if set(call.kwargs) == {'locked_at'}]
+        self.assertGreaterEqual(len(renewals), 2)
+
+    def test_requeued_job_not_overwritten_by_previous_worker(self):
+        from utils.jobs import claim_next_job, enqueue, run_job
+        from utils.models import Job
+
+        enqueue(record_job_call, value=1)
+        job = claim_next_job('worker-1')
+        # 任务超时后被重新入队，又由另一个 worker 领取
+        Job.objects.filter(pk=job.pk).update(locked_by='worker-2')
+        run_job(job)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.STATUS_RUNNING)
+
+    @override_settings(JOB_RETENTION=3600)
+    def test_purge_finished_jobs(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from utils.jobs import enqueue, purge_finished_jobs
+        from utils.models import Job
+
+        old = timezone.now() - timedelta(hours=2)
+        expired = [enqueue(record_job_call, value=index) for index in range(3)]
+        Job.objects.filter(pk__in=[job.pk for job in expired[:2]]).update(status=Job.STATUS_SUCCEEDED, finished_at=old)
+        Job.objects.filter(pk=expired[2].pk).update(status=Job.STATUS_FAILED, finished_at=old)
+        recent = enqueue(record_job_call, value=3)
+        Job.objects.filter(pk=recent.pk).update(status=Job.STATUS_SUCCEEDED, finished_at=timezone.now())
+        pending = enqueue(record_job_call, value=4)
+
+        self.assertEqual(purge_finished_jobs(batch_size=2), 3)
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, pending.pk})
+
+    def test_grade_follow_up_runs_in_worker(self):
+        from grades.models import StudentAcademicSummary
+        from utils.jobs import run_pending_jobs
+        from utils.models import Job
+
+        department = Department.objects.create(dept_code="CS", dept_name="计算机科学与技术系")
+        major = Major.objects.create(major_name="软件工程", department=department)
+        teacher_user = User.objects.create_user(username='job_teacher', password='password123', role=CustomUser.Role.TEACHER)
+        teacher = Teacher.objects.create(user=teacher_user, teacher_id_num='T92001', name='任务教师', department=department)
+        course = Course.objects.create(course_id='CS921', course_name='编译原理', credits=3, department=department)
+        assignment = TeachingAssignment.objects.create(teacher=teacher, course=course, semester='2024 Fall')
+        user = User.objects.create_user(username='job_student', password='password123', role=CustomUser.Role.STUDENT)
+        student = Student.objects.create(
+            user=user, student_id_num='S92001', name='任务学生', gender='男',
+            major=major, department=department, degree_level='本科'
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Grade.objects.create(student=student, teaching_assignment=assignment, score=90)
+        self.assertFalse(StudentAcademicSummary.objects.filter(student=student).exists())
+        self.assertTrue(Job.objects.filter(task='grades.services.refresh_student_records').exists())
+
+        run_pending_jobs()
+        self.assertEqual(StudentAcademicSummary.objects.get(student=student, semester='').graded_courses, 1)
+        self.assertEqual(
+            Job.objects.get(task='grades.services.refresh_student_records').status, Job.STATUS_SUCCEEDED
+        )
+        # 首页缓存预热任务延迟执行，短时间内多次失效只保留一个
+        self.assertEqual(Job.objects.filter(task='core.views.warm_dashboard').count(), 1)
+
+
+class IndexAuditTest(TestCase):
+    """测试热点查询执行计划审计"""
+
+    def test_catalogue_uses_indexes(self):
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('index_audit', '--fail', stdout=out)
+        self.assertIn('0 条存在全表扫描或额外排序', out.getvalue())
+
+    def test_unindexed_query_flagged(self):
+        from django.core.management.base import CommandError
+        from utils import query_audit
+        from utils.query_audit import FILESORT, FULL_SCAN, AuditQuery, audit_query
+
+        query = AuditQuery('按分数排序', 'tests', lambda: Grade.objects.order_by('score'), ())
+        result = audit_query(query)
+        self.assertEqual({issue.kind for issue in result.issues}, {FULL_SCAN, FILESORT})
+
+        tolerated = audit_query(query._replace(allow=(FILESORT,)))
+        self.assertEqual([issue.kind for issue in tolerated.issues], [FULL_SCAN])
+        self.assertEqual([issue.kind for issue in tolerated.ignored], [FILESORT])
+
+        from unittest import mock
+        from django.core.management import call_command
+        with mock.patch.object(query_audit, 'QUERY_CATALOGUE', [query]):
+            with self.assertRaises(CommandError):
+                call_command('index_audit', '--fail', stdout=StringIO())
+
+    def test_mysql_and_postgresql_plans(self):
+        from utils.query_audit import FILESORT, FULL_SCAN, mysql_issues, postgresql_issues
+
+        mysql_plan = (
+            '{"query_block": {"ordering_operation": {"using_filesort": true, "table": '
+            '{"table_name": "grades_grade", "access_type": "ALL"}}}}'
+        )
+        self.assertEqual(
+            [(issue.kind, issue.detail) for issue in mysql_issues(mysql_plan)],
+            [(FILESORT, 'Using filesort'), (FULL_SCAN, 'grades_grade')],
+        )
+        postgresql_plan = (
+            'Sort  (cost=1.0..1.1 rows=10 width=8)\n'
+            '  Sort Key: score\n'
+            '  ->  Seq Scan on grades_grade  (cost=0.0..1.0 rows=10 width=8)'
+        )
+        self.assertEqual(
+            [issue.kind for issue in postgresql_issues(postgresql_plan)], [FILESORT, FULL_SCAN],
+        )